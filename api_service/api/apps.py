@@ -4,4 +4,10 @@ from django.apps import AppConfig
 class AppsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
-    verbose_name = "API接口"
\ No newline at end of file
+    verbose_name = "API接口"
+
+    def ready(self):
+        from . import startup
+
+        if startup.should_configure():
+            startup.configure_all()
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.Data_base.database import engine, get_db
+from src.Data_base.query_plans import check_query_plans, ensure_indexes, missing_indexes
+
+
+class Command(BaseCommand):
+    help = '对商品目录查询执行 EXPLAIN，发现全表扫描时以非零状态退出'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--create-missing-indexes',
+            action='store_true',
+            help='先为已存在的表补建模型中声明的索引',
+        )
+
+    def handle(self, *args, **options):
+        if options['create_missing_indexes']:
+            try:
+                created = ensure_indexes(engine)
+            except Exception as e:
+                raise CommandError(f'补建索引失败: {e}')
+            for name in created:
+                self.stdout.write(self.style.SUCCESS(f'已创建索引 {name}'))
+        else:
+            for index in missing_indexes(engine):
+                self.stdout.write(self.style.WARNING(
+                    f'缺少索引 {index.table.name}.{index.name}，可使用 --create-missing-indexes 补建'
+                ))
+
+        with get_db() as db:
+            problems = check_query_plans(db)
+
+        if problems:
+            for problem in problems:
+                self.stderr.write(self.style.ERROR(f'[{problem.shape}] {problem.detail}'))
+                if problem.statement:
+                    self.stderr.write(f'   {" ".join(problem.statement.split())}')
+            raise CommandError(f'发现 {len(problems)} 处全表扫描')
+
+        self.stdout.write(self.style.SUCCESS('商品目录查询均已使用索引'))
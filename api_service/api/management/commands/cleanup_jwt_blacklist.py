@@ -11,6 +11,11 @@ class Command(BaseCommand):
             action='store_true',
             help='清理过期的黑名单令牌',
         )
+        parser.add_argument(
+            '--rebuild-index',
+            action='store_true',
+            help='为旧的黑名单令牌补建过期索引',
+        )
         parser.add_argument(
             '--stats',
             action='store_true',
@@ -18,16 +23,29 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        if options['rebuild_index']:
+            self.rebuild_index()
+
         if options['cleanup']:
             self.cleanup_blacklist()
 
         if options['stats']:
             self.show_stats()
 
-        if not options['cleanup'] and not options['stats']:
+        if not options['cleanup'] and not options['stats'] and not options['rebuild_index']:
             # 默认显示统计信息
             self.show_stats()
 
+    def rebuild_index(self):
+        """补建过期索引"""
+        try:
+            indexed = jwt_blacklist.rebuild_index()
+            self.stdout.write(
+                self.style.SUCCESS(f'已为 {indexed} 个令牌建立过期索引')
+            )
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'重建过期索引失败: {e}'))
+
     def cleanup_blacklist(self):
         """清理黑名单"""
         try:
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api_service.utils.redis_client import redis_client
+from src.Data_base.database import get_db
+from src.Data_base.repositories.stock_reservation import flash_sale_stock
+
+
+class Command(BaseCommand):
+    help = '管理秒杀商品的 Redis 预扣库存'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--load',
+            type=int,
+            nargs='+',
+            metavar='PRODUCT_ID',
+            help='将商品设为秒杀商品，按数据库库存载入 Redis（补货后也需重新载入）',
+        )
+        parser.add_argument(
+            '--unload',
+            type=int,
+            nargs='+',
+            metavar='PRODUCT_ID',
+            help='结束秒杀，商品恢复为数据库扣减（会先同步预扣量）',
+        )
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help='立即把预扣量同步到数据库',
+        )
+
+    def handle(self, *args, **options):
+        if not redis_client.connection:
+            raise CommandError('未连接 Redis，无法使用秒杀库存')
+        flash_sale_stock.use_connection(redis_client.connection)
+
+        if options['unload'] or options['reconcile']:
+            with get_db() as db:
+                synced = flash_sale_stock.reconcile(db)
+            self.stdout.write(self.style.SUCCESS(f'已同步 {synced} 个商品的预扣量'))
+
+        for product_id in options['unload'] or []:
+            flash_sale_stock.unload(product_id)
+            self.stdout.write(self.style.SUCCESS(f'商品 {product_id} 已结束秒杀'))
+
+        for product_id in options['load'] or []:
+            try:
+                with get_db() as db:
+                    available = flash_sale_stock.load(db, product_id)
+                self.stdout.write(self.style.SUCCESS(f'商品 {product_id} 已载入秒杀库存: {available}'))
+            except ValueError as e:
+                self.stderr.write(self.style.ERROR(str(e)))
+
+        stats = flash_sale_stock.stats()
+        self.stdout.write(f"待同步预扣量: {stats.get('pending', {})}")
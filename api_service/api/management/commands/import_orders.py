@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.Data_base.database import get_db
+from src.Data_base.repositories.order_repository import OrderRepository
+
+
+class Command(BaseCommand):
+    help = '从 JSON Lines 文件批量导入订单（每行一个订单：user_id、items[{product_id, quantity}]，可选 order_number、shipping_amount、discount_amount 等）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='订单文件路径（.jsonl）')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批下单的订单数（每批一个事务）',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        placed = failed = 0
+        try:
+            with open(options['path'], 'r', encoding='utf-8') as f, get_db() as db:
+                repo = OrderRepository(db)
+                batch = []
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        batch.append(json.loads(line))
+                    except ValueError as e:
+                        raise CommandError(f'第 {line_no} 行不是有效的 JSON: {e}')
+                    if len(batch) >= batch_size:
+                        ok, bad = self.place(repo, batch)
+                        placed, failed, batch = placed + ok, failed + bad, []
+                if batch:
+                    ok, bad = self.place(repo, batch)
+                    placed, failed = placed + ok, failed + bad
+        except OSError as e:
+            raise CommandError(f'读取订单文件失败: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'导入完成: 成功 {placed}, 失败 {failed}'))
+
+    def place(self, repo, batch):
+        # 后台导入的订单可带协议优惠（discount_amount），下单时校验不超过商品小计
+        results = repo.place_orders(batch, allow_discount=True)
+        for result in results:
+            if not result.ok:
+                self.stderr.write(self.style.WARNING(f'订单 {result.order_number} 未导入: {result.error}'))
+        ok = sum(1 for result in results if result.ok)
+        return ok, len(results) - ok
@@ -0,0 +1,106 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from sqlalchemy import select, text, update
+
+from src.Data_base.database import get_db
+from src.Data_base.models.user import User
+from src.utils.password_hashing import parse_password_record, tag_legacy_record
+
+
+class Command(BaseCommand):
+    help = '统计并迁移用户密码哈希记录到带版本的格式'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alter-column',
+            action='store_true',
+            help='将 users.pass_word 扩展为 VARCHAR(128)，以容纳带版本的记录',
+        )
+        parser.add_argument(
+            '--tag-legacy',
+            action='store_true',
+            help='为未带版本的旧记录加上 legacy$ 前缀（登录成功后会自动升级）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每批处理的用户数',
+        )
+
+    def handle(self, *args, **options):
+        if options['alter_column']:
+            self.alter_column()
+
+        if options['tag_legacy']:
+            self.tag_legacy(options['batch_size'])
+
+        self.show_stats(options['batch_size'])
+
+    def _iter_batches(self, db, batch_size):
+        """按 user_id 递增分批读取 (user_id, pass_word)"""
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(User.user_id, User.pass_word)
+                .where(User.user_id > last_id)
+                .order_by(User.user_id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].user_id
+
+    def alter_column(self):
+        """扩展密码字段长度"""
+        try:
+            with get_db() as db:
+                db.execute(text("ALTER TABLE users MODIFY pass_word VARCHAR(128) NOT NULL"))
+            self.stdout.write(self.style.SUCCESS('users.pass_word 已扩展为 VARCHAR(128)'))
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'扩展密码字段失败: {e}'))
+
+    def tag_legacy(self, batch_size):
+        """标记旧记录（没有明文无法离线重新派生，只能在下次登录时升级）"""
+        tagged = 0
+        try:
+            with get_db() as db:
+                for rows in self._iter_batches(db, batch_size):
+                    for row in rows:
+                        new_record = tag_legacy_record(row.pass_word)
+                        if new_record != row.pass_word:
+                            db.execute(
+                                update(User)
+                                .where(User.user_id == row.user_id, User.pass_word == row.pass_word)
+                                .values(pass_word=new_record)
+                            )
+                            tagged += 1
+                    db.commit()
+            self.stdout.write(self.style.SUCCESS(f'已标记 {tagged} 条旧密码记录'))
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'标记旧密码记录失败: {e}'))
+
+    def show_stats(self, batch_size):
+        """按算法和迭代次数统计密码记录"""
+        try:
+            counter = Counter()
+            with get_db() as db:
+                for rows in self._iter_batches(db, batch_size):
+                    for row in rows:
+                        record = parse_password_record(row.pass_word)
+                        counter[(record.algorithm, record.iterations)] += 1
+
+            self.stdout.write(self.style.SUCCESS('密码哈希记录统计:'))
+            for (algorithm, iterations), count in sorted(counter.items(), key=lambda item: str(item[0])):
+                rounds = iterations if iterations is not None else '-'
+                self.stdout.write(f"   {algorithm} (迭代 {rounds}): {count}")
+
+            legacy_count = sum(count for (algorithm, _), count in counter.items() if algorithm == 'legacy')
+            if legacy_count:
+                self.stdout.write(
+                    self.style.WARNING(f'有 {legacy_count} 条旧记录，将在用户下次登录成功后自动升级')
+                )
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f'统计密码记录失败: {e}'))
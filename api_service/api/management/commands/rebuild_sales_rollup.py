@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.Data_base.database import get_db
+from src.Data_base.repositories.sales_rollup import SalesRollupRepository
+
+
+def _parse_date(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        raise CommandError(f'日期格式错误: {value}（应为 YYYY-MM-DD 或 YYYY-MM-DDTHH:MM）')
+
+
+class Command(BaseCommand):
+    help = '从订单表重算销售统计小时桶（首次上线或数据修复时使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='起始时间（含），默认最早的订单')
+        parser.add_argument('--end', help='结束时间（不含），默认至今')
+
+    def handle(self, *args, **options):
+        start = _parse_date(options['start'])
+        end = _parse_date(options['end'])
+        try:
+            with get_db() as db:
+                buckets = SalesRollupRepository(db).rebuild(start, end)
+        except Exception as e:
+            raise CommandError(f'重算销售统计失败: {e}')
+        self.stdout.write(self.style.SUCCESS(f'已重算 {buckets} 个小时桶'))
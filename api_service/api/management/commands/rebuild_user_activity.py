@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.Data_base.database import get_db
+from src.Data_base.repositories.user_activity import UserActivityRepository
+
+
+class Command(BaseCommand):
+    help = '从订单表和用户表回填用户活跃度计数（首次上线或数据修复时使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='每个事务处理的用户ID区间长度，默认 10000')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size 必须大于 0')
+        try:
+            with get_db() as db:
+                rows = UserActivityRepository(db).rebuild(options['batch_size'])
+        except Exception as e:
+            raise CommandError(f'回填用户活跃度计数失败: {e}')
+        self.stdout.write(self.style.SUCCESS(f'已回填 {rows} 个用户的活跃度计数'))
@@ -1,11 +1,26 @@
 from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 import time
-from collections import defaultdict
-import re
 import json
+from django.conf import settings
 from src.unified_service import UnifiedEcommerceService
+from src.Data_base.database import remove_scoped_session
 from api_service.utils.jwt_balcklist import jwt_blacklist
+from src.utils.security import SQLScreeningEngine
+from src.utils.rate_limit import rate_limiter, retry_after_seconds
+from api_service.utils.redis_client import redis_client
+
+
+class DBSessionMiddleware(MiddlewareMixin):
+    """请求级数据库会话：每个请求结束后关闭本线程的 SQLAlchemy 会话"""
+
+    def process_response(self, request, response):
+        remove_scoped_session()
+        return response
+
+    def process_exception(self, request, exception):
+        remove_scoped_session()
+        return None
 
 class JWTAuthenticationMiddleware(MiddlewareMixin):
     def process_request(self, request):
@@ -63,7 +78,7 @@ class JWTAuthenticationMiddleware(MiddlewareMixin):
             }, status=401)
 
         try:
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             payload = service.verify_token(token)
             print(f"[JWT DEBUG] Token验证结果: {payload}")
 
@@ -100,6 +115,22 @@ class JWTAuthenticationMiddleware(MiddlewareMixin):
             }, status=401)
 
 
+# 放宽SQL注入检测规则，避免误判中文关键词
+SQL_SCREENING_PATTERNS = [
+    # 单个SQL关键字
+    r"\b(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|TRUNCATE|EXEC|UNION)\b",
+    # SQL注释符
+    r"(--|\#|/\*|\*/)",
+    # 分号结束符
+    r";\s*$",
+    # 单引号闭合攻击
+    r"'\s*(OR|AND)\s+['\d]",
+    # 恒真条件
+    r"\b(OR|AND)\s+['\"]?['\"]?=*['\"]?['\"]?",
+]
+SQL_SCREENING_ENGINE = SQLScreeningEngine(SQL_SCREENING_PATTERNS, max_depth=32, max_nodes=10000)
+
+
 class SecurityMiddleware(MiddlewareMixin):
     def process_request(self, request):
         skip_paths = [
@@ -123,7 +154,15 @@ class SecurityMiddleware(MiddlewareMixin):
             if request.method in ['POST', 'PUT'] and request.content_type == 'application/json':
                 try:
                     body = json.loads(request.body)
-                    if self.check_json_for_injection(body):
+                    result = SQL_SCREENING_ENGINE.scan(body)
+                    if result == SQLScreeningEngine.LIMIT_EXCEEDED:
+                        return JsonResponse({
+                            "code": 400,
+                            "message": "请求体结构过深或过大",
+                            "data": None,
+                            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S')
+                        }, status=400)
+                    if result == SQLScreeningEngine.INJECTION:
                         return JsonResponse({
                             "code": 400,
                             "message": "输入包含非法字符",
@@ -136,34 +175,10 @@ class SecurityMiddleware(MiddlewareMixin):
         return None
 
     def detect_sql_injection(self, input_string):
-        # 放宽SQL注入检测规则，避免误判中文关键词
-        sql_patterns = [
-            # 单个SQL关键字
-            r"\b(SELECT|INSERT|UPDATE|DELETE|DROP|CREATE|ALTER|TRUNCATE|EXEC|UNION)\b",
-            # SQL注释符
-            r"(--|\#|/\*|\*/)",
-            # 分号结束符
-            r";\s*$",
-            # 单引号闭合攻击
-            r"'\s*(OR|AND)\s+['\d]",
-            # 恒真条件
-            r"\b(OR|AND)\s+['\"]?['\"]?=*['\"]?['\"]?",
-        ]
-        combined_pattern = "|".join(sql_patterns)
-        return bool(re.search(combined_pattern, input_string, re.IGNORECASE))
+        return SQL_SCREENING_ENGINE.matches(input_string)
 
     def check_json_for_injection(self, data):
-        if isinstance(data, dict):
-            for value in data.values():
-                if self.check_json_for_injection(value):
-                    return True
-        elif isinstance(data, list):
-            for item in data:
-                if self.check_json_for_injection(item):
-                    return True
-        elif isinstance(data, str):
-            return self.detect_sql_injection(data)
-        return False
+        return SQL_SCREENING_ENGINE.scan(data) is not None
 
     def process_response(self, request, response):
         # 安全头部
@@ -176,38 +191,41 @@ class SecurityMiddleware(MiddlewareMixin):
 class RateLimitMiddleware(MiddlewareMixin):
     def __init__(self, get_response=None):
         super().__init__(get_response)
-        self.requests = defaultdict(list)
+        config = getattr(settings, 'RATE_LIMIT_CONFIG', {})
+        self.default_limit = tuple(config.get('DEFAULT', (100, 60)))
+        # 最长前缀优先
+        self.route_limits = sorted(
+            ((prefix, tuple(limit)) for prefix, limit in config.get('ROUTES', {}).items()),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self.excluded_paths = tuple(config.get('EXCLUDED_PATHS', ()))
+
+    def get_route_limit(self, path):
+        for prefix, limit in self.route_limits:
+            if path.startswith(prefix):
+                return prefix, limit
+        return '*', self.default_limit
 
     def process_request(self, request):
         # 排除公开API的限流
-        excluded_paths = [
-            '/api/docs/',
-            '/api/swagger/',
-            '/api/products',  # 商品列表公开，不限流
-        ]
-
-        if any(request.path.startswith(path) for path in excluded_paths):
+        if self.excluded_paths and request.path.startswith(self.excluded_paths):
             return None
 
         client_ip = self.get_client_ip(request)
-        current_time = time.time()
+        route, (limit, window) = self.get_route_limit(request.path)
+        result = rate_limiter.hit(f"ip:{client_ip}:{route}", limit, window)
 
-        # 清理过期请求（60秒窗口）
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if current_time - req_time < 60
-        ]
-
-        # 检查限制（最大100个请求）
-        if len(self.requests[client_ip]) >= 100:
-            return JsonResponse({
+        if not result.allowed:
+            response = JsonResponse({
                 "code": 429,
                 "message": "请求频率过高",
                 "data": None,
                 "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S')
             }, status=429)
+            response['Retry-After'] = str(retry_after_seconds(result))
+            return response
 
-        self.requests[client_ip].append(current_time)
         return None
 
     def get_client_ip(self, request):
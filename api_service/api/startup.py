@@ -0,0 +1,85 @@
+"""服务进程启动时的初始化：切换到 Redis 后端并启动后台线程
+
+由 ``AppsConfig.ready()`` 调用，只在处理请求的进程中执行（见 ``should_configure``）
+"""
+import os
+import sys
+
+from django.conf import settings
+
+from src.Data_base.database import SessionLocal
+from src.Data_base.repositories.category_tree import category_tree_cache
+from src.Data_base.repositories.identity_cache import identity_cache
+from src.Data_base.repositories.login_bookkeeping import login_bookkeeper
+from src.Data_base.repositories.stock_reservation import flash_sale_stock
+from src.utils.rate_limit import RedisRateLimitBackend, rate_limiter
+from api_service.utils.redis_client import redis_client
+from api_service.utils.cache_utils import l1_invalidation
+
+_MANAGEMENT_ENTRYPOINTS = ('manage.py', 'django-admin', 'django-admin.py', '__main__.py')
+
+
+def should_configure(argv=None, environ=None):
+    """管理命令不启动后台线程；runserver 只在自动重载的子进程中启动（父进程只负责监视文件）"""
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    if not argv or os.path.basename(argv[0]) not in _MANAGEMENT_ENTRYPOINTS:
+        return True  # WSGI/ASGI 服务器（gunicorn 等）
+    if len(argv) < 2 or argv[1] != 'runserver':
+        return False
+    return '--noreload' in argv or environ.get('RUN_MAIN') == 'true'
+
+
+def configure_rate_limit_backend():
+    """有 Redis 连接时使用 Lua 脚本后端，多个 worker 共享同一计数"""
+    config = getattr(settings, 'RATE_LIMIT_CONFIG', {})
+    if config.get('BACKEND', 'redis') != 'redis' or not redis_client.connection:
+        return
+    try:
+        rate_limiter.use_backend(RedisRateLimitBackend(redis_client.connection))
+    except Exception as e:
+        print(f"Redis限流后端初始化失败: {e}，使用本地限流")
+
+
+def configure_flash_sale_stock():
+    """有 Redis 连接时启用秒杀库存预扣，并启动向数据库同步预扣量的后台线程"""
+    config = getattr(settings, 'FLASH_SALE_STOCK_CONFIG', {})
+    if not config.get('ENABLED', True) or not redis_client.connection:
+        return
+    try:
+        flash_sale_stock.use_connection(redis_client.connection)
+        flash_sale_stock.start_reconciler(SessionLocal, config.get('RECONCILE_INTERVAL', 1.0))
+    except Exception as e:
+        print(f"秒杀库存预扣初始化失败: {e}，全部商品使用数据库扣减")
+
+
+def configure_login_bookkeeping():
+    """有 Redis 连接时启用登录记账的批量写回（登录失败计数在各 worker 间共享，不能只存在进程内）"""
+    config = getattr(settings, 'LOGIN_BOOKKEEPING_CONFIG', {})
+    if not config.get('WRITE_BEHIND', True) or not redis_client.connection:
+        return
+    try:
+        login_bookkeeper.use_connection(redis_client.connection)
+        login_bookkeeper.start_flusher(SessionLocal, config.get('FLUSH_INTERVAL', 0.2))
+    except Exception as e:
+        print(f"登录记账批量写回初始化失败: {e}，登录时同步写库")
+
+
+def configure_identity_cache():
+    """有 Redis 连接时身份缓存在各 worker 间共享，某个 worker 上的失效对其他 worker 同样生效"""
+    if redis_client.connection:
+        identity_cache.use_connection(redis_client.connection)
+
+
+def configure_category_tree_invalidation():
+    """分类树失效经一级缓存的失效频道广播，其他 worker 不必等到分类树缓存过期"""
+    category_tree_cache.use_invalidation_channel(l1_invalidation)
+    l1_invalidation.ensure_started()
+
+
+def configure_all():
+    configure_rate_limit_backend()
+    configure_flash_sale_stock()
+    configure_login_bookkeeping()
+    configure_identity_cache()
+    configure_category_tree_invalidation()
@@ -7,17 +7,24 @@ from rest_framework.views import exception_handler
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from datetime import datetime
+import json
 import time
 import secrets
 from urllib.parse import unquote
 import sys
 import os
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from api_service.utils.jwt_balcklist import jwt_blacklist
-from api_service.utils.cache_utils import ProductCache, UserCache
+from api_service.utils.cache_utils import CacheUtils, ProductCache, UserCache
 from api_service.utils.redis_client import redis_client
+from src.utils.rate_limit import rate_limiter
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from src.unified_service import UnifiedEcommerceService
+from src.Data_base.repositories.pagination import InvalidCursor
+from src.Data_base.database import pool_status
+from src.Data_base.repositories.identity_cache import identity_cache
+from src.Data_base.repositories.login_bookkeeping import login_bookkeeper
+from src.Data_base.repositories.stock_reservation import flash_sale_stock
 from gmssl import sm2
 from src.algorithm.ca_center import parse_certificate_pem, verify_certificate_with_root
 
@@ -317,7 +324,7 @@ class CertLoginView(APIView):
                     "timestamp": datetime.now().isoformat()
                 }, status=401)
 
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             result = service.cert_login_user(username)
             if not result.get("success"):
                 return Response({
@@ -435,7 +442,7 @@ class CertMTLSLoginView(APIView):
                     "timestamp": datetime.now().isoformat()
                 }, status=400)
 
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             result = service.cert_login_user(login_username)
             if not result.get("success"):
                 return Response({
@@ -529,7 +536,7 @@ class UserRegistrationView(APIView):
             }, status=400)
 
         try:
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             result = service.register_user(
                 username=serializer.validated_data['username'],
                 password=serializer.validated_data['password'],
@@ -634,7 +641,7 @@ class UserLoginView(APIView):
             }, status=400)
 
         try:
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             result = service.login_user(
                 username=serializer.validated_data['username'],
                 password=serializer.validated_data['password']
@@ -730,7 +737,7 @@ class PasswordChangeView(APIView):
             }, status=401)
 
         username = request.user_info.get('username')
-        service = UnifiedEcommerceService()
+        service = UnifiedEcommerceService.get_instance()
         result = service.change_password(
             username=username,
             old_password=serializer.validated_data['old_password'],
@@ -789,7 +796,7 @@ class PasswordResetCodeView(APIView):
                 "timestamp": datetime.now().isoformat()
             }, status=400)
 
-        service = UnifiedEcommerceService()
+        service = UnifiedEcommerceService.get_instance()
         result = service.send_reset_code(serializer.validated_data['phone'])
         status_code = 200 if result['success'] else 400
         return Response({
@@ -843,7 +850,7 @@ class PasswordResetView(APIView):
                 "timestamp": datetime.now().isoformat()
             }, status=400)
 
-        service = UnifiedEcommerceService()
+        service = UnifiedEcommerceService.get_instance()
         result = service.reset_password(
             phone=serializer.validated_data['phone'],
             new_password=serializer.validated_data['new_password'],
@@ -889,7 +896,7 @@ class UserLogoutView(APIView):
                 jwt_blacklist.add_token(token)
 
                 # 调用原有的登出逻辑
-                service = UnifiedEcommerceService()
+                service = UnifiedEcommerceService.get_instance()
                 result = service.user_system.logout(token)
                 print(f"[LOGOUT] 用户登出，令牌已加入Redis黑名单")
             except Exception as e:
@@ -1066,7 +1073,7 @@ class UserProfileView(APIView):
             update_data = request.data
 
             # 使用 UnifiedEcommerceService 更新用户资料
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             result = service.update_user_profile(username, update_data)
 
             if result['success']:
@@ -1119,6 +1126,8 @@ class ProductListView(APIView):
             openapi.Parameter('category_id', openapi.IN_QUERY, description="分类ID", type=openapi.TYPE_INTEGER),
             openapi.Parameter('min_price', openapi.IN_QUERY, description="最低价格", type=openapi.TYPE_NUMBER),
             openapi.Parameter('max_price', openapi.IN_QUERY, description="最高价格", type=openapi.TYPE_NUMBER),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="每页数量（1-100，默认50）", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="分页游标，取上一页返回的 next_cursor", type=openapi.TYPE_STRING),
         ],
         responses={
             200: openapi.Response(
@@ -1136,6 +1145,7 @@ class ProductListView(APIView):
                                 "image_urls": ["http://example.com/image1.jpg"]
                             }
                         ],
+                        "next_cursor": "eyJ0IjoiMjAyNC0wMS0wMVQxMjowMDowMCIsImlkIjoxfQ",
                         "timestamp": "2024-01-01T12:00:00"
                     }
                 }
@@ -1160,8 +1170,14 @@ class ProductListView(APIView):
             category_id = request.GET.get('category_id')
             min_price = request.GET.get('min_price')
             max_price = request.GET.get('max_price')
+            cursor = request.GET.get('cursor') or None
 
             # 参数验证和转换
+            try:
+                limit = min(max(int(request.GET.get('limit', 50)), 1), 100)
+            except (ValueError, TypeError):
+                limit = 50
+
             try:
                 category_id = int(category_id) if category_id and category_id != 'null' else None
             except (ValueError, TypeError):
@@ -1177,43 +1193,34 @@ class ProductListView(APIView):
             except (ValueError, TypeError):
                 max_price = None
 
-            # 使用缓存获取商品列表
-            products = ProductCache.get_product_list(
-                keyword=keyword,
-                category_id=category_id,
-                min_price=min_price,
-                max_price=max_price
-            )
-
-            # 将 Product 对象转换为可序列化的字典
-            serialized_products = []
-            if products:
-                for product in products:
-                    # 检查 product 是否是字典，如果不是则转换为字典
-                    if isinstance(product, dict):
-                        serialized_products.append(product)
-                    else:
-                        # 假设 Product 对象有这些属性
-                        product_dict = {
-                            'product_id': getattr(product, 'product_id', None),
-                            'product_name': getattr(product, 'product_name', ''),
-                            'sale_price': float(getattr(product, 'sale_price', 0)),
-                            'stock_quantity': getattr(product, 'stock_quantity', 0),
-                            'image_urls': getattr(product, 'image_urls', []),
-                            'description': getattr(product, 'description', ''),
-                            'category_id': getattr(product, 'category_id', None),
-                            'category_name': getattr(product, 'category_name', ''),
-                        }
-                        # 移除空值
-                        product_dict = {k: v for k, v in product_dict.items() if v is not None}
-                        serialized_products.append(product_dict)
+            # 使用缓存获取商品列表（缓存中已是序列化好的 JSON，直接拼接响应体）
+            try:
+                payload, next_cursor = ProductCache.get_product_list_payload(
+                    keyword=keyword,
+                    category_id=category_id,
+                    min_price=min_price,
+                    max_price=max_price,
+                    cursor=cursor,
+                    limit=limit
+                )
+            except InvalidCursor:
+                return Response({
+                    "code": 400,
+                    "message": "分页游标无效",
+                    "data": None,
+                    "timestamp": datetime.now().isoformat()
+                }, status=400)
 
-            return Response({
-                "code": 0,
-                "message": "success",
-                "data": serialized_products,
-                "timestamp": datetime.now().isoformat()
-            })
+            body = b''.join((
+                b'{"code":0,"message":"success","data":',
+                payload,
+                b',"next_cursor":',
+                json.dumps(next_cursor).encode('ascii'),
+                b',"timestamp":"',
+                datetime.now().isoformat().encode('ascii'),
+                b'"}'
+            ))
+            return HttpResponse(body, content_type='application/json')
 
         except Exception as e:
             import traceback
@@ -1233,7 +1240,7 @@ class CategoryListView(APIView):
 
     @swagger_auto_schema(
         operation_summary="获取分类列表",
-        operation_description="获取所有商品分类的树形结构",
+        operation_description="获取所有商品分类的树形结构（任意层级）",
         responses={
             200: openapi.Response(
                 description="获取成功",
@@ -1254,7 +1261,8 @@ class CategoryListView(APIView):
                                         "category_name": "手机",
                                         "parent_id": 1,
                                         "level": 2,
-                                        "sort_order": 0
+                                        "sort_order": 0,
+                                        "children": []
                                     }
                                 ]
                             }
@@ -1281,53 +1289,10 @@ class CategoryListView(APIView):
         """获取分类列表"""
         try:
             print("开始处理分类列表请求")
-            service = UnifiedEcommerceService()
-
-            # 获取顶级分类
-            top_categories = service.category_repo.get_categories_tree()
-            print(f"获取到 {len(top_categories)} 个顶级分类")
-
-            if not top_categories:
-                print("没有找到任何分类数据")
-                return Response({
-                    "code": 0,
-                    "message": "success",
-                    "data": [],
-                    "timestamp": datetime.now().isoformat()
-                })
-
-            # 构建分类树
-            category_list = []
-            for category in top_categories:
-                print(f"处理分类: {category.category_name} (ID: {category.category_id})")
-
-                # 获取子分类
-                subcategories = service.category_repo.get_subcategories(category.category_id)
-                print(f"  ├─ 子分类数量: {len(subcategories)}")
-
-                category_dict = {
-                    'category_id': getattr(category, 'category_id', None),
-                    'category_name': getattr(category, 'category_name', ''),
-                    'parent_id': getattr(category, 'parent_category_id', None),
-                    'level': getattr(category, 'category_level', 1),
-                    'sort_order': getattr(category, 'sort_order', 0),
-                    'children': []
-                }
-
-                # 处理子分类
-                for child in subcategories:
-                    child_dict = {
-                        'category_id': getattr(child, 'category_id', None),
-                        'category_name': getattr(child, 'category_name', ''),
-                        'parent_id': getattr(child, 'parent_category_id', None),
-                        'level': getattr(child, 'category_level', 2),
-                        'sort_order': getattr(child, 'sort_order', 0)
-                    }
-                    category_dict['children'].append(child_dict)
-                    print(f"  ├─ 子分类: {child.category_name} (ID: {child.category_id})")
-
-                category_list.append(category_dict)
+            service = UnifiedEcommerceService.get_instance()
 
+            # 一次查询加载全部分类并组装为任意深度的树（结果已缓存）
+            category_list = service.category_repo.get_category_tree()
             print(f"返回分类数据: {len(category_list)} 个分类组")
             return Response({
                 "code": 0,
@@ -1393,7 +1358,7 @@ class ProductDetailView(APIView):
     )
     def get(self, request, product_id):
         try:
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             product = service.get_product_detail(product_id)
 
             if product:
@@ -1460,6 +1425,20 @@ class HealthCheckView(APIView):
                             "api": "healthy",
                             "database": "healthy",
                             "redis": "healthy",
+                            "database_pool": {
+                                "pool_size": 10,
+                                "max_overflow": 20,
+                                "checked_out": 3,
+                                "checked_in": 7,
+                                "overflow": 0,
+                                "checkouts": 1520,
+                                "timeouts": 0,
+                                "exhausted": 0,
+                                "slow_waits": 0,
+                                "avg_wait_ms": 0.041,
+                                "max_wait_ms": 12.5,
+                                "wait_histogram": {"le_1ms": 1500, "le_5ms": 12, "le_10ms": 6, "le_50ms": 2}
+                            },
                             "timestamp": "2024-01-01T12:00:00"
                         },
                         "timestamp": "2024-01-01T12:00:00"
@@ -1496,13 +1475,19 @@ class HealthCheckView(APIView):
 
         # 检查数据库连接
         try:
-            service = UnifiedEcommerceService()
+            service = UnifiedEcommerceService.get_instance()
             # 简单的数据库查询测试
             categories = service.get_categories()
             services_status['database'] = 'healthy'
         except Exception as e:
             services_status['database'] = f'unhealthy: {str(e)}'
 
+        # 连接池状态：已借出/溢出连接数、取连接耗时直方图，判断慢请求是否在等连接
+        try:
+            services_status['database_pool'] = pool_status()
+        except Exception as e:
+            services_status['database_pool'] = {'error': str(e)}
+
         # 检查Redis连接
         try:
             if redis_client.ping():
@@ -1545,7 +1530,29 @@ class CacheStatusView(APIView):
                             "jwt_blacklist": {
                                 "total_tokens": 10,
                                 "valid_tokens": 8,
-                                "avg_ttl_minutes": 25.5
+                                "avg_ttl_minutes": 25.5,
+                                "bloom_filter": {
+                                    "enabled": True,
+                                    "entries": 10,
+                                    "capacity": 100000,
+                                    "local_negatives": 5230,
+                                    "redis_checks": 12
+                                }
+                            },
+                            "jwt_verify_cache": {
+                                "size": 120,
+                                "max_size": 10000,
+                                "hits": 5400,
+                                "misses": 130,
+                                "hit_ratio": 0.9765
+                            },
+                            "rate_limiter": {
+                                "backend": "redis",
+                                "local_keys": 0
+                            },
+                            "tiered_cache": {
+                                "l1": {"enabled": True, "size": 40, "hits": 900, "misses": 100, "hit_ratio": 0.9},
+                                "l2": {"hits": 95, "misses": 5, "hit_ratio": 0.95}
                             },
                             "timestamp": "2024-01-01T12:00:00"
                         },
@@ -1580,13 +1587,24 @@ class CacheStatusView(APIView):
             # Redis连接状态
             redis_status = "connected" if redis_client.ping() else "disconnected"
 
+            # 已验证令牌缓存命中情况
+            service = UnifiedEcommerceService.get_instance()
+            token_cache_stats = service.user_system.auth_service.token_cache.stats()
+
             cache_status = {
                 'redis_status': redis_status,
                 'jwt_blacklist': {
                     'total_tokens': blacklist_size,
                     'valid_tokens': blacklist_info.get('valid_tokens', 0),
-                    'avg_ttl_minutes': round(blacklist_info.get('avg_ttl_minutes', 0), 2)
+                    'avg_ttl_minutes': round(blacklist_info.get('avg_ttl_minutes', 0), 2),
+                    'bloom_filter': jwt_blacklist.get_filter_stats()
                 },
+                'jwt_verify_cache': token_cache_stats,
+                'identity_cache': identity_cache.stats(),
+                'rate_limiter': rate_limiter.stats(),
+                'flash_sale_stock': flash_sale_stock.stats(),
+                'login_bookkeeping': login_bookkeeper.stats(),
+                'tiered_cache': CacheUtils.get_tier_stats(),
                 'timestamp': datetime.now().isoformat()
             }
 
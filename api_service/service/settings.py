@@ -39,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.DBSessionMiddleware',
     'api.middleware.JWTAuthenticationMiddleware',
     'api.middleware.SecurityMiddleware',
     'api.middleware.RateLimitMiddleware',
@@ -137,6 +138,10 @@ JWT_CONFIG = {
     'ACCESS_TOKEN_EXPIRE_MINUTES': int(os.getenv('JWT_ACCESS_TOKEN_EXPIRE_MINUTES', 60)),
     'REFRESH_TOKEN_EXPIRE_DAYS': int(os.getenv('JWT_REFRESH_TOKEN_EXPIRE_DAYS', 7)),
     'BLACKLIST_PREFIX': 'jwt_blacklist',
+    # 黑名单本地布隆过滤器（判定不存在时不访问 Redis）
+    'BLACKLIST_BLOOM_CAPACITY': int(os.getenv('JWT_BLACKLIST_BLOOM_CAPACITY', 100000)),
+    'BLACKLIST_BLOOM_ERROR_RATE': float(os.getenv('JWT_BLACKLIST_BLOOM_ERROR_RATE', 0.001)),
+    'BLACKLIST_BLOOM_REBUILD_SECONDS': int(os.getenv('JWT_BLACKLIST_BLOOM_REBUILD_SECONDS', 600)),
 }
 # 日志配置
 LOGGING = {
@@ -206,3 +211,42 @@ CACHES = {
 
 # 缓存配置
 CACHE_TTL = 60 * 15  # 15分钟默认缓存时间
+
+# 进程内一级缓存（位于 Redis 之前，失效消息经 Redis 发布订阅广播）
+CACHE_L1_CONFIG = {
+    'MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', 2000)),
+    'MAX_BYTES': int(os.getenv('CACHE_L1_MAX_BYTES', 32 * 1024 * 1024)),
+    'VERSION_TTL': 30,
+}
+
+# 秒杀库存：用 `python manage.py flash_sale_stock --load <商品ID>` 载入 Redis 的商品下单时只在 Redis 预扣，
+# 各 worker 的后台线程（互斥）按间隔把预扣量同步到数据库
+FLASH_SALE_STOCK_CONFIG = {
+    'ENABLED': os.getenv('FLASH_SALE_STOCK_ENABLED', 'true').lower() == 'true',
+    'RECONCILE_INTERVAL': float(os.getenv('FLASH_SALE_RECONCILE_INTERVAL', 1.0)),
+}
+
+# 登录记账（需要 Redis）：登录失败计数保存在 Redis，last_login / login_count / 失败次数在内存中按用户合并，
+# 由后台线程每隔 FLUSH_INTERVAL 秒批量写回数据库；关闭或没有 Redis 时每次登录同步写库
+LOGIN_BOOKKEEPING_CONFIG = {
+    'WRITE_BEHIND': os.getenv('LOGIN_WRITE_BEHIND', 'true').lower() == 'true',
+    'FLUSH_INTERVAL': float(os.getenv('LOGIN_FLUSH_INTERVAL', 0.2)),
+}
+
+# 限流配置（GCRA：次数 / 窗口秒数），按最长路径前缀匹配路由限额
+RATE_LIMIT_CONFIG = {
+    'BACKEND': os.getenv('RATE_LIMIT_BACKEND', 'redis'),  # redis / local
+    'DEFAULT': (int(os.getenv('RATE_LIMIT_DEFAULT', 100)), 60),
+    'ROUTES': {
+        '/api/auth/login': (20, 60),
+        '/api/auth/cert/': (20, 60),
+        '/api/users/register': (10, 60),
+        '/api/users/send-reset-code': (5, 60),
+        '/api/users/reset-password': (10, 60),
+    },
+    'EXCLUDED_PATHS': [
+        '/api/docs/',
+        '/api/swagger/',
+        '/api/products',  # 商品列表公开，不限流
+    ],
+}
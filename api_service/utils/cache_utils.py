@@ -1,13 +1,94 @@
 from django.core.cache import cache
 from django.conf import settings
 import json
+import math
+import pickle
+import random
+import secrets
+import threading
 import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, NamedTuple
 from src.utils.security import sm3_hexdigest
+from src.Data_base.repositories.identity_cache import identity_cache
+from api_service.utils.local_cache import CacheInvalidationListener, LocalLRUCache
+
+
+class CacheEntry(NamedTuple):
+    """缓存条目：值本身可以是 None/空（负缓存），soft_expires_at 之后视为过期但仍可临时使用"""
+    value: Any
+    soft_expires_at: float
+    compute_seconds: float
+
+    def should_refresh(self, now, beta):
+        """XFetch 概率提前重算：计算越慢、越接近过期，越可能提前刷新"""
+        if beta > 0 and self.compute_seconds > 0:
+            now -= self.compute_seconds * beta * math.log(random.random() or 1e-12)
+        return now >= self.soft_expires_at
+
+
+# 进程内按键合并并发回源（分段锁，避免为每个键建锁）
+_FILL_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+def _fill_lock(cache_key):
+    return _FILL_LOCKS[hash(cache_key) % len(_FILL_LOCKS)]
+
+
+def _is_negative(value):
+    return value is None or (isinstance(value, (list, tuple, dict, str)) and len(value) == 0)
+
+
+class _L1Pickled(bytes):
+    """一级缓存中可变值的序列化形式：每次读取反序列化出独立的副本，调用方修改结果不会影响其他调用方"""
+
+
+_IMMUTABLE_TYPES = (bytes, str, int, float, bool, Decimal, date, datetime)
+
+
+def _is_immutable(value):
+    if value is None or isinstance(value, _IMMUTABLE_TYPES):
+        return True
+    return isinstance(value, tuple) and all(_is_immutable(item) for item in value)
+
+
+def _is_orm_instance(value):
+    if isinstance(value, (list, tuple)):
+        return any(hasattr(item, '_sa_instance_state') for item in value)
+    return hasattr(value, '_sa_instance_state')
+
+
+def _to_l1(value):
+    """不可变值原样放入一级缓存，其余值序列化后放入"""
+    if _is_immutable(value):
+        return value
+    return _L1Pickled(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def _from_l1(value):
+    return pickle.loads(value) if isinstance(value, _L1Pickled) else value
+
+
+# 一级缓存（进程内 LRU），位于 django-redis 二级缓存之前，失效消息经 Redis 发布订阅广播
+_l1_config = getattr(settings, 'CACHE_L1_CONFIG', {})
+l1_cache = LocalLRUCache(
+    max_entries=_l1_config.get('MAX_ENTRIES', 2000),
+    max_bytes=_l1_config.get('MAX_BYTES', 32 * 1024 * 1024)
+)
+l1_invalidation = CacheInvalidationListener(l1_cache)
 
 
 class CacheUtils:
     """缓存工具类"""
 
+    VERSION_KEY_PREFIX = "cache_version"
+    LOCK_KEY_PREFIX = "cache_lock"
+    # 版本号在一级缓存中的保留时间（升级版本时会广播失效）
+    VERSION_L1_TTL = _l1_config.get('VERSION_TTL', 30)
+    l2_hits = 0
+    l2_misses = 0
+
     @staticmethod
     def generate_cache_key(prefix, *args, **kwargs):
         """生成缓存键"""
@@ -33,27 +114,217 @@ class CacheUtils:
         return key_string
 
     @staticmethod
-    def cache_result(key_prefix, expire=300):
-        """缓存装饰器"""
+    def get_namespace_version(namespace):
+        """获取缓存命名空间的当前版本号"""
+        version_key = f"{CacheUtils.VERSION_KEY_PREFIX}:{namespace}"
+        use_l1 = CacheUtils._l1_enabled()
+        if use_l1:
+            version = l1_cache.get(version_key)
+            if version is not None:
+                return version
+        generation = l1_cache.generation
+        try:
+            version = cache.get(version_key)
+            if version is None:
+                # 用毫秒时间戳初始化：版本键被驱逐后重建也不会复用旧版本号
+                cache.add(version_key, int(time.time() * 1000), None)
+                version = cache.get(version_key)
+            if use_l1 and version is not None:
+                l1_cache.set(version_key, version, CacheUtils.VERSION_L1_TTL, size=16, generation=generation)
+            return version
+        except Exception as e:
+            print(f"[缓存错误] 获取缓存版本失败: {e}")
+            return 0
 
-        def decorator(func):
-            def wrapper(*args, **kwargs):
-                # 生成缓存键
-                cache_key = CacheUtils.generate_cache_key(key_prefix, *args, **kwargs)
+    @staticmethod
+    def bump_namespace_version(namespace):
+        """命名空间版本号加一，旧版本的缓存不再被读取，由TTL自然过期"""
+        version_key = f"{CacheUtils.VERSION_KEY_PREFIX}:{namespace}"
+        try:
+            try:
+                version = cache.incr(version_key)
+            except ValueError:
+                cache.add(version_key, int(time.time() * 1000), None)
+                version = cache.get(version_key)
+            l1_invalidation.publish([version_key])
+            print(f"[缓存] 命名空间 {namespace} 版本更新为: {version}")
+            return version
+        except Exception as e:
+            print(f"[缓存错误] 更新缓存版本失败: {e}")
+            return None
+
+    @staticmethod
+    def _acquire_fill_lock(cache_key, lock_timeout):
+        """跨进程回源锁（cache.add 在 Redis 上即 SET NX），返回令牌或 None"""
+        token = secrets.token_hex(8)
+        try:
+            if cache.add(f"{CacheUtils.LOCK_KEY_PREFIX}:{cache_key}", token, lock_timeout):
+                return token
+            return None
+        except Exception as e:
+            print(f"[缓存错误] 获取回源锁失败: {e}")
+            return token
 
-                # 尝试从缓存获取
-                result = cache.get(cache_key)
+    @staticmethod
+    def _release_fill_lock(cache_key, token):
+        lock_key = f"{CacheUtils.LOCK_KEY_PREFIX}:{cache_key}"
+        try:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        except Exception as e:
+            print(f"[缓存错误] 释放回源锁失败: {e}")
+
+    @staticmethod
+    def _l1_enabled():
+        l1_invalidation.ensure_started()
+        return l1_invalidation.ready
 
-                if result is None:
-                    # 缓存未命中，执行函数
-                    result = func(*args, **kwargs)
-                    # 存储到缓存
-                    cache.set(cache_key, result, expire)
-                    print(f"[缓存] 缓存未命中，设置缓存: {cache_key}")
-                else:
-                    print(f"[缓存] 缓存命中: {cache_key}")
+    @staticmethod
+    def _read_entry(cache_key):
+        try:
+            entry = cache.get(cache_key)
+        except Exception as e:
+            print(f"[缓存错误] 读取缓存失败: {e}")
+            return None
+        # 旧格式的裸值按未命中处理，重算后覆盖
+        if isinstance(entry, CacheEntry):
+            CacheUtils.l2_hits += 1
+            return entry
+        CacheUtils.l2_misses += 1
+        return None
 
-                return result
+    @staticmethod
+    def _fill_l1(cache_key, entry, l1_ttl, generation):
+        """将仍在有效期内的条目放入一级缓存，有效期不超过二级缓存的软过期时间
+
+        一级缓存中的值为不可变值或序列化后的字节串（读取时各自反序列化），ORM 实例不放入一级缓存
+        """
+        if entry is None:
+            return
+        if _is_orm_instance(entry.value):
+            print(f"[缓存] ORM 实例不放入一级缓存: {cache_key}")
+            return
+        ttl = min(l1_ttl, entry.soft_expires_at - time.time())
+        if ttl <= 0:
+            return
+        value = _to_l1(entry.value)
+        size = len(value) + 64 if isinstance(value, bytes) else None
+        l1_cache.set(cache_key, entry._replace(value=value), ttl, size=size, generation=generation)
+
+    @staticmethod
+    def _compute_and_store(cache_key, compute, expire, stale_ttl, negative_expire):
+        start = time.time()
+        value = compute()
+        elapsed = time.time() - start
+
+        ttl = expire
+        if _is_negative(value):
+            if not negative_expire:
+                return value, None
+            ttl = negative_expire
+        entry = CacheEntry(value, time.time() + ttl, elapsed)
+        try:
+            cache.set(cache_key, entry, ttl + stale_ttl)
+            print(f"[缓存] 缓存未命中，设置缓存: {cache_key}")
+        except Exception as e:
+            print(f"[缓存错误] 写入缓存失败: {e}")
+        return value, entry
+
+    @staticmethod
+    def get_or_compute(cache_key, compute, expire=300, stale_ttl=0, negative_expire=30,
+                       beta=1.0, lock_timeout=10, lock_wait=2.0, l1_ttl=0):
+        """带防击穿保护的读取
+
+        - 一级缓存（l1_ttl>0）：进程内 LRU 命中时不访问 Redis，失效通过发布订阅广播
+        - 单飞：同一键只有一个调用方回源（进程内分段锁 + 跨进程 cache.add 锁），其余等待结果
+        - 过期后 stale_ttl 秒内：拿到锁的调用方刷新，其余直接返回旧值
+        - 概率提前重算（beta>0）：热点键在过期前分散地被刷新
+        - None/空结果按 negative_expire 缓存（为 0 时不缓存）
+        """
+        use_l1 = l1_ttl > 0 and CacheUtils._l1_enabled()
+        if use_l1:
+            entry = l1_cache.get(cache_key)
+            if entry is not None:
+                return _from_l1(entry.value)
+        generation = l1_cache.generation
+
+        def compute_and_store():
+            value, new_entry = CacheUtils._compute_and_store(
+                cache_key, compute, expire, stale_ttl, negative_expire
+            )
+            if use_l1:
+                CacheUtils._fill_l1(cache_key, new_entry, l1_ttl, generation)
+            return value
+
+        entry = CacheUtils._read_entry(cache_key)
+        if entry is not None:
+            if not entry.should_refresh(time.time(), beta):
+                print(f"[缓存] 缓存命中: {cache_key}")
+                if use_l1:
+                    CacheUtils._fill_l1(cache_key, entry, l1_ttl, generation)
+                return entry.value
+
+            token = CacheUtils._acquire_fill_lock(cache_key, lock_timeout)
+            if token is None:
+                # 其他调用方正在刷新，先返回旧值
+                print(f"[缓存] 返回旧值，等待刷新: {cache_key}")
+                return entry.value
+            try:
+                return compute_and_store()
+            except Exception as e:
+                print(f"[缓存错误] 刷新缓存失败，继续使用旧值: {e}")
+                return entry.value
+            finally:
+                CacheUtils._release_fill_lock(cache_key, token)
+
+        with _fill_lock(cache_key):
+            # 等锁期间可能已被同进程的其他线程填充
+            entry = CacheUtils._read_entry(cache_key)
+            if entry is not None:
+                return entry.value
+
+            token = CacheUtils._acquire_fill_lock(cache_key, lock_timeout)
+            if token is None:
+                # 其他进程正在回源，短暂等待其结果
+                deadline = time.time() + lock_wait
+                while time.time() < deadline:
+                    time.sleep(0.05)
+                    entry = CacheUtils._read_entry(cache_key)
+                    if entry is not None:
+                        return entry.value
+                return compute_and_store()
+            try:
+                return compute_and_store()
+            finally:
+                CacheUtils._release_fill_lock(cache_key, token)
+
+    @staticmethod
+    def cache_result(key_prefix, expire=300, versioned=False, stale_ttl=0, negative_expire=30, beta=1.0,
+                     l1_ttl=0):
+        """缓存装饰器
+
+        versioned=True 时缓存键中带有命名空间版本号，
+        通过 bump_namespace_version(key_prefix) 以 O(1) 使整组缓存失效；
+        防击穿参数见 get_or_compute
+        """
+
+        def decorator(func):
+            def wrapper(*args, **kwargs):
+                # 生成缓存键
+                prefix = key_prefix
+                if versioned:
+                    prefix = f"{key_prefix}:v{CacheUtils.get_namespace_version(key_prefix)}"
+                cache_key = CacheUtils.generate_cache_key(prefix, *args, **kwargs)
+
+                return CacheUtils.get_or_compute(
+                    cache_key,
+                    lambda: func(*args, **kwargs),
+                    expire=expire,
+                    stale_ttl=stale_ttl,
+                    negative_expire=negative_expire,
+                    beta=beta,
+                    l1_ttl=l1_ttl
+                )
 
             return wrapper
 
@@ -61,17 +332,23 @@ class CacheUtils:
 
     @staticmethod
     def invalidate_pattern(pattern):
-        """根据模式删除缓存"""
+        """根据模式删除缓存（SCAN 遍历整个键空间，仅用于运维清理，业务失效请用版本号）"""
         try:
             from django_redis import get_redis_connection
             redis_conn = get_redis_connection("default")
 
-            keys = redis_conn.keys(f"*{pattern}*")
-            if keys:
-                redis_conn.delete(*keys)
-                print(f"[缓存] 已清除缓存模式: {pattern}, 数量: {len(keys)}")
-                return len(keys)
-            return 0
+            deleted = 0
+            batch = []
+            for key in redis_conn.scan_iter(match=f"*{pattern}*", count=1000):
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted += redis_conn.delete(*batch)
+                    batch = []
+            if batch:
+                deleted += redis_conn.delete(*batch)
+            if deleted:
+                print(f"[缓存] 已清除缓存模式: {pattern}, 数量: {deleted}")
+            return deleted
         except Exception as e:
             print(f"[缓存错误] 清除缓存失败: {e}")
             return 0
@@ -79,46 +356,103 @@ class CacheUtils:
     @staticmethod
     def get_cached_or_set(key, default_func, expire=300, *args, **kwargs):
         """获取缓存或设置默认值"""
-        result = cache.get(key)
-        if result is None:
-            result = default_func(*args, **kwargs)
-            cache.set(key, result, expire)
-            print(f"[缓存] 设置缓存: {key}")
-        else:
-            print(f"[缓存] 获取缓存: {key}")
-        return result
+        return CacheUtils.get_or_compute(key, lambda: default_func(*args, **kwargs), expire=expire)
 
     @staticmethod
     def delete_key(key):
         """删除指定缓存键"""
+        return CacheUtils.delete_keys([key]) > 0
+
+    @staticmethod
+    def delete_keys(keys):
+        """删除多个缓存键，并广播一级缓存失效，返回二级缓存中实际删除的数量"""
+        keys = list(keys)
+        deleted = 0
         try:
-            result = cache.delete(key)
-            if result:
-                print(f"[缓存] 删除缓存键: {key}")
-            return result
+            for key in keys:
+                if cache.delete(key):
+                    deleted += 1
+                    print(f"[缓存] 删除缓存键: {key}")
         except Exception as e:
             print(f"[缓存错误] 删除缓存键失败: {e}")
-            return False
+        l1_invalidation.publish(keys)
+        return deleted
+
+    @staticmethod
+    def get_tier_stats():
+        """各级缓存命中情况（本进程）"""
+        l2_total = CacheUtils.l2_hits + CacheUtils.l2_misses
+        return {
+            'l1': dict(l1_cache.stats(), enabled=l1_invalidation.ready),
+            'l2': {
+                'hits': CacheUtils.l2_hits,
+                'misses': CacheUtils.l2_misses,
+                'hit_ratio': round(CacheUtils.l2_hits / l2_total, 4) if l2_total else 0.0,
+            },
+        }
 
 
 class ProductCache:
     """商品缓存管理"""
 
+    # 商品列表缓存存放预先序列化好的 JSON 字节串，命中时不做 ORM 和逐字段序列化
+    LIST_NAMESPACE = "product_list_payload"
+
     @staticmethod
-    @CacheUtils.cache_result("product_list", expire=600)  # 10分钟缓存
-    def get_product_list(keyword=None, category_id=None, min_price=None, max_price=None):
-        """获取商品列表缓存"""
+    def serialize_list_item(product):
+        """商品列表项：只保留列表页需要的字段"""
+        if isinstance(product, dict):
+            return product
+        product_dict = {
+            'product_id': getattr(product, 'product_id', None),
+            'product_name': getattr(product, 'product_name', ''),
+            'sale_price': float(getattr(product, 'sale_price', 0)),
+            'stock_quantity': getattr(product, 'stock_quantity', 0),
+            'image_urls': getattr(product, 'image_urls', []),
+            'description': getattr(product, 'description', ''),
+            'category_id': getattr(product, 'category_id', None),
+            'category_name': getattr(product, 'category_name', ''),
+        }
+        # 移除空值
+        return {k: v for k, v in product_dict.items() if v is not None}
+
+    @staticmethod
+    def render_list_payload(products):
+        """将商品列表渲染为紧凑的 UTF-8 JSON 字节串"""
+        items = [ProductCache.serialize_list_item(product) for product in products or []]
+        return json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @staticmethod
+    @CacheUtils.cache_result(LIST_NAMESPACE, expire=600, versioned=True, stale_ttl=60, l1_ttl=30)  # 10分钟缓存
+    def get_product_list_payload(keyword=None, category_id=None, min_price=None, max_price=None,
+                                 cursor=None, limit=50):
+        """获取商品列表一页，返回 (已序列化的 JSON 字节串, 下一页游标)；游标无效时抛出 InvalidCursor"""
         from src.unified_service import UnifiedEcommerceService
-        service = UnifiedEcommerceService()
-        return service.search_products(keyword, category_id, min_price, max_price)
+        service = UnifiedEcommerceService.get_instance()
+        products, next_cursor = service.search_products_page(
+            keyword, category_id, min_price, max_price, limit=limit, cursor=cursor
+        )
+        return ProductCache.render_list_payload(products), next_cursor
 
     @staticmethod
-    @CacheUtils.cache_result("product_detail", expire=300)  # 5分钟缓存
+    def serialize_detail(product):
+        """商品详情字典（缓存中只存字典，不存 ORM 实例）"""
+        if product is None or isinstance(product, dict):
+            return product
+        product_dict = ProductCache.serialize_list_item(product)
+        product_dict.update(
+            created_at=getattr(product, 'created_at', None),
+            updated_at=getattr(product, 'updated_at', None),
+        )
+        return {k: v for k, v in product_dict.items() if v is not None}
+
+    @staticmethod
+    @CacheUtils.cache_result("product_detail", expire=300, stale_ttl=30, l1_ttl=30)  # 5分钟缓存
     def get_product_detail(product_id):
-        """获取商品详情缓存"""
+        """获取商品详情缓存（返回字典）"""
         from src.unified_service import UnifiedEcommerceService
-        service = UnifiedEcommerceService()
-        return service.get_product_detail(product_id)
+        service = UnifiedEcommerceService.get_instance()
+        return ProductCache.serialize_detail(service.get_product_detail(product_id))
 
     @staticmethod
     def invalidate_product_caches(product_id=None):
@@ -126,13 +460,16 @@ class ProductCache:
         cleared_count = 0
 
         if product_id:
-            # 清除特定商品的缓存
-            cleared_count += CacheUtils.invalidate_pattern(f"product_detail:{product_id}")
+            # 直接删除特定商品的详情缓存（位置参数和关键字参数两种键）
+            cleared_count += CacheUtils.delete_keys((
+                CacheUtils.generate_cache_key("product_detail", product_id),
+                CacheUtils.generate_cache_key("product_detail", product_id=product_id),
+            ))
 
-        # 清除商品列表缓存
-        cleared_count += CacheUtils.invalidate_pattern("product_list")
+        # 商品列表缓存：更新版本号，旧版本缓存由TTL自然过期
+        CacheUtils.bump_namespace_version(ProductCache.LIST_NAMESPACE)
 
-        print(f"[商品缓存] 已清除 {cleared_count} 个缓存")
+        print(f"[商品缓存] 已清除 {cleared_count} 个详情缓存，商品列表缓存已失效")
         return cleared_count
 
 
@@ -140,21 +477,32 @@ class UserCache:
     """用户缓存管理"""
 
     @staticmethod
-    @CacheUtils.cache_result("user_profile", expire=300)  # 5分钟缓存
+    @CacheUtils.cache_result("user_profile", expire=300, negative_expire=0, l1_ttl=30)  # 5分钟缓存，查询失败不缓存
     def get_user_profile(username):
         """获取用户信息缓存"""
         from src.unified_service import UnifiedEcommerceService
-        service = UnifiedEcommerceService()
+        service = UnifiedEcommerceService.get_instance()
         return service.user_system.get_user_info(username)
 
+    @staticmethod
+    def get_identity(username):
+        """获取用户身份（与认证中间件共用同一个身份缓存）"""
+        from src.unified_service import UnifiedEcommerceService
+        service = UnifiedEcommerceService.get_instance()
+        return service.user_system.get_identity(username)
+
     @staticmethod
     def invalidate_user_caches(username=None):
-        """使用户缓存失效"""
+        """使用户缓存失效（资料缓存和身份缓存）"""
         cleared_count = 0
 
         if username:
-            # 清除特定用户的缓存
-            cleared_count += CacheUtils.invalidate_pattern(f"user_profile:{username}")
+            # 直接删除特定用户的缓存
+            cleared_count += CacheUtils.delete_keys((
+                CacheUtils.generate_cache_key("user_profile", username),
+                CacheUtils.generate_cache_key("user_profile", username=username),
+            ))
+            identity_cache.invalidate(username)
 
         print(f"[用户缓存] 已清除 {cleared_count} 个缓存")
         return cleared_count
@@ -1,21 +1,110 @@
+import re
+import threading
 import time
 from django.conf import settings
 from api_service.utils.redis_client import redis_client
+from src.utils.bloom_filter import BloomFilter
 from src.utils.security import sm3_hexdigest
 
+_TOKEN_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
 
 class JWTBlacklist:
-    """JWT令牌黑名单管理器"""
+    """JWT令牌黑名单管理器
+
+    每个进程维护一份黑名单令牌哈希的布隆过滤器：后台线程订阅
+    ``<prefix>:events`` 频道接收新增的令牌哈希，并定期从 Redis 全量重建。
+    过滤器判定"不存在"时直接放行，只有判定"可能存在"的令牌才查询 Redis；
+    订阅中断期间过滤器不可用，所有检查回退到 Redis。
+    """
 
     def __init__(self):
-        self.prefix = getattr(settings, 'JWT_CONFIG', {}).get('BLACKLIST_PREFIX', 'jwt_blacklist')
-        self.token_expire_minutes = getattr(settings, 'JWT_CONFIG', {}).get('ACCESS_TOKEN_EXPIRE_MINUTES', 60)
+        jwt_config = getattr(settings, 'JWT_CONFIG', {})
+        self.prefix = jwt_config.get('BLACKLIST_PREFIX', 'jwt_blacklist')
+        self.token_expire_minutes = jwt_config.get('ACCESS_TOKEN_EXPIRE_MINUTES', 60)
+        self.channel = f"{self.prefix}:events"
+        # 按过期时间排序的索引（成员为令牌哈希，分值为过期时间戳），统计和清理走 ZCOUNT/ZREMRANGEBYSCORE
+        self.index_key = f"{self.prefix}:index"
+
+        # 本地布隆过滤器
+        self.bloom_capacity = jwt_config.get('BLACKLIST_BLOOM_CAPACITY', 100000)
+        self.bloom_error_rate = jwt_config.get('BLACKLIST_BLOOM_ERROR_RATE', 0.001)
+        self.bloom_rebuild_seconds = jwt_config.get('BLACKLIST_BLOOM_REBUILD_SECONDS', 600)
+        self._bloom = None
+        self._bloom_ready = False
+        self._last_rebuild = 0
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self.local_negatives = 0
+        self.redis_checks = 0
+
+    @staticmethod
+    def _token_hash(token):
+        return sm3_hexdigest(token.encode("utf-8"))
 
-    def _get_blacklist_key(self, token):
-        """生成黑名单键（使用token的MD5哈希）"""
-        token_hash = sm3_hexdigest(token.encode("utf-8"))
+    def _get_blacklist_key(self, token, token_hash=None):
+        """生成黑名单键（使用token的SM3哈希）"""
+        token_hash = token_hash or self._token_hash(token)
         return f"{self.prefix}:{token_hash}"
 
+    def _ensure_listener(self):
+        """懒启动订阅线程（仅在连接到 Redis 时启用布隆过滤器）"""
+        if self._listener is not None or not redis_client.connection:
+            return
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="jwt-blacklist-bloom", daemon=True
+                )
+                self._listener.start()
+
+    def _rebuild_filter(self):
+        """从 Redis 全量重建布隆过滤器（同时淘汰已过期的令牌）"""
+        token_hashes = []
+        for key in redis_client.scan_iter(f"{self.prefix}:*"):
+            token_hash = key[len(self.prefix) + 1:]
+            if _TOKEN_HASH_RE.match(token_hash):
+                token_hashes.append(token_hash)
+
+        bloom = BloomFilter(max(self.bloom_capacity, len(token_hashes) * 2), self.bloom_error_rate)
+        for token_hash in token_hashes:
+            bloom.add(bytes.fromhex(token_hash))
+        self._bloom = bloom
+        self._bloom_ready = True
+        self._last_rebuild = time.time()
+        print(f"[JWT黑名单] 布隆过滤器已重建，令牌数: {len(token_hashes)}")
+
+    def _listen(self):
+        """订阅黑名单新增事件；连接中断时标记过滤器不可用并重连"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub()
+                if pubsub is None:
+                    return
+                # 先订阅再重建，重建期间新增的令牌会在之后的消息中补上
+                pubsub.subscribe(self.channel)
+                self._rebuild_filter()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        token_hash = message.get('data')
+                        if isinstance(token_hash, str) and _TOKEN_HASH_RE.match(token_hash):
+                            self._bloom.add(bytes.fromhex(token_hash))
+                    if (time.time() - self._last_rebuild > self.bloom_rebuild_seconds
+                            or self._bloom.saturated):
+                        self._rebuild_filter()
+            except Exception as e:
+                self._bloom_ready = False
+                print(f"[JWT黑名单] 布隆过滤器订阅中断，回退到Redis检查: {e}")
+                time.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
     def add_token(self, token, expire_minutes=None):
         """
         将令牌添加到黑名单
@@ -30,16 +119,21 @@ class JWTBlacklist:
         expire_seconds = expire_minutes * 60
 
         # 存储令牌信息
+        token_hash = self._token_hash(token)
         blacklist_data = {
-            'token_hash': sm3_hexdigest(token.encode("utf-8")),
+            'token_hash': token_hash,
             'added_at': time.time(),
             'expires_at': time.time() + expire_seconds
         }
 
-        key = self._get_blacklist_key(token)
+        key = self._get_blacklist_key(token, token_hash)
         success = redis_client.set_key(key, blacklist_data, expire_seconds)
-
         if success:
+            redis_client.zadd(self.index_key, {token_hash: blacklist_data['expires_at']})
+            # 本进程立即生效，其他进程通过订阅消息更新布隆过滤器
+            if self._bloom is not None:
+                self._bloom.add(bytes.fromhex(token_hash))
+            redis_client.publish(self.channel, token_hash)
             print(f"[JWT黑名单] 令牌已加入黑名单，过期时间: {expire_minutes}分钟")
         else:
             print(f"[JWT黑名单] 令牌加入黑名单失败")
@@ -47,29 +141,87 @@ class JWTBlacklist:
         return success
 
     def is_blacklisted(self, token):
-        """检查令牌是否在黑名单中"""
-        key = self._get_blacklist_key(token)
-        return redis_client.exists_key(key)
+        """检查令牌是否在黑名单中（布隆过滤器判定不存在时不访问 Redis）"""
+        token_hash = self._token_hash(token)
+        if self._bloom_ready:
+            if not self._bloom.might_contain(bytes.fromhex(token_hash)):
+                self.local_negatives += 1
+                return False
+        else:
+            self._ensure_listener()
+        self.redis_checks += 1
+        return redis_client.exists_key(self._get_blacklist_key(token, token_hash))
+
+    def get_filter_stats(self):
+        """布隆过滤器统计信息"""
+        bloom = self._bloom
+        return {
+            'enabled': self._bloom_ready,
+            'entries': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else self.bloom_capacity,
+            'local_negatives': self.local_negatives,
+            'redis_checks': self.redis_checks,
+        }
 
     def remove_token(self, token):
-        """从黑名单中移除令牌"""
-        key = self._get_blacklist_key(token)
-        return redis_client.delete_key(key)
+        """从黑名单中移除令牌（同时移出过期索引，避免 size/info 多计）"""
+        token_hash = self._token_hash(token)
+        key = self._get_blacklist_key(token, token_hash)
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            if pipe is None:
+                return redis_client.delete_key(key)
+            pipe.delete(key)
+            pipe.zrem(self.index_key, token_hash)
+            deleted, _ = pipe.execute()
+            return deleted > 0
+        except Exception as e:
+            print(f"[JWT黑名单] 令牌移出黑名单失败: {e}")
+            return False
 
-    def cleanup_expired_tokens(self):
-        """清理过期的黑名单令牌（Redis会自动处理）"""
+    def rebuild_index(self, batch_size=500):
+        """为索引建立之前加入的令牌补建过期索引（SCAN 遍历 + 管道批量查询 TTL）"""
         try:
-            pattern = f"{self.prefix}:*"
-            keys = redis_client.keys(pattern)
-            cleaned_count = 0
+            pipe = redis_client.pipeline()
+            if pipe is None:
+                return 0
+            indexed = 0
+            batch = []
+            for key in redis_client.scan_iter(f"{self.prefix}:*", count=batch_size):
+                token_hash = key[len(self.prefix) + 1:]
+                if _TOKEN_HASH_RE.match(token_hash):
+                    batch.append(token_hash)
+                if len(batch) >= batch_size:
+                    indexed += self._index_batch(pipe, batch)
+                    batch = []
+            if batch:
+                indexed += self._index_batch(pipe, batch)
+            print(f"[JWT黑名单] 过期索引已重建，令牌数: {indexed}")
+            return indexed
+        except Exception as e:
+            print(f"[JWT黑名单] 重建过期索引失败: {e}")
+            return 0
 
-            for key in keys:
-                ttl = redis_client.get_ttl(key)
-                if ttl <= 0:  # TTL为0或负数表示已过期
-                    redis_client.delete_key(key)
-                    cleaned_count += 1
-                    print(f"[JWT黑名单] 清理过期令牌: {key}")
+    def _index_batch(self, pipe, token_hashes):
+        for token_hash in token_hashes:
+            pipe.ttl(f"{self.prefix}:{token_hash}")
+        ttls = pipe.execute()
+        now = time.time()
+        mapping = {
+            token_hash: now + ttl
+            for token_hash, ttl in zip(token_hashes, ttls)
+            if ttl is not None and ttl > 0
+        }
+        if mapping:
+            redis_client.zadd(self.index_key, mapping)
+        return len(mapping)
 
+    def cleanup_expired_tokens(self):
+        """清理过期的黑名单令牌（令牌键由Redis TTL自动删除，这里清理过期索引）"""
+        try:
+            cleaned_count = redis_client.zremrangebyscore(self.index_key, '-inf', time.time())
+            if cleaned_count:
+                print(f"[JWT黑名单] 清理过期令牌索引: {cleaned_count}")
             return cleaned_count
         except Exception as e:
             print(f"[JWT黑名单] 清理过期令牌失败: {e}")
@@ -78,38 +230,31 @@ class JWTBlacklist:
     def get_blacklist_size(self):
         """获取黑名单大小"""
         try:
-            pattern = f"{self.prefix}:*"
-            keys = redis_client.keys(pattern)
-            valid_count = 0
-
-            for key in keys:
-                if redis_client.get_ttl(key) > 0:
-                    valid_count += 1
-
-            return valid_count
+            return redis_client.zcount(self.index_key, f"({time.time()}", '+inf')
         except Exception as e:
             print(f"[JWT黑名单] 获取黑名单大小失败: {e}")
             return 0
 
-    def get_blacklist_info(self):
-        """获取黑名单统计信息"""
+    def get_blacklist_info(self, ttl_samples=100):
+        """获取黑名单统计信息
+
+        有效令牌数用 ZCOUNT 统计；平均剩余时间按排名等距抽取至多 ttl_samples 个有效令牌估算，不遍历整个索引
+        """
         try:
-            pattern = f"{self.prefix}:*"
-            keys = redis_client.keys(pattern)
-            total_size = len(keys)
-
-            # 正确计算有效令牌数（TTL > 0）
-            valid_tokens = 0
-            total_ttl = 0
-
-            for key in keys:
-                ttl = redis_client.get_ttl(key)
-                if ttl > 0:  # 只有TTL大于0的才是有效令牌
-                    valid_tokens += 1
-                    total_ttl += ttl
-
-            # 计算平均TTL
-            avg_ttl = total_ttl / valid_tokens if valid_tokens > 0 else 0
+            now = time.time()
+            total_size = redis_client.zcard(self.index_key)
+            valid_tokens = redis_client.zcount(self.index_key, f"({now}", '+inf')
+
+            # 索引按过期时间排序，有效令牌位于排名末尾的 valid_tokens 个位置
+            avg_ttl = 0
+            sample_size = min(valid_tokens, ttl_samples)
+            pipe = redis_client.pipeline()
+            if sample_size > 0 and pipe is not None:
+                for i in range(sample_size):
+                    rank = -valid_tokens + i * valid_tokens // sample_size
+                    pipe.zrange(self.index_key, rank, rank, withscores=True)
+                remaining = [max(entry[0][1] - now, 0) for entry in pipe.execute() if entry]
+                avg_ttl = sum(remaining) / len(remaining) if remaining else 0
 
             return {
                 'total_tokens': total_size,
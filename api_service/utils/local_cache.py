@@ -0,0 +1,172 @@
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from api_service.utils.redis_client import redis_client
+
+
+class LocalLRUCache:
+    """进程内一级缓存：按条目数和估算字节数双重限制的 LRU，条目带过期时间"""
+
+    def __init__(self, max_entries=2000, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # 每次失效加一：写入前后代次不同说明期间有失效发生，放弃写入以免缓存旧值
+        self.generation = 0
+
+    @staticmethod
+    def estimate_size(value):
+        if isinstance(value, (bytes, str)):
+            return len(value)
+        try:
+            return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return 1024
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[1] <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl, size=None, generation=None):
+        if ttl <= 0:
+            return
+        size = self.estimate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            self._entries[key] = (value, time.time() + ttl, size)
+            self.total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key):
+        with self._lock:
+            self.generation += 1
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return False
+        self.total_bytes -= item[2]
+        return True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class CacheInvalidationListener:
+    """一级缓存的跨进程失效
+
+    失效操作除删除 Redis 中的键外，还向 ``channel`` 发布消息；
+    每个进程的后台线程订阅该频道并删除本地一级缓存中的对应条目。
+    订阅建立之前或中断期间一级缓存停用（ready=False），避免读到其他进程已失效的数据。
+    其他进程内缓存（如分类树）可用 ``add_handler`` 注册某个键的失效回调，共用同一频道；
+    订阅（重新）建立时所有回调都会执行一次，补上中断期间错过的消息。
+    """
+
+    def __init__(self, local_cache, channel="cache:invalidation"):
+        self.local_cache = local_cache
+        self.channel = channel
+        self.ready = False
+        self._handlers = {}
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def add_handler(self, key, callback):
+        """收到 key 的失效消息时调用 callback()（本进程发布的失效同样调用）"""
+        self._handlers[key] = callback
+
+    def _invalidate_locally(self, keys):
+        for key in keys:
+            self.local_cache.delete(key)
+            handler = self._handlers.get(key)
+            if handler is not None:
+                try:
+                    handler()
+                except Exception as e:
+                    print(f"[缓存] 失效回调执行失败: {key}, {e}")
+
+    def _invalidate_all_locally(self):
+        self.local_cache.clear()
+        for key in list(self._handlers):
+            self._invalidate_locally([key])
+
+    def ensure_started(self):
+        """懒启动订阅线程（仅在连接到 Redis 时启用一级缓存）"""
+        if self._listener is not None or not redis_client.connection:
+            return
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="cache-invalidation", daemon=True
+                )
+                self._listener.start()
+
+    def publish(self, keys):
+        """本进程立即失效，并通知其他进程"""
+        self._invalidate_locally(keys)
+        redis_client.publish(self.channel, json.dumps(list(keys), ensure_ascii=False))
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub()
+                if pubsub is None:
+                    return
+                pubsub.subscribe(self.channel)
+                # 订阅前写入的条目可能已错过失效消息，清空后再启用
+                self._invalidate_all_locally()
+                self.ready = True
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._invalidate_locally(json.loads(message.get('data') or '[]'))
+            except Exception as e:
+                self.ready = False
+                self._invalidate_all_locally()
+                print(f"[缓存] 一级缓存失效订阅中断，暂停使用一级缓存: {e}")
+                time.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
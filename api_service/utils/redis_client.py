@@ -140,6 +140,78 @@ class RedisClient:
             print(f"Redis查找键失败: {e}")
             return []
 
+    def scan_iter(self, pattern, count=1000):
+        """以 SCAN 游标方式遍历匹配的键（不阻塞 Redis）"""
+        try:
+            if self.connection:
+                return self.connection.scan_iter(match=pattern, count=count)
+            return iter([])
+        except Exception as e:
+            print(f"Redis扫描键失败: {e}")
+            return iter([])
+
+    def pipeline(self, transaction=False):
+        """创建管道（无 Redis 连接时返回 None）"""
+        if self.connection:
+            return self.connection.pipeline(transaction=transaction)
+        return None
+
+    def zadd(self, key, mapping):
+        """向有序集合添加成员"""
+        try:
+            if self.connection:
+                return self.connection.zadd(key, mapping)
+            return 0
+        except Exception as e:
+            print(f"Redis有序集合添加失败: {e}")
+            return 0
+
+    def zcard(self, key):
+        """有序集合成员数"""
+        try:
+            if self.connection:
+                return self.connection.zcard(key)
+            return 0
+        except Exception as e:
+            print(f"Redis有序集合计数失败: {e}")
+            return 0
+
+    def zcount(self, key, min_score, max_score):
+        """统计分值区间内的成员数"""
+        try:
+            if self.connection:
+                return self.connection.zcount(key, min_score, max_score)
+            return 0
+        except Exception as e:
+            print(f"Redis有序集合区间计数失败: {e}")
+            return 0
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        """删除分值区间内的成员"""
+        try:
+            if self.connection:
+                return self.connection.zremrangebyscore(key, min_score, max_score)
+            return 0
+        except Exception as e:
+            print(f"Redis有序集合区间删除失败: {e}")
+            return 0
+
+    def publish(self, channel, message):
+        """发布消息"""
+        try:
+            if self.connection:
+                return self.connection.publish(channel, message)
+            return 0
+        except Exception as e:
+            print(f"Redis发布消息失败: {e}")
+            return 0
+
+    def pubsub(self):
+        """创建订阅对象（无 Redis 连接时返回 None）"""
+        if self.connection:
+            return self.connection.pubsub(ignore_subscribe_messages=True)
+        return None
+
     def ping(self):
         """测试连接"""
         try:
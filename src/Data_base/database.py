@@ -1,27 +1,50 @@
+from src.Data_base import config
 from src.Data_base.config import DB_URI
+from src.Data_base.pool_metrics import InstrumentedQueuePool, instrument_pool
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import sessionmaker, scoped_session
 from contextlib import contextmanager
 import logging
 
+
+def create_db_engine(uri=DB_URI, **overrides):
+    """按 config 中的连接池配置创建引擎，并挂上连接池指标（engine.pool.metrics）"""
+    options = dict(
+        poolclass=InstrumentedQueuePool,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        echo=config.DB_ECHO,
+        future=True
+    )
+    options.update(overrides)
+    db_engine = create_engine(uri, **options)
+    instrument_pool(db_engine.pool, slow_wait_ms=config.DB_POOL_SLOW_WAIT_MS)
+    return db_engine
+
+
+def pool_status(db_engine=None):
+    """连接池实时状态和取连接耗时统计，未挂指标的连接池只返回 status() 文本"""
+    db_engine = db_engine or engine
+    metrics = getattr(db_engine.pool, 'metrics', None)
+    if metrics is None:
+        return {'status': db_engine.pool.status()}
+    return metrics.snapshot()
+
+
 # 创建带连接池的引擎
-engine = create_engine(
-    DB_URI,
-    poolclass=QueuePool,
-    pool_size=10,  # 连接池大小
-    max_overflow=20,  # 最大溢出连接数
-    pool_timeout=30,  # 连接超时时间(秒)
-    pool_recycle=3600,  # 连接回收时间(秒)
-    pool_pre_ping=True,  # 连接前ping检测
-    echo=True,  # 实际环境设为False
-    future=True
-)
+engine = create_db_engine()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 请求级会话（按线程隔离），长生命周期的服务对象持有该代理，
+# 每个请求结束时调用 remove_scoped_session() 关闭本线程的会话
+ScopedSession = scoped_session(SessionLocal)
+
 # 声明基类
 Base = declarative_base()
 
@@ -44,6 +67,13 @@ def get_db_session():
     """获取数据库会话"""
     return SessionLocal()
 
+def remove_scoped_session():
+    """关闭并移除当前线程的请求级会话"""
+    try:
+        ScopedSession.remove()
+    except Exception as e:
+        logging.error(f"关闭请求级会话失败: {str(e)}")
+
 def init_db():
     """初始化数据库表"""
     try:
@@ -1,9 +1,9 @@
-from .user import User, UserAddress
+from .user import User, UserAddress, UserActivity
 from .product import Category, Product
-from .order import Order, OrderItem, Payment
+from .order import Order, OrderItem, Payment, SalesRollup
 
 __all__ = [
-    'User', 'UserAddress',
+    'User', 'UserAddress', 'UserActivity',
     'Category', 'Product',
-    'Order', 'OrderItem', 'Payment'
+    'Order', 'OrderItem', 'Payment', 'SalesRollup'
 ]
\ No newline at end of file
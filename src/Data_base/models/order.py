@@ -125,6 +125,24 @@ class Payment(Base):
         return f"<Payment(payment_id={self.payment_id}, amount={self.amount}, status='{self.payment_status}')>"
 
 
+class SalesRollup(Base):
+    """按小时汇总的销售统计（计入统计的订单按创建时间归入小时桶），随订单状态变更增量维护"""
+    __tablename__ = 'sales_rollup_hourly'
+
+    bucket_start = Column(DateTime, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_sales = Column(DECIMAL(14, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<SalesRollup(bucket={self.bucket_start}, orders={self.order_count}, sales={self.total_sales})>"
+
+
+# 游标分页：用户订单列表、按状态的订单队列
+Index('ix_orders_user_created_at_id', Order.user_id, Order.created_at, Order.order_id)
+Index('ix_orders_status_created_at_id', Order.order_status, Order.created_at, Order.order_id)
+
+
 # 添加检查约束
 for table in [Order, OrderItem, Payment]:
     if table == Order:
@@ -48,12 +48,23 @@ class Product(Base):
     category = relationship("Category", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
 
+    # 检查约束与目录查询索引（必须定义在类体内才会生效）
+    # 目录查询固定过滤 is_active/is_available，按 (created_at, product_id) 倒序分页；
+    # 已有数据库用 `python manage.py check_query_plans --create-missing-indexes` 补建索引
+    __table_args__ = (
+        CheckConstraint('sale_price >= 0', name='check_sale_price_positive'),
+        CheckConstraint('stock_quantity >= 0', name='check_stock_quantity_positive'),
+        # 全部在售商品列表
+        Index('ix_products_listing', 'is_active', 'is_available', 'created_at', 'product_id'),
+        # 按分类浏览
+        Index('ix_products_category_listing', 'is_active', 'is_available', 'category_id', 'created_at', 'product_id'),
+        # 只按价格区间筛选
+        Index('ix_products_price', 'is_active', 'is_available', 'sale_price'),
+        # 推荐商品
+        Index('ix_products_featured', 'is_featured', 'is_active', 'is_available', 'created_at'),
+        # 全文检索索引按 updated_at 水位增量同步
+        Index('ix_products_updated_at', 'updated_at'),
+    )
+
     def __repr__(self):
         return f"<Product(product_id={self.product_id}, name='{self.product_name}', price={self.sale_price})>"
-
-
-# 添加检查约束
-__table_args__ = (
-    CheckConstraint('sale_price >= 0', name='check_sale_price_positive'),
-    CheckConstraint('stock_quantity >= 0', name='check_stock_quantity_positive'),
-)
\ No newline at end of file
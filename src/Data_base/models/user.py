@@ -12,7 +12,7 @@ class User(Base):
     email = Column(String(100), unique=True, nullable=False, index=True)
     phone = Column(String(20), index=True)
     avatar_url = Column(String(255))
-    pass_word = Column(String(64), nullable=False)  # 加密后的密码
+    pass_word = Column(String(128), nullable=False)  # 带版本的密码哈希记录：算法$迭代次数$哈希
     is_verified = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
     failed_attempts = Column(Integer, default=0)
@@ -32,6 +32,25 @@ class User(Base):
         return f"<User(user_id={self.user_id}, username='{self.username}', email='{self.email}')>"
 
 
+# 游标分页：用户列表按 (created_at, user_id) 定位下一页
+Index('ix_users_created_at_id', User.created_at, User.user_id)
+
+
+class UserActivity(Base):
+    """用户活跃度计数（每用户一行），下单和登录时增量维护，活跃用户排行按 last_active_at 范围读取"""
+    __tablename__ = 'user_activity'
+
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    last_order_at = Column(DateTime)
+    last_login_at = Column(DateTime)
+    last_active_at = Column(DateTime, index=True)  # last_order_at 与 last_login_at 中较晚者
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<UserActivity(user_id={self.user_id}, orders={self.order_count}, last_active={self.last_active_at})>"
+
+
 class UserAddress(Base):
     __tablename__ = 'user_addresses'
 
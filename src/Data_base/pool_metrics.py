@@ -0,0 +1,139 @@
+"""连接池指标
+
+``InstrumentedQueuePool`` 在每次从连接池取连接时计时（包括等待空闲连接和新建溢出连接的时间），
+``PoolMetrics`` 汇总为等待时间直方图、超时次数，并给出连接池的实时状态（已借出、溢出数等）。
+
+连接全部借出后再取连接要排队等待，这时记录一次"耗尽"并输出警告（同类警告每 ``warn_interval`` 秒最多一次），
+据此判断慢请求是否在等连接池。
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# 取连接耗时直方图的桶上界（毫秒），最后一个桶收集更慢的请求
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    """单个连接池的取连接耗时与耗尽统计"""
+
+    def __init__(self, pool: QueuePool, slow_wait_ms: float = 100, warn_interval: float = 10):
+        self.pool = pool
+        self.slow_wait_ms = slow_wait_ms
+        self.warn_interval = warn_interval
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.exhausted = 0
+            self.slow_waits = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+            self._last_warning = 0.0
+
+    def capacity(self) -> int:
+        return self.pool.size() + max(self.pool._max_overflow, 0)
+
+    def is_exhausted(self) -> bool:
+        """连接已全部借出（max_overflow 为负数表示不限溢出，永不耗尽）"""
+        return self.pool._max_overflow >= 0 and self.pool.checkedout() >= self.capacity()
+
+    def record_wait(self, wait_ms: float, exhausted: bool, timed_out: bool = False):
+        bucket = len(WAIT_BUCKETS_MS)
+        for index, bound in enumerate(WAIT_BUCKETS_MS):
+            if wait_ms <= bound:
+                bucket = index
+                break
+        now = time.time()
+        with self._lock:
+            self.histogram[bucket] += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if exhausted:
+                self.exhausted += 1
+            slow = wait_ms >= self.slow_wait_ms
+            if slow:
+                self.slow_waits += 1
+            warn = (exhausted or slow or timed_out) and now - self._last_warning >= self.warn_interval
+            if warn:
+                self._last_warning = now
+        if warn:
+            logger.warning(
+                f"数据库连接池{'取连接超时' if timed_out else '已耗尽' if exhausted else '取连接缓慢'}: "
+                f"等待 {wait_ms:.1f} ms, {self.status_line()}"
+            )
+
+    def status_line(self) -> str:
+        return (f"已借出 {self.pool.checkedout()}/{self.capacity()}, "
+                f"空闲 {self.pool.checkedin()}, 溢出 {self.pool.overflow()}")
+
+    def snapshot(self) -> Dict[str, object]:
+        """实时状态 + 累计统计，供健康检查/指标接口输出"""
+        with self._lock:
+            total = self.checkouts + self.timeouts
+            histogram = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.histogram)}
+            histogram["gt_%sms" % WAIT_BUCKETS_MS[-1]] = self.histogram[-1]
+            return {
+                "pool_size": self.pool.size(),
+                "max_overflow": self.pool._max_overflow,
+                "checked_out": self.pool.checkedout(),
+                "checked_in": self.pool.checkedin(),
+                "overflow": self.pool.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "exhausted": self.exhausted,
+                "slow_waits": self.slow_waits,
+                "avg_wait_ms": round(self.total_wait_ms / total, 3) if total else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "wait_histogram": histogram,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """带取连接计时的 QueuePool，metrics 为 None 时与 QueuePool 完全相同"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        metrics = self.metrics
+        if metrics is None:
+            return super()._do_get()
+        exhausted = metrics.is_exhausted()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            metrics.record_wait((time.perf_counter() - start) * 1000, exhausted, timed_out=True)
+            raise
+        metrics.record_wait((time.perf_counter() - start) * 1000, exhausted)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() 等会用新的连接池替换旧的，指标随之转移
+        pool = super().recreate()
+        if self.metrics is not None:
+            pool.metrics = self.metrics
+            self.metrics.pool = pool
+        return pool
+
+
+def instrument_pool(pool, **kwargs) -> Optional[PoolMetrics]:
+    """为 InstrumentedQueuePool 挂上指标，其他类型的连接池（如 SQLite 的单线程池）返回 None"""
+    if not isinstance(pool, InstrumentedQueuePool):
+        return None
+    pool.metrics = PoolMetrics(pool, **kwargs)
+    return pool.metrics
@@ -0,0 +1,136 @@
+"""查询计划检查
+
+对仓储层实际生成的 SQL 执行 ``EXPLAIN``，找出对业务表的全表扫描：
+
+- MySQL：``EXPLAIN`` 结果中 ``type = ALL`` 的行
+- SQLite：``EXPLAIN QUERY PLAN`` 中 ``SCAN <表名>`` 且未使用索引的行
+
+表中数据很少时 MySQL 优化器可能直接选择全表扫描，应在有代表性数据量的库上检查。
+另提供 ``ensure_indexes``，为已存在的表补建模型中声明、但库中还没有的索引
+（``create_all`` 只建缺失的表，不会给旧表加索引）。
+"""
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, NamedTuple
+
+from sqlalchemy import event, inspect
+
+from src.Data_base.models.order import Order
+from src.Data_base.models.product import Product
+from src.Data_base.models.user import User
+from src.Data_base.repositories.pagination import encode_keyset_cursor
+from src.Data_base.repositories.product_repository import ProductRepository
+from src.Data_base.repositories.product_search import ProductSearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+# 有声明索引需要补建的模型
+INDEXED_MODELS = (Product, Order, User)
+
+
+class PlanProblem(NamedTuple):
+    shape: str
+    statement: str
+    detail: str
+
+
+@contextmanager
+def capture_statements(engine):
+    """记录 with 块内在 engine 上执行的 SELECT 语句，产出 [(语句, 参数)]"""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def explain(connection, statement, parameters):
+    """返回计划行列表（每行一个字典）"""
+    prefix = "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    result = connection.exec_driver_sql(prefix + statement, parameters)
+    return [dict(row._mapping) for row in result]
+
+
+def find_full_scans(dialect_name, plan, tables):
+    """返回计划中对 tables 的全表扫描描述"""
+    scans = []
+    for row in plan:
+        if dialect_name == "sqlite":
+            detail = row.get("detail", "")
+            words = detail.split()
+            if len(words) >= 2 and words[0] == "SCAN" and words[1] in tables and "INDEX" not in detail:
+                scans.append(detail)
+        elif row.get("type") == "ALL" and row.get("table") in tables:
+            scans.append(f"{row.get('table')}: type=ALL, rows={row.get('rows')}, possible_keys={row.get('possible_keys')}")
+    return scans
+
+
+def catalog_query_shapes():
+    """目录相关的查询形态：(名称, 以 db 会话为参数执行查询的函数)"""
+    cursor = encode_keyset_cursor(datetime(2024, 1, 1), 1)
+
+    def search(**kwargs):
+        return lambda db: ProductRepository(db).search_products_page(**kwargs)
+
+    def search_index_catch_up(db):
+        db.execute(ProductSearchIndex._columns().where(Product.updated_at >= datetime(2024, 1, 1))).all()
+
+    return [
+        ("商品列表", search()),
+        ("商品列表-下一页", search(cursor=cursor)),
+        ("按分类浏览", search(category_id=1)),
+        ("按分类浏览-下一页", search(category_id=1, cursor=cursor)),
+        ("价格区间", search(min_price=10, max_price=100)),
+        ("分类+价格区间", search(category_id=1, min_price=10, max_price=100)),
+        ("分类商品", lambda db: ProductRepository(db).get_products_by_category(1, cursor=cursor)),
+        ("推荐商品", lambda db: ProductRepository(db).get_featured_products()),
+        ("检索索引增量同步", search_index_catch_up),
+    ]
+
+
+def check_query_plans(db, shapes=None, tables=("products",)) -> List[PlanProblem]:
+    """执行各查询形态并检查其计划，返回发现的全表扫描"""
+    engine = db.get_bind()
+    problems = []
+    for name, run in shapes or catalog_query_shapes():
+        with capture_statements(engine) as captured:
+            run(db)
+        if not captured:
+            problems.append(PlanProblem(name, "", "未捕获到查询语句"))
+            continue
+        for statement, parameters in captured:
+            plan = explain(db.connection(), statement, parameters)
+            for detail in find_full_scans(engine.dialect.name, plan, tables):
+                problems.append(PlanProblem(name, statement, detail))
+    return problems
+
+
+def missing_indexes(engine, models=INDEXED_MODELS):
+    """返回模型中声明、但数据库中不存在的索引"""
+    inspector = inspect(engine)
+    missing = []
+    for model in models:
+        table = model.__table__
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def ensure_indexes(engine, models=INDEXED_MODELS):
+    """补建缺失的索引，返回新建的索引名"""
+    created = []
+    for index in missing_indexes(engine, models):
+        index.create(bind=engine)
+        logger.info(f"已创建索引: {index.table.name}.{index.name}")
+        created.append(index.name)
+    return created
@@ -2,6 +2,7 @@ from typing import List, Optional, TypeVar, Generic, Type, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, asc
 from src.Data_base.database import Base
+from src.Data_base.repositories.pagination import InvalidCursor, apply_keyset, next_keyset_cursor
 import logging
 
 ModelType = TypeVar("ModelType", bound=Base)
@@ -18,19 +19,33 @@ class BaseRepository(Generic[ModelType]):
     def get_by_id(self, id: Any) -> Optional[ModelType]:
         """根据ID获取记录"""
         try:
-            result = self.db.query(self.model).filter(self.model.__table__.columns.get('id', None) == id).first()
+            result = self.db.query(self.model).filter(self._primary_key() == id).first()
             logger.debug(f"根据ID查询 {self.model.__name__}: {id}")
             return result
         except Exception as e:
             logger.error(f"查询 {self.model.__name__} 失败: {str(e)}")
             return None
 
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[ModelType]:
-        """获取所有记录（分页）"""
+    def _primary_key(self):
+        return self.model.__mapper__.primary_key[0]
+
+    def next_cursor(self, items: List[ModelType], limit: int) -> Optional[str]:
+        """本页取满时返回下一页游标（按 created_at + 主键）"""
+        return next_keyset_cursor(items, limit, self._primary_key().key)
+
+    def get_all(self, skip: int = 0, limit: int = 100, cursor: str = None) -> List[ModelType]:
+        """获取所有记录（分页，按创建时间排序；传入 cursor 时按游标分页，忽略 skip；游标无效时抛出 InvalidCursor）"""
         try:
-            results = self.db.query(self.model).offset(skip).limit(limit).all()
+            query = self.db.query(self.model)
+            if hasattr(self.model, 'created_at'):
+                query = apply_keyset(query, self.model.created_at, self._primary_key(), cursor, descending=False)
+            if not cursor:
+                query = query.offset(skip)
+            results = query.limit(limit).all()
             logger.debug(f"获取所有 {self.model.__name__}, skip={skip}, limit={limit}")
             return results
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"获取所有 {self.model.__name__} 失败: {str(e)}")
             return []
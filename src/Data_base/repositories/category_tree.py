@@ -0,0 +1,91 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def build_category_tree(rows):
+    """由已按 (sort_order, category_id) 排序的分类行组装任意深度的分类树，O(n)
+
+    父分类不存在或未启用的分类不可达，不出现在树中（也因此不会因环形引用死循环）
+    """
+    nodes = {}
+    children_of = {}
+    for row in rows:
+        node = {
+            'category_id': row.category_id,
+            'category_name': row.category_name,
+            'parent_id': row.parent_category_id,
+            'level': row.category_level,
+            'sort_order': row.sort_order,
+            'children': [],
+        }
+        nodes[row.category_id] = node
+        children_of.setdefault(row.parent_category_id, []).append(node)
+
+    roots = children_of.get(None, [])
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        children = children_of.get(node['category_id'])
+        if children:
+            node['children'] = children
+            stack.extend(children)
+    return roots
+
+
+class CategoryTreeCache:
+    """分类树进程内缓存
+
+    本进程内的分类写入立即失效；配置失效频道（``use_invalidation_channel``）后失效消息广播到其他进程，
+    未配置或频道中断时其他进程的写入最多延迟 ttl 秒可见
+    """
+
+    INVALIDATION_KEY = "category_tree"
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._channel = None
+        self._tree = None
+        self._expires_at = 0
+        # 每次失效加一：加载期间发生失效则不缓存加载结果
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, loader):
+        """返回缓存的分类树，过期或失效时调用 loader() 重新加载"""
+        tree = self._tree
+        if tree is not None and time.time() < self._expires_at:
+            return tree
+        generation = self._generation
+        tree = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._tree = tree
+                self._expires_at = time.time() + self.ttl
+        return tree
+
+    def use_invalidation_channel(self, channel):
+        """channel 需提供 add_handler(key, callback) 和 publish(keys)（即一级缓存的失效频道）"""
+        channel.add_handler(self.INVALIDATION_KEY, self.invalidate_local)
+        self._channel = channel
+
+    def invalidate(self):
+        """分类写入后调用：本进程立即失效，并通知其他进程"""
+        self.invalidate_local()
+        if self._channel is not None:
+            try:
+                self._channel.publish([self.INVALIDATION_KEY])
+            except Exception as e:
+                logger.error(f"分类树失效广播失败: {e}")
+
+    def invalidate_local(self):
+        with self._lock:
+            self._generation += 1
+            self._tree = None
+        logger.debug("分类树缓存已失效")
+
+
+category_tree_cache = CategoryTreeCache(ttl=int(os.getenv("CATEGORY_TREE_CACHE_SECONDS", "300")))
@@ -0,0 +1,223 @@
+"""用户身份缓存
+
+令牌校验只需要用户的身份信息（是否存在、是否启用、角色、令牌版本），不必每个请求都查 users 表。
+``IdentityCache`` 以用户名和用户ID为键缓存紧凑的 ``UserIdentity``：
+
+- 进程内 LRU（``local_ttl`` 秒），配置 Redis 后再加一层各 worker 共享的缓存（``shared_ttl`` 秒）
+- 首次读取时加载；密码、角色、资料变更后由修改方调用 ``invalidate``，
+  其他 worker 的进程内条目最多 ``local_ttl`` 秒后过期
+- 加载期间发生失效时不缓存加载结果：进程内用本地代数判断，Redis 中用共享代数键判断
+  （``invalidate`` 递增代数键，写入共享缓存的 Lua 脚本在代数变化时放弃写入）
+- 只缓存存在的用户，注册后无需失效
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# KEYS: 代数键, 用户名键, 用户ID键；ARGV: 加载前读到的代数, 身份JSON, 过期秒数
+# 加载期间有 worker 失效过身份（代数已变）则不写入，返回 0
+_PUT_IF_GENERATION_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def token_version(salt: Optional[str]) -> str:
+    """令牌版本：修改/重置密码会生成新盐值，之前签发的令牌随之失效（升级密码哈希时沿用盐值，不影响令牌）"""
+    return hashlib.blake2b((salt or "").encode("utf-8"), digest_size=6).hexdigest()
+
+
+class UserIdentity(NamedTuple):
+    user_id: int
+    username: str
+    user_role: str
+    is_active: bool
+    is_verified: bool
+    token_version: str
+
+    @classmethod
+    def from_row(cls, row) -> "UserIdentity":
+        """由包含 user_id/username/user_role/is_active/is_verified/salt 的行构造"""
+        return cls(
+            user_id=row.user_id,
+            username=row.username,
+            user_role=row.user_role or 'normal',
+            # 与模型默认值一致：未设置视为启用、未验证
+            is_active=row.is_active is not False,
+            is_verified=bool(row.is_verified),
+            token_version=token_version(row.salt),
+        )
+
+
+class IdentityCache:
+    """用户身份两级缓存（进程内 LRU + 可选 Redis）"""
+
+    def __init__(self, local_ttl: float = 5, shared_ttl: int = 300, max_size: int = 10000, prefix: str = "identity"):
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.max_size = max_size
+        self.prefix = prefix
+        self.connection = None
+        self._entries = OrderedDict()
+        # 每次失效加一：加载期间发生失效则不缓存加载结果
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def use_connection(self, connection):
+        self._put_if_generation = connection.register_script(_PUT_IF_GENERATION_SCRIPT)
+        self.connection = connection
+
+    @staticmethod
+    def _name_key(username):
+        return f"name:{username}"
+
+    @staticmethod
+    def _id_key(user_id):
+        return f"id:{int(user_id)}"
+
+    def get(self, username: str, load: Callable[[], Optional[UserIdentity]]) -> Optional[UserIdentity]:
+        """按用户名取身份，未缓存时调用 load() 加载"""
+        return self._get(self._name_key(username), load)
+
+    def get_by_id(self, user_id: int, load: Callable[[], Optional[UserIdentity]]) -> Optional[UserIdentity]:
+        """按用户ID取身份，未缓存时调用 load() 加载"""
+        return self._get(self._id_key(user_id), load)
+
+    def _get(self, key, load):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            generation = self._generation
+
+        identity, shared_generation = self._get_shared(key)
+        loaded = identity is None
+        if loaded:
+            identity = load()
+        with self._lock:
+            if loaded:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+            fresh = identity is not None and generation == self._generation
+        if fresh and loaded:
+            fresh = self._put_shared(identity, shared_generation)
+        if fresh:
+            with self._lock:
+                if generation == self._generation:
+                    self._put_local(identity, now + self.local_ttl)
+        return identity
+
+    def _put_local(self, identity, expires_at):
+        for key in self._identity_keys(identity):
+            self._entries[key] = (identity, expires_at)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _redis_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    @property
+    def _generation_key(self):
+        return f"{self.prefix}:generation"
+
+    def _get_shared(self, key) -> Tuple[Optional[UserIdentity], Optional[str]]:
+        """返回 (共享缓存中的身份, 当前共享代数)"""
+        if self.connection is None:
+            return None, None
+        try:
+            raw, generation = self.connection.mget(self._redis_key(key), self._generation_key)
+            return (UserIdentity(**json.loads(raw)) if raw else None), generation or '0'
+        except Exception as e:
+            logger.warning(f"Redis身份缓存读取失败: {e}")
+            return None, None
+
+    def _put_shared(self, identity: UserIdentity, generation: Optional[str]) -> bool:
+        """写入共享缓存；加载期间已被其他 worker 失效时返回 False（调用方也不应缓存到本地）"""
+        if self.connection is None or generation is None:
+            return True
+        try:
+            raw = json.dumps(identity._asdict(), ensure_ascii=False)
+            return bool(self._put_if_generation(
+                keys=[self._generation_key,
+                      self._redis_key(self._name_key(identity.username)),
+                      self._redis_key(self._id_key(identity.user_id))],
+                args=[generation, raw, self.shared_ttl]
+            ))
+        except Exception as e:
+            logger.warning(f"Redis身份缓存写入失败: {e}")
+            return True
+
+    def _identity_keys(self, identity: UserIdentity):
+        return {self._name_key(identity.username), self._id_key(identity.user_id)}
+
+    def invalidate(self, username: Optional[str] = None, user_id: Optional[int] = None):
+        """用户的密码、角色、状态或资料变更后调用；只给出一个键时，另一个键按已缓存的身份找到"""
+        keys = set()
+        if username:
+            keys.add(self._name_key(username))
+        if user_id is not None:
+            keys.add(self._id_key(user_id))
+        for key in list(keys):
+            with self._lock:
+                entry = self._entries.get(key)
+            cached = entry[0] if entry is not None else self._get_shared(key)[0]
+            if cached is not None:
+                keys.update(self._identity_keys(cached))
+
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.connection is not None:
+            try:
+                pipe = self.connection.pipeline()
+                pipe.incr(self._generation_key)
+                if keys:
+                    pipe.delete(*(self._redis_key(key) for key in keys))
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Redis身份缓存失效失败: {sorted(keys)}, {e}")
+        logger.debug(f"用户身份缓存已失效: {sorted(keys)}")
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'shared': self.connection is not None,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.shared_hits) / total, 4) if total else 0.0,
+            }
+
+
+identity_cache = IdentityCache(
+    local_ttl=float(os.getenv("IDENTITY_CACHE_LOCAL_SECONDS", "5")),
+    shared_ttl=int(os.getenv("IDENTITY_CACHE_SECONDS", "300")),
+    max_size=int(os.getenv("IDENTITY_CACHE_SIZE", "10000")),
+)
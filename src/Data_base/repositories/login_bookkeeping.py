@@ -0,0 +1,257 @@
+"""登录记账 write-behind
+
+登录成功要重置失败次数、更新 last_login / login_count，登录失败要累加失败次数并可能锁定账户，
+原来每次登录对 users 同一行同步提交两三个写事务，热门账户的登录吞吐受行锁争用限制。
+
+- 失败次数和锁定状态决定是否放行，必须强一致：保存在 Redis（Lua 脚本原子累加），
+  Redis 出错时临时改用进程内计数
+- 写回数据库的字段先在内存中按用户合并（失败次数、锁定时间取最后一次，登录次数累加，登录时间取最晚），
+  由后台线程每隔几百毫秒用 ``UPDATE ... CASE`` 批量写入；进程异常退出时最多丢失一个间隔内的登录时间和次数
+- 未启动后台线程时不启用，登录流程照旧同步写库
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+
+from src.Data_base.models.user import User
+from src.Data_base.repositories.user_activity import UserActivityRepository
+
+logger = logging.getLogger(__name__)
+
+# KEYS: 失败次数键, 锁定键；ARGV: 初始失败次数, 最大失败次数, 锁定毫秒数
+# 返回本次累加后的失败次数，已锁定时返回 -1
+_RECORD_FAILURE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return -1
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+local attempts = redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('SET', KEYS[2], 1, 'PX', ARGV[3])
+end
+return attempts
+"""
+
+
+class LoginBookkeeper:
+    """登录失败计数（强一致）+ 用户登录字段的批量异步写回"""
+
+    def __init__(self, connection=None, prefix: str = "login", max_attempts: int = 5,
+                 lock_seconds: int = 3600, batch_size: int = 500):
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+        self.lock_seconds = lock_seconds
+        self.batch_size = batch_size
+        self.connection = None
+        # Redis 出错时的进程内计数：{user_id: (失败次数, 过期时间)}、{user_id: 解锁时间}
+        self._attempts = {}
+        self._locks = {}
+        # 待写回：{user_id: {列名: 值}}，login_count 为增量
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self.flushed = 0
+        if connection is not None:
+            self.use_connection(connection)
+
+    def use_connection(self, connection):
+        self._record_failure = connection.register_script(_RECORD_FAILURE_SCRIPT)
+        self.connection = connection
+
+    @property
+    def enabled(self):
+        return self._flusher is not None
+
+    def _keys(self, user_id):
+        return f"{self.prefix}:failed:{user_id}", f"{self.prefix}:locked:{user_id}"
+
+    # ---- 失败计数与锁定 ----
+
+    def _seed(self, user: User) -> int:
+        # 计数键不存在时以数据库中的失败次数为起点；已达上限说明锁定已过期，从 0 开始
+        attempts = user.failed_attempts or 0
+        return 0 if attempts >= self.max_attempts else attempts
+
+    def is_locked(self, user: User) -> bool:
+        """账户是否处于锁定期"""
+        if user.account_locked_until and user.account_locked_until > datetime.now():
+            return True
+        if self.connection is not None:
+            try:
+                return bool(self.connection.exists(self._keys(user.user_id)[1]))
+            except Exception as e:
+                logger.warning(f"Redis登录锁定查询失败，使用本地计数: {e}")
+        with self._lock:
+            return self._locks.get(user.user_id, 0) > time.time()
+
+    def record_failure(self, user: User) -> Tuple[int, Optional[datetime]]:
+        """累加失败次数，返回 (失败次数, 锁定截止时间)；达到上限时锁定账户"""
+        attempts = None
+        if self.connection is not None:
+            try:
+                attempts = int(self._record_failure(
+                    keys=list(self._keys(user.user_id)),
+                    args=[self._seed(user), self.max_attempts, self.lock_seconds * 1000]
+                ))
+            except Exception as e:
+                logger.warning(f"Redis登录失败计数失败，使用本地计数: {e}")
+        if attempts is None:
+            attempts = self._record_failure_locally(user)
+        if attempts < 0:
+            # 并发请求已将账户锁定
+            return self.max_attempts, None
+
+        locked_until = None
+        if attempts >= self.max_attempts:
+            locked_until = datetime.now() + timedelta(seconds=self.lock_seconds)
+        self._buffer(user.user_id, failed_attempts=attempts, account_locked_until=locked_until)
+        return attempts, locked_until
+
+    def _record_failure_locally(self, user: User) -> int:
+        now = time.time()
+        with self._lock:
+            if self._locks.get(user.user_id, 0) > now:
+                return -1
+            attempts, expires_at = self._attempts.get(user.user_id, (None, 0))
+            if expires_at <= now:
+                attempts = self._seed(user)
+            attempts += 1
+            self._attempts[user.user_id] = (attempts, now + self.lock_seconds)
+            if attempts >= self.max_attempts:
+                self._locks[user.user_id] = now + self.lock_seconds
+            return attempts
+
+    def _clear_attempts(self, user_id: int):
+        # 计数置 0 而不是删除：写回完成前数据库中仍是旧的失败次数，不能用作下次的起点
+        if self.connection is not None:
+            try:
+                failed_key, locked_key = self._keys(user_id)
+                pipe = self.connection.pipeline()
+                pipe.set(failed_key, 0, px=self.lock_seconds * 1000)
+                pipe.delete(locked_key)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Redis登录失败计数清除失败: {e}")
+        with self._lock:
+            self._attempts[user_id] = (0, time.time() + self.lock_seconds)
+            self._locks.pop(user_id, None)
+
+    def record_success(self, user_id: int, login_at: Optional[datetime] = None):
+        """登录成功：清除失败次数，登录时间和次数稍后写回"""
+        self._clear_attempts(user_id)
+        self._buffer(user_id, failed_attempts=0, account_locked_until=None,
+                     last_login=login_at or datetime.now(), login_count=1)
+
+    def reset(self, user_id: int):
+        """重置/修改密码后调用：清除失败次数，丢弃尚未写回的失败次数和锁定时间（数据库已同步清零）"""
+        self._clear_attempts(user_id)
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending:
+                pending.pop('failed_attempts', None)
+                pending.pop('account_locked_until', None)
+
+    # ---- 写回 ----
+
+    def _buffer(self, user_id: int, **values):
+        with self._lock:
+            self._merge(self._pending.setdefault(user_id, {}), values)
+
+    @staticmethod
+    def _merge(pending: dict, values: dict):
+        for column, value in values.items():
+            if column == 'login_count':
+                pending[column] = pending.get(column, 0) + value
+            elif column == 'last_login':
+                pending[column] = max(pending.get(column) or value, value)
+            else:
+                pending[column] = value
+
+    def flush(self, db: Session) -> int:
+        """把合并后的登录字段批量写回数据库，返回写回的用户数；失败时放回缓冲区下次重试"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            user_ids = sorted(pending)
+            for start in range(0, len(user_ids), self.batch_size):
+                self._update_users(db, {user_id: pending[user_id] for user_id in user_ids[start:start + self.batch_size]})
+            logins = {user_id: values['last_login'] for user_id, values in pending.items() if 'last_login' in values}
+            if logins:
+                UserActivityRepository(db).record_logins(logins)
+            db.commit()
+            self.flushed += len(pending)
+            return len(pending)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"登录记录写回失败，下次重试: {e}")
+            with self._lock:
+                # 失败期间又有新的登录：新值覆盖旧值，增量相加
+                for user_id, values in pending.items():
+                    newer = self._pending.get(user_id, {})
+                    merged = dict(values)
+                    self._merge(merged, newer)
+                    self._pending[user_id] = merged
+            return 0
+
+    @staticmethod
+    def _update_users(db: Session, pending: Dict[int, dict]):
+        """一条 UPDATE 写回一批用户，各列按 user_id 取值（未变更的用户保持原值）"""
+        values = {}
+        for column in ('failed_attempts', 'account_locked_until', 'last_login'):
+            whens = {user_id: row[column] for user_id, row in pending.items() if column in row}
+            if whens:
+                values[column] = case(whens, value=User.user_id, else_=getattr(User, column))
+        counts = {user_id: row['login_count'] for user_id, row in pending.items() if row.get('login_count')}
+        if counts:
+            values['login_count'] = func.coalesce(User.login_count, 0) + case(counts, value=User.user_id, else_=0)
+        if values:
+            db.execute(
+                update(User).where(User.user_id.in_(list(pending))).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+    def start_flusher(self, session_factory, interval: float = 0.2):
+        """启动后台写回线程（启动后登录流程改用本类记账），进程退出时再写回一次"""
+        if self._flusher is not None:
+            return
+
+        def flush_once():
+            db = session_factory()
+            try:
+                self.flush(db)
+            except Exception as e:
+                logger.error(f"登录记录写回线程异常: {e}")
+            finally:
+                db.close()
+
+        def run():
+            while True:
+                time.sleep(interval)
+                flush_once()
+
+        self._flusher = threading.Thread(target=run, name="login-bookkeeping-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(flush_once)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "backend": "redis" if self.connection is not None else "local",
+                "pending": len(self._pending),
+                "flushed": self.flushed,
+            }
+
+
+login_bookkeeper = LoginBookkeeper()
@@ -1,41 +1,248 @@
-from typing import List, Optional, Dict, Any
+import secrets
+from decimal import Decimal
+from typing import List, NamedTuple, Optional, Dict, Any
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, asc, func
+from sqlalchemy import desc, asc, func, insert, select, update
 from datetime import datetime
 from src.Data_base.models.order import Order, OrderItem, Payment, OrderStatus, PaymentStatus
+from src.Data_base.models.product import Product
 from src.Data_base.repositories.base_repository import BaseRepository
+from src.Data_base.repositories.pagination import InvalidCursor, apply_keyset
+from src.Data_base.repositories.sales_rollup import SalesRollupRepository
+from src.Data_base.repositories.stock_reservation import flash_sale_stock, merge_quantities, reserve_stock
+from src.Data_base.repositories.user_activity import UserActivityRepository
 import logging
 
 logger = logging.getLogger(__name__)
 
+CENT = Decimal('0.01')
+
+
+class OrderPlacement(NamedTuple):
+    """批量下单中单个订单的结果"""
+    order_number: str
+    order_id: Optional[int] = None
+    total_amount: Optional[Decimal] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def generate_order_number() -> str:
+    return f"ORD{datetime.now():%Y%m%d%H%M%S}{secrets.token_hex(4).upper()}"
+
+
+def _order_number(spec) -> str:
+    order_number = spec.get('order_number') if isinstance(spec, dict) else None
+    return str(order_number) if order_number else generate_order_number()
+
+
+def parse_amount(value) -> Decimal:
+    """金额字段 -> 保留两位小数的 Decimal，空值为 0；非数字抛出 ValueError/InvalidOperation"""
+    amount = Decimal(str(value or 0))
+    if not amount.is_finite():
+        raise ValueError(f"金额无效: {value}")
+    return amount.quantize(CENT)
+
 
 class OrderRepository(BaseRepository[Order]):
     """订单数据访问层"""
 
+    # 调用方可以指定的订单字段，金额一律由服务端计算
+    ORDER_FIELDS = ('user_id', 'customer_phone', 'shipping_address_id', 'shipping_method', 'payment_due_date')
+
     def __init__(self, db: Session):
         super().__init__(Order, db)
 
     def create_order_with_items(self, order_data: dict, items_data: list) -> Optional[Order]:
-        """创建订单和订单项（事务保护数据一致性）"""
+        """创建订单和订单项（单价和金额按数据库中的商品价格计算，库存不足时不创建订单）"""
+        result = self.place_orders([dict(order_data, items=items_data)])[0]
+        if not result.ok:
+            logger.warning(f"创建订单失败: {result.order_number}, {result.error}")
+            return None
+        return self.db.get(Order, result.order_id)
+
+    def place_orders(self, orders: List[dict], allow_discount: bool = False) -> List[OrderPlacement]:
+        """批量下单，返回与 orders 一一对应的结果
+
+        每个订单为 {'user_id', 'items': [{'product_id', 'quantity'}], 可选 order_number/shipping_amount/...}；
+        所有商品价格用一次 IN 查询取得，金额在服务端计算，库存在同一事务中预占，
+        订单和订单项各用一次批量 INSERT 写入。格式错误、商品无效、库存不足或订单号重复的订单被跳过，不影响其他订单。
+        discount_amount 只在 allow_discount 为 True 时采用（仅限后台导入），须在 0 到商品小计之间。
+        """
+        results = [OrderPlacement(_order_number(spec)) for spec in orders]
+        flash_reserved = {}
         try:
-            # 开始事务
-            order = Order(**order_data)
-            self.db.add(order)
-            self.db.flush()  # 获取order_id但不提交
-
-            # 添加订单项
-            for item_data in items_data:
-                item_data['order_id'] = order.order_id
-                order_item = OrderItem(**item_data)
-                self.db.add(order_item)
-
+            prepared = self._prepare_orders(orders, results, allow_discount)
+            accepted, flash_reserved = self._reserve_orders_stock(prepared, results)
+            if accepted:
+                self._insert_orders(accepted, results)
             self.db.commit()
-            logger.info(f"创建订单成功: {order.order_number}, 订单项数: {len(items_data)}")
-            return order
+            logger.info(f"批量下单完成: 成功 {len(accepted)}, 失败 {len(orders) - len(accepted)}")
+            return results
         except Exception as e:
             self.db.rollback()
-            logger.error(f"创建订单失败: {str(e)}")
-            return None
+            flash_sale_stock.release(flash_reserved)
+            logger.error(f"批量下单失败: {str(e)}")
+            return [OrderPlacement(result.order_number, error=f"下单失败: {e}") for result in results]
+
+    def _prepare_orders(self, orders, results, allow_discount=False):
+        """校验订单并按数据库价格计算金额，返回有效订单 [(序号, 订单行, 订单项行, 数量)]，无效订单的错误写入 results"""
+        parsed = {}
+        for index, spec in enumerate(orders):
+            try:
+                quantities = merge_quantities(spec.get('items') or [])
+                shipping = parse_amount(spec.get('shipping_amount'))
+                discount = parse_amount(spec.get('discount_amount')) if allow_discount else Decimal('0.00')
+            except (AttributeError, KeyError, TypeError, ValueError, ArithmeticError):
+                results[index] = OrderPlacement(results[index].order_number, error="订单项格式错误")
+                continue
+            parsed[index] = (spec, quantities, shipping, discount)
+
+        product_ids = {product_id for _, quantities, _, _ in parsed.values() for product_id in quantities}
+        prices = {}
+        if product_ids:
+            prices = {
+                row.product_id: row.sale_price
+                for row in self.db.query(Product.product_id, Product.sale_price).filter(
+                    Product.product_id.in_(product_ids),
+                    Product.is_active == True,
+                    Product.is_available == True
+                )
+            }
+
+        order_numbers = [results[index].order_number for index in parsed]
+        existing = set()
+        if order_numbers:
+            existing = set(self.db.execute(
+                select(Order.order_number).where(Order.order_number.in_(order_numbers))
+            ).scalars())
+        seen = set()
+
+        prepared = []
+        for index, (spec, quantities, shipping, discount) in parsed.items():
+            order_number = results[index].order_number
+            error = None
+            if order_number in existing or order_number in seen:
+                error = "订单号重复"
+            elif not quantities or any(quantity <= 0 for quantity in quantities.values()):
+                error = "订单项数量必须大于0"
+            elif any(product_id not in prices for product_id in quantities):
+                error = "商品不存在或已下架"
+            elif shipping < 0:
+                error = "运费不能为负数"
+            if error:
+                results[index] = OrderPlacement(order_number, error=error)
+                continue
+
+            items = []
+            subtotal = Decimal('0.00')
+            for product_id, quantity in quantities.items():
+                unit_price = Decimal(str(prices[product_id])).quantize(CENT)
+                total_price = (unit_price * quantity).quantize(CENT)
+                subtotal += total_price
+                items.append({
+                    'product_id': product_id,
+                    'quantity': quantity,
+                    'unit_price': unit_price,
+                    'total_price': total_price,
+                })
+            if not Decimal('0.00') <= discount <= subtotal:
+                results[index] = OrderPlacement(order_number, error="优惠金额无效")
+                continue
+            seen.add(order_number)
+
+            row = {field: spec.get(field) for field in self.ORDER_FIELDS}
+            row.update(
+                order_number=order_number,
+                subtotal_amount=subtotal,
+                shipping_amount=shipping,
+                discount_amount=discount,
+                total_amount=subtotal + shipping - discount,
+            )
+            prepared.append((index, row, items, quantities))
+        return prepared
+
+    def _reserve_orders_stock(self, prepared, results):
+        """预占库存：先整批一次预占，失败时再逐单（保存点）预占以找出库存不足的订单
+
+        返回 (预占成功的订单, 在 Redis 中预扣的数量)
+        """
+        total = {}
+        for _, _, _, quantities in prepared:
+            for product_id, quantity in quantities.items():
+                total[product_id] = total.get(product_id, 0) + quantity
+        ok, flash_reserved = self._reserve_quantities(total)
+        if ok:
+            return prepared, flash_reserved
+        if len(prepared) == 1:
+            results[prepared[0][0]] = OrderPlacement(prepared[0][1]['order_number'], error="库存不足")
+            return [], {}
+
+        accepted = []
+        flash_reserved = {}
+        try:
+            for entry in prepared:
+                ok, order_flash = self._reserve_quantities(entry[3])
+                if ok:
+                    accepted.append(entry)
+                    for product_id, quantity in order_flash.items():
+                        flash_reserved[product_id] = flash_reserved.get(product_id, 0) + quantity
+                else:
+                    results[entry[0]] = OrderPlacement(entry[1]['order_number'], error="库存不足")
+        except Exception:
+            # 调用方拿不到已预扣的数量，由这里归还
+            flash_sale_stock.release(flash_reserved)
+            raise
+        return accepted, flash_reserved
+
+    def _reserve_quantities(self, quantities):
+        """在保存点内预占一组库存：秒杀商品扣 Redis，其余扣数据库；失败时两边都恢复原状"""
+        ok, flash_ids = flash_sale_stock.try_reserve(quantities)
+        if not ok:
+            return False, {}
+        flash_reserved = {product_id: quantities[product_id] for product_id in flash_ids}
+        db_quantities = {
+            product_id: quantity for product_id, quantity in quantities.items()
+            if product_id not in flash_reserved
+        }
+        savepoint = self.db.begin_nested()
+        try:
+            reserved = reserve_stock(self.db, db_quantities)
+        except Exception:
+            # 死锁、锁等待超时等：Redis 中已预扣的库存必须归还，否则同步时会从数据库扣掉并未售出的数量
+            try:
+                savepoint.rollback()
+            finally:
+                flash_sale_stock.release(flash_reserved)
+            raise
+        if reserved:
+            savepoint.commit()
+            return True, flash_reserved
+        savepoint.rollback()
+        flash_sale_stock.release(flash_reserved)
+        return False, {}
+
+    def _insert_orders(self, accepted, results):
+        """订单、订单项各一次批量 INSERT（订单ID按订单号取回），并累加下单用户的活跃度计数"""
+        self.db.execute(insert(Order), [row for _, row, _, _ in accepted])
+        order_ids = dict(self.db.execute(
+            select(Order.order_number, Order.order_id)
+            .where(Order.order_number.in_([row['order_number'] for _, row, _, _ in accepted]))
+        ).all())
+        item_rows = []
+        for index, row, items, _ in accepted:
+            order_id = order_ids[row['order_number']]
+            item_rows.extend(dict(item, order_id=order_id) for item in items)
+            results[index] = OrderPlacement(row['order_number'], order_id, row['total_amount'])
+        self.db.execute(insert(OrderItem), item_rows)
+
+        order_counts = {}
+        for _, row, _, _ in accepted:
+            order_counts[row['user_id']] = order_counts.get(row['user_id'], 0) + 1
+        UserActivityRepository(self.db).record_orders(order_counts)
 
     def get_order_with_details(self, order_id: int) -> Optional[Order]:
         """获取订单详情（包含订单项和商品信息）"""
@@ -53,92 +260,106 @@ class OrderRepository(BaseRepository[Order]):
             logger.error(f"获取订单详情失败: {str(e)}")
             return None
 
-    def get_user_orders(self, user_id: int, skip: int = 0, limit: int = 50) -> List[Order]:
-        """获取用户订单列表"""
+    def get_user_orders(self, user_id: int, skip: int = 0, limit: int = 50, cursor: str = None) -> List[Order]:
+        """获取用户订单列表（传入 cursor 时按游标分页，忽略 skip；游标无效时抛出 InvalidCursor）"""
         try:
-            orders = self.db.query(Order).options(
+            query = apply_keyset(self.db.query(Order).options(
                 joinedload(Order.order_items).joinedload(OrderItem.product)
             ).filter(
                 Order.user_id == user_id
-            ).order_by(desc(Order.created_at)).offset(skip).limit(limit).all()
+            ), Order.created_at, Order.order_id, cursor)
+            if not cursor:
+                query = query.offset(skip)
+            orders = query.limit(limit).all()
 
             logger.debug(f"获取用户 {user_id} 的订单列表, 数量: {len(orders)}")
             return orders
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"获取用户订单失败: {str(e)}")
             return []
 
     def update_order_status(self, order_id: int, new_status: OrderStatus,
                             reason: str = None) -> bool:
-        """更新订单状态（带审计日志）"""
+        """更新订单状态（带审计日志）
+
+        状态用条件 UPDATE（WHERE order_status = 读到的旧状态）修改，命中一行才更新销售统计，
+        并发的相同状态变更（如重复的支付回调）只计入一次；订单已处于目标状态时视为成功
+        """
         try:
             order = self.get_by_id(order_id)
-            if order:
-                old_status = order.order_status
-                order.order_status = new_status
-
-                # 根据状态更新相应时间字段
-                now = datetime.now()
-                if new_status == OrderStatus.SHIPPED and not order.shipped_date:
-                    order.shipped_date = now
-                elif new_status == OrderStatus.DELIVERED and not order.delivered_date:
-                    order.delivered_date = now
-                elif new_status == OrderStatus.CANCELLED and not order.cancelled_date:
-                    order.cancelled_date = now
-
-                self.db.commit()
-                logger.info(f"更新订单状态: {order_id} {old_status}->{new_status}, 原因: {reason}")
+            if not order:
+                return False
+            old_status = order.order_status
+            if old_status == new_status:
                 return True
-            return False
+
+            values = {'order_status': new_status}
+            # 根据状态更新相应时间字段（已有时间的保持不变）
+            now = datetime.now()
+            if new_status == OrderStatus.SHIPPED:
+                values['shipped_date'] = func.coalesce(Order.shipped_date, now)
+            elif new_status == OrderStatus.DELIVERED:
+                values['delivered_date'] = func.coalesce(Order.delivered_date, now)
+            elif new_status == OrderStatus.CANCELLED:
+                values['cancelled_date'] = func.coalesce(Order.cancelled_date, now)
+
+            result = self.db.execute(
+                update(Order)
+                .where(Order.order_id == order_id, Order.order_status == old_status)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                # 读到旧状态之后已被其他请求修改
+                self.db.rollback()
+                current = self.db.execute(select(Order.order_status).where(Order.order_id == order_id)).scalar()
+                logger.warning(f"订单状态已被并发修改: {order_id} 期望 {old_status}, 当前 {current}")
+                return current == new_status
+
+            # 与状态变更同一事务更新销售统计小时桶
+            SalesRollupRepository(self.db).record_transition(order, old_status, new_status)
+
+            self.db.commit()
+            logger.info(f"更新订单状态: {order_id} {old_status}->{new_status}, 原因: {reason}")
+            return True
         except Exception as e:
             self.db.rollback()
             logger.error(f"更新订单状态失败: {str(e)}")
             return False
 
-    def get_orders_by_status(self, status: OrderStatus, skip: int = 0, limit: int = 100) -> List[Order]:
-        """根据状态获取订单"""
+    def get_orders_by_status(self, status: OrderStatus, skip: int = 0, limit: int = 100,
+                             cursor: str = None) -> List[Order]:
+        """根据状态获取订单（先进先出，传入 cursor 时按游标分页，忽略 skip；游标无效时抛出 InvalidCursor）"""
         try:
-            orders = self.db.query(Order).options(
+            query = apply_keyset(self.db.query(Order).options(
                 joinedload(Order.user)
             ).filter(
                 Order.order_status == status
-            ).order_by(asc(Order.created_at)).offset(skip).limit(limit).all()
+            ), Order.created_at, Order.order_id, cursor, descending=False)
+            if not cursor:
+                query = query.offset(skip)
+            orders = query.limit(limit).all()
 
             logger.debug(f"获取状态为 {status} 的订单, 数量: {len(orders)}")
             return orders
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"按状态获取订单失败: {str(e)}")
             return []
 
     def get_sales_statistics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
-        """获取销售统计（复杂查询示例）"""
+        """获取销售统计（由小时汇总桶和首尾不足一小时的订单合计得出）"""
         try:
-            # 总销售额
-            total_sales = self.db.query(func.sum(Order.total_amount)).filter(
-                Order.order_status.in_([OrderStatus.CONFIRMED, OrderStatus.DELIVERED]),
-                Order.created_at.between(start_date, end_date)
-            ).scalar() or 0
-
-            # 订单数量
-            order_count = self.db.query(func.count(Order.order_id)).filter(
-                Order.order_status.in_([OrderStatus.CONFIRMED, OrderStatus.DELIVERED]),
-                Order.created_at.between(start_date, end_date)
-            ).scalar() or 0
-
-            # 平均订单价值
-            avg_order_value = total_sales / order_count if order_count > 0 else 0
-
-            statistics = {
-                'total_sales': float(total_sales),
-                'order_count': order_count,
-                'avg_order_value': float(avg_order_value),
-                'period': {
-                    'start': start_date,
-                    'end': end_date
-                }
+            statistics = SalesRollupRepository(self.db).get_sales_statistics(start_date, end_date)
+            statistics['period'] = {
+                'start': start_date,
+                'end': end_date
             }
 
-            logger.info(f"获取销售统计: {start_date} 到 {end_date}, 销售额: {total_sales}")
+            logger.info(f"获取销售统计: {start_date} 到 {end_date}, 销售额: {statistics['total_sales']}")
             return statistics
         except Exception as e:
             logger.error(f"获取销售统计失败: {str(e)}")
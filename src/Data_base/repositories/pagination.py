@@ -0,0 +1,83 @@
+"""游标分页（keyset pagination）
+
+列表按 ``(created_at, id)`` 排序，下一页从上一页最后一行的位置继续查找
+（``WHERE (created_at, id) < (:t, :id)``），配合同列顺序的组合索引，
+翻到多深都只扫描一页的数据，不再随 OFFSET 线性变慢。
+
+游标对调用方是不透明的字符串（base64url 编码的 JSON）。
+按相关度排序等无法做 keyset 的结果集使用偏移量游标。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析"""
+
+
+def _encode(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"invalid cursor: {cursor!r}") from e
+    if not isinstance(payload, dict):
+        raise InvalidCursor(f"invalid cursor: {cursor!r}")
+    return payload
+
+
+def encode_keyset_cursor(created_at: datetime, row_id: int) -> str:
+    return _encode({"t": created_at.isoformat(), "id": int(row_id)})
+
+
+def decode_keyset_cursor(cursor: str):
+    """返回 (created_at, id)"""
+    payload = _decode(cursor)
+    try:
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor(f"invalid cursor: {cursor!r}") from e
+
+
+def encode_offset_cursor(offset: int) -> str:
+    return _encode({"offset": int(offset)})
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    payload = _decode(cursor)
+    try:
+        return max(0, int(payload["offset"]))
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidCursor(f"invalid cursor: {cursor!r}") from e
+
+
+def apply_keyset(query, created_column, id_column, cursor: Optional[str] = None, descending: bool = True):
+    """按 (created_at, id) 排序，并从游标位置继续"""
+    if cursor:
+        created_at, row_id = decode_keyset_cursor(cursor)
+        position = tuple_(created_column, id_column)
+        if descending:
+            query = query.filter(position < tuple_(created_at, row_id))
+        else:
+            query = query.filter(position > tuple_(created_at, row_id))
+    if descending:
+        return query.order_by(created_column.desc(), id_column.desc())
+    return query.order_by(created_column.asc(), id_column.asc())
+
+
+def next_keyset_cursor(items, limit: int, id_attr: str) -> Optional[str]:
+    """本页取满时返回下一页游标，否则返回 None"""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    if last.created_at is None:
+        return None
+    return encode_keyset_cursor(last.created_at, getattr(last, id_attr))
@@ -1,8 +1,14 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, desc
+from sqlalchemy import or_, desc, update
 from src.Data_base.models.product import Product, Category
 from src.Data_base.repositories.base_repository import BaseRepository
+from src.Data_base.repositories.product_search import product_search_index
+from src.Data_base.repositories.category_tree import build_category_tree, category_tree_cache
+from src.Data_base.repositories.stock_reservation import inventory_tracked, reserve_stock, release_stock
+from src.Data_base.repositories.pagination import (
+    InvalidCursor, apply_keyset, decode_offset_cursor, encode_offset_cursor
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,13 +17,52 @@ logger = logging.getLogger(__name__)
 class ProductRepository(BaseRepository[Product]):
     """商品数据访问层"""
 
+    # 关键词检索最多取多少个候选商品参与排序
+    SEARCH_CANDIDATE_LIMIT = 1000
+
     def __init__(self, db: Session):
         super().__init__(Product, db)
 
+    def create(self, obj_in: dict) -> Optional[Product]:
+        product = super().create(obj_in)
+        if product:
+            product_search_index.index_product(product)
+        return product
+
+    def update(self, db_obj: Product, obj_in: dict) -> Optional[Product]:
+        product = super().update(db_obj, obj_in)
+        if product:
+            product_search_index.index_product(product)
+        return product
+
+    def delete(self, id) -> bool:
+        deleted = super().delete(id)
+        if deleted:
+            product_search_index.remove_product(id)
+        return deleted
+
     def search_products_safe(self, keyword: str = None, category_id: int = None,
                              min_price: float = None, max_price: float = None,
-                             in_stock: bool = True, skip: int = 0, limit: int = 50) -> List[Product]:
+                             in_stock: bool = True, skip: int = 0, limit: int = 50,
+                             cursor: str = None) -> List[Product]:
         """安全商品搜索（防SQL注入）"""
+        products, _ = self.search_products_page(
+            keyword=keyword, category_id=category_id, min_price=min_price, max_price=max_price,
+            in_stock=in_stock, skip=skip, limit=limit, cursor=cursor
+        )
+        return products
+
+    def search_products_page(self, keyword: str = None, category_id: int = None,
+                             min_price: float = None, max_price: float = None,
+                             in_stock: bool = True, skip: int = 0, limit: int = 50,
+                             cursor: str = None) -> Tuple[List[Product], Optional[str]]:
+        """商品搜索分页，返回 (商品列表, 下一页游标)
+
+        有关键词时先查全文检索索引得到按相关度排序的候选商品，再加上 SKU 前缀匹配
+        （走 sku 索引），其余条件由数据库过滤；索引不可用时退回 LIKE 匹配。
+        按时间排序的结果使用 (created_at, product_id) 游标，按相关度排序的结果使用偏移量游标；
+        传入 cursor 时忽略 skip。
+        """
         try:
             query = self.db.query(Product).options(
                 joinedload(Product.category)
@@ -26,16 +71,26 @@ class ProductRepository(BaseRepository[Product]):
                 Product.is_available == True
             )
 
-            # 关键字搜索（ORM转义防注入）
+            ranks = None
             if keyword:
-                search_pattern = f"%{keyword}%"
-                query = query.filter(
-                    or_(
-                        Product.product_name.like(search_pattern),
-                        Product.description.like(search_pattern),
-                        Product.sku.like(search_pattern)
+                matched = product_search_index.search(self.db, keyword, limit=self.SEARCH_CANDIDATE_LIMIT)
+                if matched is None:
+                    # 关键字搜索（ORM转义防注入）
+                    search_pattern = f"%{keyword}%"
+                    query = query.filter(
+                        or_(
+                            Product.product_name.like(search_pattern),
+                            Product.description.like(search_pattern),
+                            Product.sku.like(search_pattern)
+                        )
                     )
-                )
+                else:
+                    ranks = {product_id: rank for rank, (product_id, _) in enumerate(matched)}
+                    sku_prefix = Product.sku.startswith(keyword, autoescape=True)
+                    if ranks:
+                        query = query.filter(or_(Product.product_id.in_(list(ranks)), sku_prefix))
+                    else:
+                        query = query.filter(sku_prefix)
 
             # 分类过滤
             if category_id:
@@ -51,13 +106,27 @@ class ProductRepository(BaseRepository[Product]):
             if in_stock:
                 query = query.filter(Product.stock_quantity > 0)
 
-            products = query.order_by(desc(Product.created_at)).offset(skip).limit(limit).all()
+            if ranks is None:
+                query = apply_keyset(query, Product.created_at, Product.product_id, cursor)
+                if not cursor:
+                    query = query.offset(skip)
+                products = query.limit(limit).all()
+                next_cursor = self.next_cursor(products, limit)
+            else:
+                # 相关度排序：SKU 完全匹配优先，其次按检索得分
+                offset = decode_offset_cursor(cursor) if cursor else skip
+                candidates = query.limit(self.SEARCH_CANDIDATE_LIMIT + limit).all()
+                candidates.sort(key=lambda p: (p.sku != keyword, ranks.get(p.product_id, len(ranks))))
+                products = candidates[offset:offset + limit]
+                next_cursor = encode_offset_cursor(offset + limit) if len(candidates) > offset + limit else None
 
             logger.info(f"商品搜索: keyword='{keyword}', category={category_id}, 结果数: {len(products)}")
-            return products
+            return products, next_cursor
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"商品搜索失败: {str(e)}")
-            return []
+            return [], None
 
     def get_featured_products(self, limit: int = 10) -> List[Product]:
         """获取推荐商品"""
@@ -78,35 +147,71 @@ class ProductRepository(BaseRepository[Product]):
             return []
 
     def update_stock(self, product_id: int, quantity: int) -> bool:
-        """更新商品库存（事务安全）"""
+        """更新商品库存（单条条件 UPDATE，并发下不会扣成负数）"""
         try:
-            product = self.get_by_id(product_id)
-            if product and product.track_inventory:
-                if product.stock_quantity + quantity >= 0:  # 防止库存为负
-                    product.stock_quantity += quantity
-                    self.db.commit()
-                    logger.info(f"更新商品 {product_id} 库存: 变化{quantity}, 新库存{product.stock_quantity}")
-                    return True
-                else:
-                    logger.warning(f"商品 {product_id} 库存不足")
-                    return False
+            result = self.db.execute(
+                update(Product)
+                .where(
+                    Product.product_id == product_id,
+                    inventory_tracked(),
+                    Product.stock_quantity + quantity >= 0  # 防止库存为负
+                )
+                .values(stock_quantity=Product.stock_quantity + quantity)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            if result.rowcount == 1:
+                logger.info(f"更新商品 {product_id} 库存: 变化{quantity}")
+                return True
+            logger.warning(f"商品 {product_id} 库存不足或不跟踪库存")
             return False
         except Exception as e:
             self.db.rollback()
             logger.error(f"更新商品库存失败: {str(e)}")
             return False
 
-    def get_products_by_category(self, category_id: int, skip: int = 0, limit: int = 50) -> List[Product]:
-        """根据分类获取商品"""
+    def reserve_stock(self, quantities: Dict[int, int]) -> bool:
+        """一次扣减多件商品的库存（同一事务，任一不足则全部不扣）"""
         try:
-            products = self.db.query(Product).filter(
+            if reserve_stock(self.db, quantities):
+                self.db.commit()
+                return True
+            self.db.rollback()
+            logger.warning(f"库存不足，预占失败: {quantities}")
+            return False
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"预占库存失败: {str(e)}")
+            return False
+
+    def release_stock(self, quantities: Dict[int, int]) -> bool:
+        """归还多件商品的库存"""
+        try:
+            release_stock(self.db, quantities)
+            self.db.commit()
+            return True
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"归还库存失败: {str(e)}")
+            return False
+
+    def get_products_by_category(self, category_id: int, skip: int = 0, limit: int = 50,
+                                 cursor: str = None) -> List[Product]:
+        """根据分类获取商品（传入 cursor 时按游标分页，忽略 skip；游标无效时抛出 InvalidCursor）"""
+        try:
+            query = apply_keyset(self.db.query(Product).filter(
                 Product.category_id == category_id,
                 Product.is_active == True,
                 Product.is_available == True
-            ).order_by(desc(Product.created_at)).offset(skip).limit(limit).all()
+            ), Product.created_at, Product.product_id, cursor)
+            if not cursor:
+                query = query.offset(skip)
+            products = query.limit(limit).all()
 
             logger.debug(f"获取分类 {category_id} 的商品, 数量: {len(products)}")
             return products
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"获取分类商品失败: {str(e)}")
             return []
@@ -116,7 +221,7 @@ class ProductRepository(BaseRepository[Product]):
         try:
             products = self.db.query(Product).filter(
                 Product.stock_quantity <= threshold,
-                Product.track_inventory == True,
+                inventory_tracked(),
                 Product.is_active == True
             ).order_by(Product.stock_quantity.asc()).all()
 
@@ -133,6 +238,24 @@ class CategoryRepository(BaseRepository[Category]):
     def __init__(self, db: Session):
         super().__init__(Category, db)
 
+    def create(self, obj_in: dict) -> Optional[Category]:
+        category = super().create(obj_in)
+        if category:
+            category_tree_cache.invalidate()
+        return category
+
+    def update(self, db_obj: Category, obj_in: dict) -> Optional[Category]:
+        category = super().update(db_obj, obj_in)
+        if category:
+            category_tree_cache.invalidate()
+        return category
+
+    def delete(self, id) -> bool:
+        deleted = super().delete(id)
+        if deleted:
+            category_tree_cache.invalidate()
+        return deleted
+
     def find_or_create_category(self, category_name: str, parent_id: int = None,
                                 level: int = 1, sort_order: int = 1) -> Category:
         """查找或创建分类：如果存在同名分类就直接返回，否则创建新分类"""
@@ -192,6 +315,29 @@ class CategoryRepository(BaseRepository[Category]):
             logger.error(f"获取分类树失败: {str(e)}")
             return []
 
+    def get_category_tree(self) -> List[dict]:
+        """获取完整分类树（任意深度），一次查询加载全部启用的分类后在内存中组装
+
+        结果会被缓存并在分类写入时失效，调用方不要修改返回的数据
+        """
+        try:
+            return category_tree_cache.get(self._load_category_tree)
+        except Exception as e:
+            logger.error(f"获取分类树失败: {str(e)}")
+            return []
+
+    def _load_category_tree(self) -> List[dict]:
+        rows = self.db.query(
+            Category.category_id, Category.category_name, Category.parent_category_id,
+            Category.category_level, Category.sort_order
+        ).filter(
+            Category.is_active == True
+        ).order_by(Category.sort_order, Category.category_id).all()
+
+        tree = build_category_tree(rows)
+        logger.debug(f"加载分类树, 分类数: {len(rows)}, 顶级分类数: {len(tree)}")
+        return tree
+
     def get_subcategories(self, parent_id: int) -> List[Category]:
         """获取子分类"""
         try:
@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.Data_base.models.product import Product
+from src.utils.text_search import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ProductSearchIndex:
+    """商品全文检索索引（进程内倒排索引，可持久化到磁盘）
+
+    - 首次使用时从磁盘加载（若配置了路径），否则从数据库全量构建
+    - 之后每隔 refresh_interval 秒按 updated_at 水位增量同步其他进程的修改
+    - 每隔 rebuild_interval 秒全量重建一次，清除被物理删除的商品
+    - 本进程内的新增/修改通过 index_product/remove_product 立即生效
+    """
+
+    FIELD_WEIGHTS = {"product_name": 3.0, "sku": 2.0, "description": 1.0}
+
+    def __init__(self, path=None, refresh_interval=30, rebuild_interval=3600):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.index = InvertedIndex()
+        self.watermark = None
+        self.ready = False
+        self._last_sync = 0
+        self._last_rebuild = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _columns():
+        return select(
+            Product.product_id, Product.product_name, Product.description, Product.sku,
+            Product.is_active, Product.is_available, Product.updated_at
+        )
+
+    def _apply_row(self, index, row):
+        if row.is_active and row.is_available:
+            index.upsert(row.product_id, {
+                "product_name": row.product_name,
+                "sku": row.sku,
+                "description": row.description,
+            }, self.FIELD_WEIGHTS)
+        else:
+            index.remove(row.product_id)
+        if row.updated_at and (self.watermark is None or row.updated_at > self.watermark):
+            self.watermark = row.updated_at
+
+    def index_product(self, product):
+        """商品新增或修改后调用"""
+        if self.ready:
+            self._apply_row(self.index, product)
+
+    def remove_product(self, product_id):
+        """商品删除后调用"""
+        if self.ready:
+            self.index.remove(product_id)
+
+    def rebuild(self, db: Session):
+        """从数据库全量构建"""
+        index = InvertedIndex()
+        self.watermark = None
+        rows = db.execute(
+            self._columns().where(Product.is_active == True, Product.is_available == True)
+        ).all()
+        for row in rows:
+            self._apply_row(index, row)
+        self.index = index
+        self.ready = True
+        self._last_rebuild = time.time()
+        logger.info(f"商品检索索引全量构建完成，商品数: {len(index)}")
+        self._save()
+
+    def _catch_up(self, db: Session):
+        """按 updated_at 水位增量同步（同一秒内的修改会被重复处理，结果不变）"""
+        if self.watermark is None:
+            return 0
+        rows = db.execute(self._columns().where(Product.updated_at >= self.watermark)).all()
+        for row in rows:
+            self._apply_row(self.index, row)
+        return len(rows)
+
+    def _load(self, db: Session):
+        """从磁盘加载，剔除已不在售的商品后再增量同步"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        index, extra = InvertedIndex.load(self.path)
+        active_ids = set(db.execute(
+            select(Product.product_id).where(Product.is_active == True, Product.is_available == True)
+        ).scalars())
+        for doc_id in index.doc_ids():
+            if doc_id not in active_ids:
+                index.remove(doc_id)
+        self.index = index
+        watermark = extra.get("watermark")
+        self.watermark = datetime.fromisoformat(watermark) if watermark else None
+        self._last_rebuild = extra.get("built_at", 0)
+        self.ready = True
+        changed = self._catch_up(db)
+        logger.info(f"商品检索索引已从磁盘加载，商品数: {len(index)}, 增量同步: {changed}")
+        if changed:
+            self._save()
+        return True
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            self.index.save(self.path, {
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+                "built_at": self._last_rebuild,
+            })
+        except Exception as e:
+            logger.warning(f"商品检索索引保存失败: {e}")
+
+    def ensure_fresh(self, db: Session) -> bool:
+        """按需加载/同步索引，返回索引是否可用"""
+        now = time.time()
+        if self.ready and now - self._last_sync < self.refresh_interval:
+            return True
+        # 已可用时不阻塞：其他线程正在同步就先用当前索引
+        if not self._lock.acquire(blocking=not self.ready):
+            return self.ready
+        try:
+            if not self.ready:
+                if not self._load(db):
+                    self.rebuild(db)
+            elif now - self._last_rebuild > self.rebuild_interval:
+                self.rebuild(db)
+            elif self._catch_up(db):
+                self._save()
+            self._last_sync = now
+        except Exception as e:
+            logger.error(f"商品检索索引同步失败: {e}")
+        finally:
+            self._lock.release()
+        return self.ready
+
+    def search(self, db: Session, keyword: str, limit: int = None):
+        """返回 [(product_id, score)]；索引不可用或关键词无有效词时返回 None"""
+        if not self.ensure_fresh(db):
+            return None
+        return self.index.search(keyword, limit)
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "products": len(self.index),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
+
+
+product_search_index = ProductSearchIndex(
+    path=os.getenv("PRODUCT_SEARCH_INDEX_PATH") or None,
+    refresh_interval=int(os.getenv("PRODUCT_SEARCH_REFRESH_SECONDS", "30")),
+    rebuild_interval=int(os.getenv("PRODUCT_SEARCH_REBUILD_SECONDS", "3600")),
+)
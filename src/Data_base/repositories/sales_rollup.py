@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from sqlalchemy import and_, delete, func, insert, literal, literal_column, or_, select, union_all
+from sqlalchemy.orm import Session
+from src.Data_base.models.order import Order, OrderStatus, SalesRollup
+from src.Data_base.repositories.base_repository import BaseRepository
+from src.Data_base.repositories.upsert import upsert
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 计入销售统计的订单状态
+COUNTED_STATUSES = (OrderStatus.CONFIRMED, OrderStatus.DELIVERED)
+
+HOUR = timedelta(hours=1)
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value: datetime) -> datetime:
+    floored = floor_hour(value)
+    return floored if floored == value else floored + HOUR
+
+
+class SalesRollupRepository(BaseRepository[SalesRollup]):
+    """按小时汇总的销售统计
+
+    订单在计入/移出统计的状态之间变更时，由 OrderRepository 在同一事务中调用 record_transition 增量更新小时桶；
+    rebuild 从订单表重算任意时间段（首次上线或数据修复时使用）。
+    """
+
+    def __init__(self, db: Session):
+        super().__init__(SalesRollup, db)
+
+    def record_transition(self, order: Order, old_status, new_status):
+        """订单状态变更时更新所在小时桶（不提交）"""
+        was_counted = old_status in COUNTED_STATUSES
+        is_counted = new_status in COUNTED_STATUSES
+        if was_counted == is_counted:
+            return
+        sign = 1 if is_counted else -1
+        self._add(
+            floor_hour(order.created_at or datetime.now()),
+            sign,
+            sign * Decimal(str(order.total_amount or 0))
+        )
+
+    def _add(self, bucket_start: datetime, order_count: int, total_sales: Decimal):
+        """累加到小时桶（不存在时插入）"""
+        upsert(
+            self.db, SalesRollup,
+            [{'bucket_start': bucket_start, 'order_count': order_count, 'total_sales': total_sales}],
+            [SalesRollup.bucket_start],
+            lambda new: {
+                'order_count': SalesRollup.order_count + new.order_count,
+                'total_sales': SalesRollup.total_sales + new.total_sales,
+                'updated_at': func.now(),
+            }
+        )
+
+    def _hour_bucket(self):
+        """订单创建时间截断到小时的 SQL 表达式"""
+        dialect = self.db.get_bind().dialect.name
+        if dialect == 'mysql':
+            return func.date_format(Order.created_at, '%Y-%m-%d %H:00:00')
+        # 与 SQLAlchemy 在 SQLite 中存储 DateTime 的格式一致，保证按字符串比较的结果正确
+        return func.strftime('%Y-%m-%d %H:00:00.000000', Order.created_at)
+
+    def rebuild(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        """从订单表重算 [start, end) 覆盖的小时桶，返回写入的桶数"""
+        try:
+            bucket_filters = []
+            order_filters = [Order.order_status.in_(COUNTED_STATUSES), Order.created_at.isnot(None)]
+            if start:
+                start = floor_hour(start)
+                bucket_filters.append(SalesRollup.bucket_start >= start)
+                order_filters.append(Order.created_at >= start)
+            if end:
+                end = ceil_hour(end)
+                bucket_filters.append(SalesRollup.bucket_start < end)
+                order_filters.append(Order.created_at < end)
+
+            self.db.execute(delete(SalesRollup).where(*bucket_filters))
+            bucket = self._hour_bucket()
+            result = self.db.execute(
+                insert(SalesRollup).from_select(
+                    ['bucket_start', 'order_count', 'total_sales'],
+                    select(bucket.label('bucket'), func.count(Order.order_id), func.sum(Order.total_amount))
+                    .where(*order_filters)
+                    # 按别名分组：格式串参数在 SELECT 和 GROUP BY 中是两个占位符，按表达式分组会被 ONLY_FULL_GROUP_BY 拒绝
+                    .group_by(literal_column('bucket'))
+                )
+            )
+            self.db.commit()
+            logger.info(f"销售统计小时桶重算完成: {start} ~ {end}, 桶数: {result.rowcount}")
+            return result.rowcount
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"销售统计小时桶重算失败: {str(e)}")
+            raise
+
+    def get_sales_statistics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """统计 [start_date, end_date] 的销售额和订单数
+
+        完整落在区间内的小时取汇总桶，首尾不足一小时的部分直接查订单表，两部分在一条查询中合计
+        """
+        full_start = ceil_hour(start_date)
+        full_end = floor_hour(end_date)
+        counted = Order.order_status.in_(COUNTED_STATUSES)
+
+        parts = []
+        if full_start < full_end:
+            parts.append(
+                select(
+                    func.coalesce(func.sum(SalesRollup.order_count), 0).label('order_count'),
+                    func.coalesce(func.sum(SalesRollup.total_sales), 0).label('total_sales')
+                ).where(SalesRollup.bucket_start >= full_start, SalesRollup.bucket_start < full_end)
+            )
+            edges = or_(
+                and_(Order.created_at >= start_date, Order.created_at < full_start),
+                and_(Order.created_at >= full_end, Order.created_at <= end_date)
+            )
+        else:
+            edges = Order.created_at.between(start_date, end_date)
+        parts.append(
+            select(
+                func.count(Order.order_id).label('order_count'),
+                func.coalesce(func.sum(Order.total_amount), 0).label('total_sales')
+            ).where(counted, edges)
+        )
+
+        combined = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+        row = self.db.execute(
+            select(
+                func.coalesce(func.sum(combined.c.order_count), literal(0)),
+                func.coalesce(func.sum(combined.c.total_sales), literal(0))
+            )
+        ).one()
+        order_count = int(row[0] or 0)
+        total_sales = Decimal(str(row[1] or 0))
+        return {
+            'total_sales': float(total_sales),
+            'order_count': order_count,
+            'avg_order_value': float(total_sales / order_count) if order_count > 0 else 0.0,
+        }
@@ -0,0 +1,316 @@
+"""库存预占
+
+- ``reserve_stock`` / ``release_stock``：用一条条件 UPDATE 扣减/归还一个订单全部商品的库存
+  （``SET stock_quantity = stock_quantity - CASE ... WHERE product_id IN (...) AND stock_quantity >= CASE ...``），
+  不在 Python 中读改写，也不需要行锁之外的任何锁；命中行数少于商品数即库存不足，由调用方回滚整个事务
+- ``FlashSaleStock``：秒杀商品的库存预先载入 Redis，下单时由 Lua 脚本原子预扣，
+  扣减量记入待同步哈希，再由后台任务批量同步到数据库，热点商品不再争抢同一行的行锁
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Iterable
+
+from sqlalchemy import case, or_, update
+from sqlalchemy.orm import Session
+
+from src.Data_base.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+
+def merge_quantities(items: Iterable[dict]) -> Dict[int, int]:
+    """订单项列表 -> {product_id: 总数量}（同一商品多行时合并）"""
+    quantities = {}
+    for item in items:
+        product_id = int(item['product_id'])
+        quantities[product_id] = quantities.get(product_id, 0) + int(item['quantity'])
+    return quantities
+
+
+def inventory_tracked():
+    """需要跟踪库存的商品（track_inventory 为空按跟踪处理，与模型默认值一致）；所有扣减库存的路径共用此条件"""
+    return or_(Product.track_inventory == True, Product.track_inventory.is_(None))
+
+
+def reserve_stock(db: Session, quantities: Dict[int, int]) -> bool:
+    """原子扣减多件商品的库存（不提交），返回 False 表示有商品不存在或库存不足，调用方须回滚"""
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return True
+    if any(quantity < 0 for quantity in quantities.values()):
+        raise ValueError("预占数量必须为正数")
+
+    delta = case(quantities, value=Product.product_id)
+    result = db.execute(
+        update(Product)
+        .where(
+            Product.product_id.in_(sorted(quantities)),
+            or_(~inventory_tracked(), Product.stock_quantity >= delta)
+        )
+        .values(stock_quantity=case((inventory_tracked(), Product.stock_quantity - delta), else_=Product.stock_quantity))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(quantities)
+
+
+def release_stock(db: Session, quantities: Dict[int, int]) -> int:
+    """归还库存（不提交），返回归还的商品数"""
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return 0
+    result = db.execute(
+        update(Product)
+        .where(Product.product_id.in_(sorted(quantities)), inventory_tracked())
+        .values(stock_quantity=Product.stock_quantity + case(quantities, value=Product.product_id))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+# KEYS: 待同步哈希, 各商品库存键...；ARGV: 商品ID..., 数量...（顺序与库存键一致）
+# 没有库存键的商品不是秒杀商品，交给数据库扣减；任一秒杀商品不足则全部不扣
+# 返回 {是否成功, 已在 Redis 中预扣的商品ID...}
+_RESERVE_SCRIPT = """
+local n = #KEYS - 1
+local handled = {}
+for i = 1, n do
+    local stock = redis.call('GET', KEYS[i + 1])
+    if stock then
+        if tonumber(stock) < tonumber(ARGV[n + i]) then
+            return {0}
+        end
+        handled[#handled + 1] = i
+    end
+end
+local result = {1}
+for _, i in ipairs(handled) do
+    redis.call('DECRBY', KEYS[i + 1], ARGV[n + i])
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[n + i])
+    result[#result + 1] = ARGV[i]
+end
+return result
+"""
+
+# KEYS: 待同步哈希, 各商品库存键...；ARGV: 商品ID..., 数量...
+_RELEASE_SCRIPT = """
+local n = #KEYS - 1
+for i = 1, n do
+    if redis.call('EXISTS', KEYS[i + 1]) == 1 then
+        redis.call('INCRBY', KEYS[i + 1], ARGV[n + i])
+    end
+    redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[n + i]))
+end
+return n
+"""
+
+# KEYS: 待同步哈希, 同步中哈希；把待同步的扣减量整体移入同步中哈希（上次未完成的先处理上次的）
+_TAKE_PENDING_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# KEYS: 锁键；ARGV: 加锁时的令牌。锁仍属于自己时才删除
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class FlashSaleStock:
+    """秒杀商品 Redis 预扣库存
+
+    - ``load`` 把商品的数据库库存载入 Redis，此后该商品的下单只扣 Redis
+    - 预扣量累积在待同步哈希中，``reconcile`` 将其批量写回数据库（可由后台线程周期执行）；
+      同步过程中进程退出时，下次同步会重新处理同一批扣减量，可能重复扣减（少卖），但不会超卖
+    - 秒杀商品的数据库库存尚未扣除待同步的数量，不能作为后备：Redis 出错时秒杀商品一律按库存不足拒绝，
+      其余商品照常走数据库扣减。秒杀商品ID记在 Redis 集合中，各进程在本地保存一份（同步线程定期刷新）
+    - 秒杀期间在数据库中补货后需重新 ``load``；``unload`` 前先 ``reconcile``
+    - 未配置 Redis 连接时不启用，全部商品走数据库扣减
+    """
+
+    def __init__(self, connection=None, prefix: str = "flash_stock"):
+        self.prefix = prefix
+        self.pending_key = f"{prefix}:pending"
+        self.processing_key = f"{prefix}:processing"
+        self.lock_key = f"{prefix}:reconcile_lock"
+        self.products_key = f"{prefix}:products"
+        self.connection = None
+        # 本进程已知的秒杀商品ID（Redis 出错时据此拒绝秒杀商品的订单）
+        self.flash_product_ids = set()
+        self._reconciler = None
+        if connection is not None:
+            self.use_connection(connection)
+
+    def use_connection(self, connection):
+        self._reserve = connection.register_script(_RESERVE_SCRIPT)
+        self._release = connection.register_script(_RELEASE_SCRIPT)
+        self._take_pending = connection.register_script(_TAKE_PENDING_SCRIPT)
+        self._release_lock = connection.register_script(_RELEASE_LOCK_SCRIPT)
+        self.connection = connection
+        self.refresh_products()
+
+    def refresh_products(self):
+        """从 Redis 重新读取秒杀商品ID（读取失败时保留上一次的结果）"""
+        try:
+            self.flash_product_ids = {int(product_id) for product_id in self.connection.smembers(self.products_key)}
+        except Exception as e:
+            logger.warning(f"秒杀商品列表读取失败: {e}")
+
+    @property
+    def enabled(self):
+        return self.connection is not None
+
+    def _stock_key(self, product_id):
+        return f"{self.prefix}:{product_id}"
+
+    def _script_args(self, quantities):
+        product_ids = sorted(quantities)
+        keys = [self.pending_key] + [self._stock_key(product_id) for product_id in product_ids]
+        args = product_ids + [quantities[product_id] for product_id in product_ids]
+        return keys, args
+
+    def load(self, db: Session, product_id: int) -> int:
+        """将商品设为秒杀商品：Redis 库存 = 数据库库存 - 尚未同步的预扣量"""
+        stock = db.query(Product.stock_quantity).filter(Product.product_id == product_id).scalar()
+        if stock is None:
+            raise ValueError(f"商品不存在: {product_id}")
+        pending = int(self.connection.hget(self.pending_key, product_id) or 0)
+        pending += int(self.connection.hget(self.processing_key, product_id) or 0)
+        available = max(0, stock - pending)
+        pipe = self.connection.pipeline()
+        pipe.set(self._stock_key(product_id), available)
+        pipe.sadd(self.products_key, product_id)
+        pipe.execute()
+        self.flash_product_ids.add(product_id)
+        logger.info(f"秒杀库存已载入: 商品 {product_id}, 可售 {available}")
+        return available
+
+    def unload(self, product_id: int):
+        pipe = self.connection.pipeline()
+        pipe.delete(self._stock_key(product_id))
+        pipe.srem(self.products_key, product_id)
+        pipe.execute()
+        self.flash_product_ids.discard(product_id)
+
+    def available(self, product_id: int):
+        """Redis 中的可售库存，非秒杀商品返回 None"""
+        value = self.connection.get(self._stock_key(product_id))
+        return None if value is None else int(value)
+
+    def try_reserve(self, quantities: Dict[int, int]):
+        """预扣秒杀商品库存，返回 (是否成功, 已在 Redis 中预扣的商品ID列表)
+
+        未启用时返回 (True, [])，全部交给数据库扣减；Redis 出错时含秒杀商品的订单返回 (False, [])，
+        不含秒杀商品的订单返回 (True, [])
+        """
+        if not self.enabled or not quantities:
+            return True, []
+        try:
+            keys, args = self._script_args(quantities)
+            result = self._reserve(keys=keys, args=args)
+            flash_ids = [int(product_id) for product_id in result[1:]]
+            self.flash_product_ids.update(flash_ids)
+            return bool(int(result[0])), flash_ids
+        except Exception as e:
+            flash_ids = sorted(set(quantities) & self.flash_product_ids)
+            if flash_ids:
+                logger.error(f"秒杀库存预扣失败，秒杀商品 {flash_ids} 暂停下单: {e}")
+                return False, []
+            logger.warning(f"秒杀库存预扣失败，订单不含秒杀商品，由数据库扣减: {e}")
+            return True, []
+
+    def release(self, quantities: Dict[int, int]):
+        """归还已在 Redis 中预扣的库存"""
+        if not self.enabled or not quantities:
+            return
+        try:
+            keys, args = self._script_args(quantities)
+            self._release(keys=keys, args=args)
+        except Exception as e:
+            logger.error(f"秒杀库存归还失败: {quantities}, {e}")
+
+    def reconcile(self, db: Session) -> int:
+        """把累计的预扣量同步到数据库，返回同步的商品数"""
+        if not self.enabled:
+            return 0
+        token = uuid.uuid4().hex
+        if not self.connection.set(self.lock_key, token, nx=True, px=30000):
+            return 0
+        try:
+            flat = self._take_pending(keys=[self.pending_key, self.processing_key])
+            deltas = {int(flat[i]): int(flat[i + 1]) for i in range(0, len(flat), 2)}
+            for product_id, delta in deltas.items():
+                if not delta:
+                    continue
+                result = db.execute(
+                    update(Product)
+                    .where(Product.product_id == product_id, Product.stock_quantity >= delta)
+                    .values(stock_quantity=Product.stock_quantity - delta)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount == 0:
+                    # 数据库库存少于 Redis 已售出的数量（如秒杀期间在数据库中直接改了库存），按售罄处理
+                    db.execute(
+                        update(Product)
+                        .where(Product.product_id == product_id)
+                        .values(stock_quantity=0)
+                        .execution_options(synchronize_session=False)
+                    )
+                    logger.error(f"秒杀商品 {product_id} 数据库库存不足以同步扣减量 {delta}，已置为 0")
+            db.commit()
+            self.connection.delete(self.processing_key)
+            if deltas:
+                logger.info(f"秒杀库存已同步到数据库: {json.dumps(deltas)}")
+            return len(deltas)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"秒杀库存同步失败，下次重试: {e}")
+            return 0
+        finally:
+            try:
+                self._release_lock(keys=[self.lock_key], args=[token])
+            except Exception as e:
+                logger.warning(f"秒杀库存同步锁释放失败，等待自动过期: {e}")
+
+    def start_reconciler(self, session_factory, interval: float = 1.0):
+        """启动后台同步线程"""
+        if self._reconciler is not None or not self.enabled:
+            return
+
+        def run():
+            while True:
+                self.refresh_products()
+                db = session_factory()
+                try:
+                    self.reconcile(db)
+                except Exception as e:
+                    logger.error(f"秒杀库存同步线程异常: {e}")
+                finally:
+                    db.close()
+                time.sleep(interval)
+
+        self._reconciler = threading.Thread(target=run, name="flash-stock-reconciler", daemon=True)
+        self._reconciler.start()
+
+    def stats(self) -> Dict[str, object]:
+        if not self.enabled:
+            return {"enabled": False}
+        try:
+            pending = self.connection.hgetall(self.pending_key)
+            return {"enabled": True, "products": sorted(self.flash_product_ids),
+                    "pending": {int(k): int(v) for k, v in pending.items()}}
+        except Exception as e:
+            return {"enabled": True, "error": str(e)}
+
+
+flash_sale_stock = FlashSaleStock()
@@ -0,0 +1,27 @@
+from typing import Callable, Dict, List
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+
+def upsert(db: Session, model, rows: List[dict], key_columns: List, updates: Callable[[object], Dict[str, object]]):
+    """插入或按主键/唯一键合并（MySQL: ON DUPLICATE KEY UPDATE，SQLite: ON CONFLICT DO UPDATE），不提交
+
+    updates(new) 返回冲突时要更新的 {列名: 表达式}，new.<列名> 引用本次要插入的值
+    """
+    if not rows:
+        return None
+    if db.get_bind().dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(model)
+        stmt = stmt.on_duplicate_key_update(**updates(stmt.inserted))
+    else:
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = sqlite_insert(model)
+        stmt = stmt.on_conflict_do_update(index_elements=key_columns, set_=updates(stmt.excluded))
+    return db.execute(stmt, rows)
+
+
+def greatest(db: Session, *values):
+    """多个值中的最大值，忽略 NULL（MySQL 的 GREATEST 遇到 NULL 返回 NULL）"""
+    name = 'greatest' if db.get_bind().dialect.name == 'mysql' else 'max'
+    return getattr(func, name)(*(func.coalesce(value, *values) for value in values))
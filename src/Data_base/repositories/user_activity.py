@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+from src.Data_base.models.order import Order
+from src.Data_base.models.user import User, UserActivity
+from src.Data_base.repositories.base_repository import BaseRepository
+from src.Data_base.repositories.upsert import greatest, upsert
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UserActivityRepository(BaseRepository[UserActivity]):
+    """用户活跃度计数
+
+    下单时由 OrderRepository、登录时由 UserRepository 在同一事务中调用 record_orders / record_login 增量更新；
+    活跃用户排行只读 last_active_at 索引范围内的计数行，不再关联订单表分组统计。
+    rebuild 从订单表和用户表重算（首次上线或数据修复时使用）。
+    """
+
+    def __init__(self, db: Session):
+        super().__init__(UserActivity, db)
+
+    def record_orders(self, order_counts: Dict[int, int], ordered_at: Optional[datetime] = None):
+        """累加各用户的订单数并更新最后下单时间（不提交），order_counts 为 {user_id: 新增订单数}"""
+        ordered_at = ordered_at or datetime.now()
+        rows = [
+            {'user_id': user_id, 'order_count': count, 'last_order_at': ordered_at, 'last_active_at': ordered_at}
+            # 按主键顺序写入，并发批量下单时加锁顺序一致
+            for user_id, count in sorted(order_counts.items()) if user_id is not None and count
+        ]
+        upsert(self.db, UserActivity, rows, [UserActivity.user_id], lambda new: {
+            'order_count': UserActivity.order_count + new.order_count,
+            'last_order_at': greatest(self.db, UserActivity.last_order_at, new.last_order_at),
+            'last_active_at': greatest(self.db, UserActivity.last_active_at, new.last_active_at),
+            'updated_at': func.now(),
+        })
+
+    def record_login(self, user_id: int, login_at: Optional[datetime] = None):
+        """记录登录时间（不提交）"""
+        self.record_logins({user_id: login_at or datetime.now()})
+
+    def record_logins(self, logins: Dict[int, datetime]):
+        """批量记录登录时间（不提交），logins 为 {user_id: 登录时间}"""
+        rows = [
+            {'user_id': user_id, 'order_count': 0, 'last_login_at': login_at, 'last_active_at': login_at}
+            for user_id, login_at in sorted(logins.items())
+        ]
+        upsert(self.db, UserActivity, rows, [UserActivity.user_id], lambda new: {
+            'last_login_at': greatest(self.db, UserActivity.last_login_at, new.last_login_at),
+            'last_active_at': greatest(self.db, UserActivity.last_active_at, new.last_active_at),
+            'updated_at': func.now(),
+        })
+
+    def get_active_users(self, days: int = 30, limit: int = 100) -> List[Tuple[User, int]]:
+        """最近 days 天内下过单或登录过的用户，按累计订单数排序，返回 [(用户, 订单数)]"""
+        active_since = datetime.now() - timedelta(days=days)
+        return self.db.query(User, UserActivity.order_count).join(
+            UserActivity, UserActivity.user_id == User.user_id
+        ).filter(
+            UserActivity.last_active_at >= active_since,
+            User.is_active == True
+        ).order_by(
+            UserActivity.order_count.desc(), UserActivity.last_active_at.desc(), User.user_id
+        ).limit(limit).all()
+
+    def rebuild(self, batch_size: int = 10000) -> int:
+        """按用户ID分段从订单表和用户表重算计数，每段一个事务，返回写入的行数"""
+        try:
+            max_user_id = self.db.execute(select(func.max(User.user_id))).scalar()
+            written = 0
+            start = 0
+            while max_user_id is not None and start <= max_user_id:
+                end = start + batch_size
+                orders = select(
+                    Order.user_id,
+                    func.count(Order.order_id).label('order_count'),
+                    func.max(Order.created_at).label('last_order_at')
+                ).where(Order.user_id >= start, Order.user_id < end).group_by(Order.user_id).subquery()
+
+                self.db.execute(delete(UserActivity).where(UserActivity.user_id >= start, UserActivity.user_id < end))
+                result = self.db.execute(
+                    insert(UserActivity).from_select(
+                        ['user_id', 'order_count', 'last_order_at', 'last_login_at', 'last_active_at'],
+                        select(
+                            User.user_id,
+                            func.coalesce(orders.c.order_count, 0),
+                            orders.c.last_order_at,
+                            User.last_login,
+                            greatest(self.db, orders.c.last_order_at, User.last_login)
+                        ).outerjoin(orders, orders.c.user_id == User.user_id).where(
+                            User.user_id >= start, User.user_id < end,
+                            or_(orders.c.user_id.isnot(None), User.last_login.isnot(None))
+                        )
+                    )
+                )
+                self.db.commit()
+                written += result.rowcount
+                start = end
+            logger.info(f"用户活跃度计数重算完成, 行数: {written}")
+            return written
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"用户活跃度计数重算失败: {str(e)}")
+            raise
@@ -3,6 +3,9 @@ from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_, func
 from src.Data_base.models.user import User, UserAddress
 from src.Data_base.repositories.base_repository import BaseRepository
+from src.Data_base.repositories.identity_cache import UserIdentity, identity_cache
+from src.Data_base.repositories.pagination import InvalidCursor, apply_keyset
+from src.Data_base.repositories.user_activity import UserActivityRepository
 import logging
 from datetime import datetime
 
@@ -15,6 +18,24 @@ class UserRepository(BaseRepository[User]):
     def __init__(self, db: Session):
         super().__init__(User, db)
 
+    def update(self, db_obj: User, obj_in: dict) -> Optional[User]:
+        # 用户名可能被修改，先记下旧用户名，提交后失效旧键
+        username, user_id = db_obj.username, db_obj.user_id
+        user = super().update(db_obj, obj_in)
+        if user:
+            identity_cache.invalidate(username, user_id)
+            if user.username != username:
+                identity_cache.invalidate(user.username, user_id)
+        return user
+
+    def delete(self, id) -> bool:
+        user = self.get_by_id(id)
+        username = user.username if user else None
+        deleted = super().delete(id)
+        if deleted:
+            identity_cache.invalidate(username, id)
+        return deleted
+
     def is_account_locked(self, user_id: int) -> bool:
         """检查账户是否被锁定"""
         try:
@@ -46,6 +67,22 @@ class UserRepository(BaseRepository[User]):
             print(f"查询用户失败: {e}")
             return None
 
+    def get_identity(self, username: str = None, user_id: int = None) -> Optional[UserIdentity]:
+        """只查询令牌校验需要的列，按用户名或用户ID"""
+        try:
+            query = self.db.query(
+                User.user_id, User.username, User.user_role, User.is_active, User.is_verified, User.salt
+            )
+            if username is not None:
+                query = query.filter(User.username == username)
+            else:
+                query = query.filter(User.user_id == user_id)
+            row = query.first()
+            return UserIdentity.from_row(row) if row else None
+        except Exception as e:
+            logger.error(f"查询用户身份失败: {str(e)}")
+            return None
+
     def get_user_by_email(self, email: str) -> Optional[User]:
         """根据邮箱安全查询用户"""
         try:
@@ -123,6 +160,7 @@ class UserRepository(BaseRepository[User]):
             if user:
                 user.last_login = datetime.now()
                 user.login_count = (user.login_count or 0) + 1
+                UserActivityRepository(self.db).record_login(user_id, user.last_login)
                 self.db.commit()
                 logger.info(f"更新用户 {user_id} 最后登录时间")
                 return True
@@ -132,8 +170,8 @@ class UserRepository(BaseRepository[User]):
             logger.error(f"更新最后登录时间失败: {str(e)}")
             return False
 
-    def search_users(self, keyword: str, skip: int = 0, limit: int = 50) -> List[User]:
-        """安全搜索用户（防SQL注入）"""
+    def search_users(self, keyword: str, skip: int = 0, limit: int = 50, cursor: str = None) -> List[User]:
+        """安全搜索用户（防SQL注入，传入 cursor 时按游标分页，忽略 skip；游标无效时抛出 InvalidCursor）"""
         try:
             query = self.db.query(User).filter(User.is_active == True)
 
@@ -148,28 +186,22 @@ class UserRepository(BaseRepository[User]):
                     )
                 )
 
-            users = query.offset(skip).limit(limit).all()
+            query = apply_keyset(query, User.created_at, User.user_id, cursor)
+            if not cursor:
+                query = query.offset(skip)
+            users = query.limit(limit).all()
             logger.info(f"搜索用户: keyword='{keyword}', 结果数: {len(users)}")
             return users
+        except InvalidCursor:
+            raise
         except Exception as e:
             logger.error(f"搜索用户失败: {str(e)}")
             return []
 
     def get_users_by_activity(self, days: int = 30, limit: int = 100) -> List[Tuple[User, int]]:
-        """获取活跃用户统计（复杂查询示例）"""
+        """获取最近 days 天内活跃（下单或登录）的用户，按累计订单数排序，返回 [(用户, 订单数)]"""
         try:
-            from datetime import datetime, timedelta
-            from sqlalchemy import case
-
-            active_since = datetime.now() - timedelta(days=days)
-
-            results = self.db.query(
-                User,
-                func.count(case([(User.last_login >= active_since, 1)])).label('is_recent_active')
-            ).outerjoin(User.orders).group_by(User.user_id).order_by(
-                func.count(User.orders).desc()
-            ).limit(limit).all()
-
+            results = UserActivityRepository(self.db).get_active_users(days, limit)
             logger.info(f"获取活跃用户统计: 最近{days}天, 限制{limit}条")
             return results
         except Exception as e:
@@ -3,11 +3,15 @@ import secrets
 import time
 import re
 import base64
+import hashlib
 import json
-from collections import defaultdict
+import threading
+import math
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 from src.registration import UserSystem
-from src.utils.security import hmac_sm3
+from src.utils.security import HmacSM3Key
+from src.utils.rate_limit import rate_limiter
 import os
 
 class JWTUtils:
@@ -21,6 +25,8 @@ class JWTUtils:
             env_secret = os.getenv('JWT_SECRET_KEY')
             self.secret_key = env_secret if env_secret else secrets.token_urlsafe(32)
         self.algorithm = algorithm
+        # 预计算签名密钥的内外填充状态，签发/验证时只处理签名输入
+        self._signer = HmacSM3Key(self.secret_key.encode("utf-8"))
         print(f"JWT密钥初始化完成，长度: {len(self.secret_key)}")
 
     def generate_token(self, user_data: Dict[str, Any], expires_in_hours: int = 24) -> str:
@@ -37,6 +43,8 @@ class JWTUtils:
             'iss': 'ecommerce-system',
             'jti': secrets.token_urlsafe(16)
         }
+        if user_data.get('token_version'):
+            payload['ver'] = user_data['token_version']
 
         header = {
             "alg": "HSM3",
@@ -46,7 +54,7 @@ class JWTUtils:
         header_b64 = self._b64url_encode(json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
         payload_b64 = self._b64url_encode(json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
         signing_input = f"{header_b64}.{payload_b64}".encode("utf-8")
-        signature = hmac_sm3(self.secret_key.encode("utf-8"), signing_input)
+        signature = self._signer.sign(signing_input)
         signature_b64 = self._b64url_encode(signature)
         return f"{header_b64}.{payload_b64}.{signature_b64}"
 
@@ -81,9 +89,8 @@ class JWTUtils:
 
         header_b64, payload_b64, signature_b64 = parts
         signing_input = f"{header_b64}.{payload_b64}".encode("utf-8")
-        expected_sig = hmac_sm3(self.secret_key.encode("utf-8"), signing_input)
         actual_sig = self._b64url_decode(signature_b64)
-        if not secrets.compare_digest(expected_sig, actual_sig):
+        if not self._signer.verify(signing_input, actual_sig):
             raise ValueError("invalid token signature")
 
         header = json.loads(self._b64url_decode(header_b64).decode("utf-8"))
@@ -100,6 +107,73 @@ class JWTUtils:
                 raise ValueError("token expired")
 
         return payload
+
+
+class VerifiedTokenCache:
+    """已验证JWT的进程内LRU缓存
+
+    键为令牌的 BLAKE2b 摘要，值为验证通过的载荷。条目在令牌 exp 或
+    max_age 秒后（取较早者）失效，令牌登出/撤销时主动删除。
+    """
+
+    def __init__(self, max_size: int = 10000, max_age: int = 300):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        exp = payload.get("exp")
+        expires_at = time.time() + self.max_age
+        if isinstance(exp, int):
+            expires_at = min(expires_at, exp)
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (dict(payload), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0
+            }
+
+
 # 认证服务类
 class AuthService:
     """认证服务类，集成实验5的防护措施"""
@@ -108,14 +182,20 @@ class AuthService:
         self.user_system = user_system
         self.jwt_utils = JWTUtils(jwt_secret)
 
-        # 登录失败记录（防暴力破解）
-        self.failed_attempts = defaultdict(list)
+        # 登录失败计数（防暴力破解），与HTTP限流共用限流后端
+        self.rate_limiter = rate_limiter
         self.max_attempts = 5
         self.lock_time = 900  # 15分钟锁定
 
         # 令牌黑名单（用于登出功能）
         self.token_blacklist = set()
 
+        # 已验证令牌缓存：同一令牌的重复请求跳过验签和用户状态查询
+        self.token_cache = VerifiedTokenCache(
+            max_size=int(os.getenv('JWT_VERIFY_CACHE_SIZE', '10000')),
+            max_age=int(os.getenv('JWT_VERIFY_CACHE_TTL', '300'))
+        )
+
     def login(self, username: str, password: str) -> Dict[str, Any]:
         """用户登录认证"""
         # 检查账户是否被锁定
@@ -133,20 +213,15 @@ class AuthService:
             # 登录成功，清除失败记录
             self._clear_login_attempts(username)
 
-            # 获取用户信息生成令牌
-            user_info = self.user_system.get_user_info(username)
-            if not user_info:
+            # 获取用户身份生成令牌
+            identity = self.user_system.get_identity(username)
+            if not identity:
                 return {
                     'success': False,
                     'message': '获取用户信息失败'
                 }
 
-            user_data = {
-                'user_id': user_info['user_id'],
-                'username': username,
-                'role': user_info.get('user_role', 'normal')  # 改为 user_role
-            }
-
+            user_data = self._token_user_data(identity)
             token = self.jwt_utils.generate_token(user_data)
 
             return {
@@ -157,14 +232,13 @@ class AuthService:
             }
         else:
             # 登录失败，记录尝试
-            self._record_login_attempt(username)
-            remaining_attempts = self.max_attempts - len(self.failed_attempts[username])
+            remaining_attempts = self._record_login_attempt(username)
 
             if remaining_attempts <= 0:
                 self._lock_account(username)
                 return {
                     'success': False,
-                    'message': '登录失败次数过多，账户已被锁定15分钟'
+                    'message': f'登录失败次数过多，账户已被锁定{self.lock_time // 60}分钟'
                 }
 
             return {
@@ -173,22 +247,18 @@ class AuthService:
             }
 
     def issue_token_for_username(self, username: str) -> Dict[str, Any]:
-        user_info = self.user_system.get_user_info(username)
-        if not user_info:
+        identity = self.user_system.get_identity(username)
+        if not identity or not identity.is_active:
             return {
                 'success': False,
                 'message': '用户不存在'
             }
-        if not user_info.get('is_verified', True):
+        if not identity.is_verified:
             return {
                 'success': False,
                 'message': '用户未验证'
             }
-        user_data = {
-            'user_id': user_info['user_id'],
-            'username': username,
-            'role': user_info.get('user_role', 'normal')
-        }
+        user_data = self._token_user_data(identity)
         token = self.jwt_utils.generate_token(user_data)
         return {
             'success': True,
@@ -204,24 +274,45 @@ class AuthService:
             print("令牌已被撤销")
             return None
 
-        # 基本令牌验证
-        payload = self.jwt_utils.verify_token(token)
-        if not payload:
-            return None
+        payload = self.token_cache.get(token)
+        if payload is None:
+            # 基本令牌验证
+            payload = self.jwt_utils.verify_token(token)
+            if not payload:
+                return None
+            self.token_cache.put(token, payload)
 
-        # 检查用户状态
-        username = payload.get('username')
-        user_info = self.user_system.get_user_info(username)
-        if not user_info:
-            print("用户不存在")
+        # 检查用户状态（身份缓存，令牌缓存命中时也检查，禁用/改密码后旧令牌随即失效）
+        if not self._payload_matches_identity(payload):
             return None
+        return payload
 
-        # 检查用户是否活跃
-        if not user_info.get('is_active', True):
-            print("用户账户已被禁用")
-            return None
+    @staticmethod
+    def _token_user_data(identity) -> Dict[str, Any]:
+        return {
+            'user_id': identity.user_id,
+            'username': identity.username,
+            'role': identity.user_role,
+            'token_version': identity.token_version
+        }
 
-        return payload
+    def _payload_matches_identity(self, payload: Dict[str, Any]) -> bool:
+        """令牌载荷与用户当前身份一致：用户存在且启用，角色未变，密码未修改（旧令牌不带版本号时不检查版本）"""
+        identity = self.user_system.get_identity(payload.get('username'))
+        if not identity:
+            print("用户不存在")
+            return False
+        if not identity.is_active:
+            print("用户账户已被禁用")
+            return False
+        if identity.user_id != payload.get('user_id') or identity.user_role != payload.get('role', 'normal'):
+            print("令牌中的用户信息已过期")
+            return False
+        version = payload.get('ver')
+        if version is not None and version != identity.token_version:
+            print("密码已修改，令牌已失效")
+            return False
+        return True
 
     def logout(self, token: str) -> bool:
         """用户登出"""
@@ -229,6 +320,7 @@ class AuthService:
         if payload:
             # 将令牌加入黑名单
             self.token_blacklist.add(token)
+            self.token_cache.invalidate(token)
             print(f"用户登出: {payload.get('username')}")
             return True
         return False
@@ -250,16 +342,17 @@ class AuthService:
             if (now - exp_time).days > 7:
                 return None
 
+            # 用户已禁用、角色变更或密码已修改时不能续期
+            if not self._payload_matches_identity(payload):
+                return None
+
             # 生成新令牌
-            user_data = {
-                'user_id': payload['user_id'],
-                'username': payload['username'],
-                'role': payload['role']
-            }
-            new_token = self.jwt_utils.generate_token(user_data)
+            identity = self.user_system.get_identity(payload['username'])
+            new_token = self.jwt_utils.generate_token(self._token_user_data(identity))
 
             # 将旧令牌加入黑名单
             self.token_blacklist.add(old_token)
+            self.token_cache.invalidate(old_token)
 
             print(f"令牌刷新成功: {payload['username']}")
             return new_token
@@ -268,42 +361,28 @@ class AuthService:
             print(f"令牌刷新失败: {e}")
             return None
 
+    def _failed_login_key(self, username: str) -> str:
+        return f"login_failed:{username}"
+
     def _is_account_locked(self, username: str) -> bool:
         """检查账户是否被锁定"""
-        if username not in self.failed_attempts:
-            return False
-
-        attempts = self.failed_attempts[username]
-        if len(attempts) < self.max_attempts:
-            return False
-
-        # 检查锁定时间
-        first_attempt = attempts[0]
-        return time.time() - first_attempt < self.lock_time
+        return self.rate_limiter.locked_for(self._failed_login_key(username)) > 0
 
     def _get_lock_remaining_time(self, username: str) -> int:
         """获取锁定剩余时间"""
-        if username in self.failed_attempts and self.failed_attempts[username]:
-            first_attempt = self.failed_attempts[username][0]
-            elapsed = time.time() - first_attempt
-            return max(0, int(self.lock_time - elapsed))
-        return 0
-
-    def _record_login_attempt(self, username: str):
-        """记录登录尝试"""
-        current_time = time.time()
-        attempts = self.failed_attempts[username]
+        remaining = self.rate_limiter.locked_for(self._failed_login_key(username))
+        return math.ceil(remaining) if remaining > 0 else 0
 
-        # 清理过期的尝试记录（超过锁定时间的）
-        attempts = [t for t in attempts if current_time - t < self.lock_time]
-        attempts.append(current_time)
-
-        self.failed_attempts[username] = attempts
+    def _record_login_attempt(self, username: str) -> int:
+        """记录登录失败，返回剩余可尝试次数；lock_time 内失败 max_attempts 次后锁定 lock_time"""
+        result = self.rate_limiter.record_failure(
+            self._failed_login_key(username), self.max_attempts, self.lock_time, self.lock_time
+        )
+        return result.remaining if result.allowed else 0
 
     def _clear_login_attempts(self, username: str):
         """清除登录尝试记录"""
-        if username in self.failed_attempts:
-            del self.failed_attempts[username]
+        self.rate_limiter.reset(self._failed_login_key(username))
 
     def _lock_account(self, username: str):
         """锁定账户"""
@@ -351,6 +430,10 @@ class EnhancedUserSystem:
         """获取用户信息"""
         return self.user_system.get_user_info(username)
 
+    def get_identity(self, username: str):
+        """获取用户身份（带缓存）"""
+        return self.user_system.get_identity(username)
+
     def change_password(self, username: str, old_password: str, new_password: str):
         """修改密码"""
         return self.user_system.change_password(username, old_password, new_password)
@@ -1,11 +1,27 @@
 import hashlib
+import hmac
+import logging
 import os
 import secrets
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from datetime import datetime, timedelta
-from src.utils.security import pbkdf2_sm3, sm3_hexdigest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from src.utils.security import pbkdf2_sm3, pbkdf2_sm3_offload, sm3_hexdigest
+from src.utils.rate_limit import rate_limiter
+from src.Data_base.repositories.identity_cache import identity_cache
+from src.Data_base.repositories.login_bookkeeping import login_bookkeeper
+from src.utils.password_hashing import (
+    PBKDF2_SM3, PBKDF2_SHA256, encode_password_record, parse_password_record
+)
+
+logger = logging.getLogger(__name__)
+
+# 登录成功后的密码重新哈希在后台线程执行，不阻塞登录响应
+_rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-rehash")
 
 
 class UserSystem:
@@ -15,34 +31,94 @@ class UserSystem:
         # 使用数据库存储
         self.user_repository = user_repository
         self.verification_codes = {}  # 验证码存储
-        self.attempts = {}  # 操作频率记录
+        self.rate_limiter = rate_limiter  # 操作频率限制（与HTTP限流共用后端）
+        self.login_bookkeeper = login_bookkeeper  # 启用后登录失败计数走 Redis，登录字段批量异步写回
+        self.identity_cache = identity_cache  # 令牌校验用的用户身份缓存
         self.primary_iterations = int(os.getenv("SM3_PBKDF2_ITERATIONS", "2500"))
         self.legacy_iterations = 10000
+        # 开启后密码哈希在有界进程池中计算，登录高峰不会串行占满请求线程
+        self.offload_hashing = os.getenv("SM3_PBKDF2_PROCESS_POOL", "false").lower() in {"1", "true", "yes"}
 
-    def hash_password(self, password, salt=None, iterations=None):
-        """T2防护：密码加盐哈希，防止数据篡改"""
-        salt = salt or secrets.token_hex(16)
+    def _derive_sm3(self, password, salt, iterations):
         try:
             salt_bytes = bytes.fromhex(salt)
         except ValueError:
             salt_bytes = salt.encode("utf-8")
-        rounds = iterations or self.primary_iterations
-        password_hash = pbkdf2_sm3(
+        derive = pbkdf2_sm3_offload if self.offload_hashing else pbkdf2_sm3
+        return derive(
             password=password.encode("utf-8"),
             salt=salt_bytes,
-            iterations=rounds,
+            iterations=iterations,
             dklen=32,
         ).hex()
-        return password_hash, salt
 
-    def _hash_password_legacy_sha256(self, password: str, salt: str) -> str:
+    def hash_password(self, password, salt=None, iterations=None):
+        """T2防护：密码加盐哈希，防止数据篡改（返回带算法和迭代次数的版本化记录）"""
+        salt = salt or secrets.token_hex(16)
+        rounds = iterations or self.primary_iterations
+        password_hash = self._derive_sm3(password, salt, rounds)
+        return encode_password_record(PBKDF2_SM3, rounds, password_hash), salt
+
+    def _hash_password_legacy_sha256(self, password: str, salt: str, iterations: int = 100000) -> str:
         return hashlib.pbkdf2_hmac(
             "sha256",
             password.encode("utf-8"),
             salt.encode("utf-8"),
-            100000,
+            iterations,
         ).hex()
 
+    def verify_password(self, password, stored, salt):
+        """校验密码，返回 (是否匹配, 是否需要重新哈希)
+
+        带版本的记录只做一次派生；未带版本的旧记录无法确定方案，按历史顺序尝试。
+        """
+        record = parse_password_record(stored)
+        if record.algorithm == PBKDF2_SM3:
+            actual = self._derive_sm3(password, salt, record.iterations)
+            matched = hmac.compare_digest(actual, record.hash_hex)
+            return matched, matched and record.iterations != self.primary_iterations
+        if record.algorithm == PBKDF2_SHA256:
+            actual = self._hash_password_legacy_sha256(password, salt, record.iterations)
+            return hmac.compare_digest(actual, record.hash_hex), True
+
+        candidates = (
+            lambda: self._derive_sm3(password, salt, self.primary_iterations),
+            lambda: self._derive_sm3(password, salt, self.legacy_iterations),
+            lambda: self._hash_password_legacy_sha256(password, salt),
+        )
+        for derive in candidates:
+            if hmac.compare_digest(derive(), record.hash_hex):
+                return True, True
+        return False, False
+
+    def schedule_rehash(self, user_id, password, old_record, salt=None):
+        """后台将旧格式/旧参数的密码记录升级为当前方案"""
+        bind = self.user_repository.db.get_bind()
+        return _rehash_executor.submit(self._rehash_password, bind, user_id, password, old_record, salt)
+
+    def _rehash_password(self, bind, user_id, password, old_record, salt=None):
+        # 沿用原盐值：密码没变，令牌版本（由盐值派生）也不应变化，刚签发的令牌继续有效
+        new_record, new_salt = self.hash_password(password, salt)
+        model = self.user_repository.model
+        session = Session(bind=bind)
+        try:
+            # 仅当记录未被并发修改时才覆盖（比较并交换）
+            result = session.execute(
+                update(model)
+                .where(model.user_id == user_id, model.pass_word == old_record)
+                .values(pass_word=new_record, salt=new_salt)
+            )
+            session.commit()
+            if result.rowcount:
+                logger.info(f"用户 {user_id} 的密码记录已升级为 {PBKDF2_SM3}")
+            return bool(result.rowcount)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"用户 {user_id} 密码记录升级失败: {str(e)}")
+            return False
+        finally:
+            session.close()
+
     def validate_input(self, username, password, phone, email=None):
         """T2防护：输入验证，防止数据篡改"""
         if not all([username, password, phone]):
@@ -111,19 +187,8 @@ class UserSystem:
         return False
 
     def check_rate(self, key, max_attempts=5, window=600):
-        """T5防护：频率限制防止拒绝服务攻击"""
-        now = time.time()
-
-        if key not in self.attempts:
-            self.attempts[key] = []
-
-        self.attempts[key] = [t for t in self.attempts[key] if now - t < window]
-
-        if len(self.attempts[key]) >= max_attempts:
-            return False
-
-        self.attempts[key].append(now)
-        return True
+        """T5防护：频率限制防止拒绝服务攻击（window 秒内最多 max_attempts 次，超出后到窗口结束前一直拒绝）"""
+        return self.rate_limiter.hit_window(key, max_attempts, window).allowed
 
     def register(self, username, password, phone, code, email=None):
         """用户注册 - 综合安全防护"""
@@ -194,49 +259,40 @@ class UserSystem:
         if not user:
             return False, "用户名或密码错误"
 
+        bookkeeper = self.login_bookkeeper if self.login_bookkeeper.enabled else None
+
         # T6防护：账户锁定防止权限提升尝试
-        if self.user_repository.is_account_locked(user.user_id):
+        locked = bookkeeper.is_locked(user) if bookkeeper else self.user_repository.is_account_locked(user.user_id)
+        if locked:
             return False, "账户已锁定，请稍后重试或联系管理员"
 
-        # T1防护：密码验证防止身份欺骗
-        current_hash, _ = self.hash_password(password, user.salt, self.primary_iterations)
-        if current_hash == user.pass_word:
+        # T1防护：密码验证防止身份欺骗（按记录版本只做一次派生）
+        matched, needs_rehash = self.verify_password(password, user.pass_word, user.salt)
+        if matched:
+            if needs_rehash:
+                self.schedule_rehash(user.user_id, password, user.pass_word, user.salt)
             # 登录成功，重置尝试次数并更新登录信息
-            self.user_repository.reset_login_attempts(user.user_id)
-            self.user_repository.update_last_login(user.user_id)
-            return True, "登录成功"
-        legacy_sm3_hash, _ = self.hash_password(password, user.salt, self.legacy_iterations)
-        if legacy_sm3_hash == user.pass_word:
-            try:
-                user.pass_word = current_hash
-                self.user_repository.db.commit()
-            except Exception:
-                self.user_repository.db.rollback()
-            self.user_repository.reset_login_attempts(user.user_id)
-            self.user_repository.update_last_login(user.user_id)
-            return True, "登录成功"
-        legacy_hash = self._hash_password_legacy_sha256(password, user.salt)
-        if legacy_hash == user.pass_word:
-            try:
-                user.pass_word = current_hash
-                self.user_repository.db.commit()
-            except Exception:
-                self.user_repository.db.rollback()
-            self.user_repository.reset_login_attempts(user.user_id)
-            self.user_repository.update_last_login(user.user_id)
+            if bookkeeper:
+                bookkeeper.record_success(user.user_id)
+            else:
+                self.user_repository.reset_login_attempts(user.user_id)
+                self.user_repository.update_last_login(user.user_id)
             return True, "登录成功"
         else:
             # 登录失败，增加尝试次数
-            new_attempts = user.failed_attempts + 1
-            locked_until = None
+            if bookkeeper:
+                new_attempts, _ = bookkeeper.record_failure(user)
+            else:
+                new_attempts = user.failed_attempts + 1
+                locked_until = None
 
-            if new_attempts >= 5:
-                # 锁定账户1小时
-                locked_until = datetime.now() + timedelta(hours=1)
+                if new_attempts >= 5:
+                    # 锁定账户1小时
+                    locked_until = datetime.now() + timedelta(hours=1)
 
-            self.user_repository.update_login_attempts(
-                user.user_id, new_attempts, locked_until
-            )
+                self.user_repository.update_login_attempts(
+                    user.user_id, new_attempts, locked_until
+                )
 
             if new_attempts >= 5:
                 return False, "账户已锁定，请1小时后再试"
@@ -268,6 +324,8 @@ class UserSystem:
 
             try:
                 self.user_repository.db.commit()
+                self.login_bookkeeper.reset(user.user_id)
+                self.identity_cache.invalidate(user.username, user.user_id)
                 return True, "密码重置成功"
             except Exception as e:
                 self.user_repository.db.rollback()
@@ -282,11 +340,9 @@ class UserSystem:
             return False, "用户不存在"
 
         # 验证旧密码
-        old_hash, _ = self.hash_password(old_password, user.salt)
-        if old_hash != user.pass_word:
-            legacy_hash = self._hash_password_legacy_sha256(old_password, user.salt)
-            if legacy_hash != user.pass_word:
-                return False, "原密码不正确"
+        matched, _ = self.verify_password(old_password, user.pass_word, user.salt)
+        if not matched:
+            return False, "原密码不正确"
 
         # 验证新密码强度
         valid, msg = self.validate_input(username, new_password, user.phone, user.email)
@@ -301,6 +357,8 @@ class UserSystem:
             user.failed_attempts = 0
             user.account_locked_until = None
             self.user_repository.db.commit()
+            self.login_bookkeeper.reset(user.user_id)
+            self.identity_cache.invalidate(user.username, user.user_id)
             return True, "密码修改成功"
         except Exception as e:
             self.user_repository.db.rollback()
@@ -371,7 +429,16 @@ class UserSystem:
                 'phone': user.phone,
                 'user_role': user.user_role,
                 'is_verified': user.is_verified,
+                'is_active': user.is_active,
                 'last_login': user.last_login,
                 'created_at': user.created_at
             }
         return None
+
+    def get_identity(self, username):
+        """用户身份（带缓存），令牌签发和校验使用，不存在时返回 None"""
+        return self.identity_cache.get(username, lambda: self.user_repository.get_identity(username=username))
+
+    def get_identity_by_id(self, user_id):
+        """按用户ID取用户身份（带缓存）"""
+        return self.identity_cache.get_by_id(user_id, lambda: self.user_repository.get_identity(user_id=user_id))
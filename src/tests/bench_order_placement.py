@@ -0,0 +1,105 @@
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.Data_base.database import Base
+from src.Data_base.models.order import Order, OrderItem
+from src.Data_base.models.product import Category, Product
+from src.Data_base.models.user import User
+from src.Data_base.repositories.order_repository import OrderRepository
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+PRODUCTS = 200
+ITEMS_PER_ORDER = 5
+
+
+def _session(path):
+    """文件型 SQLite，提交需要落盘，更接近真实数据库的事务开销"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add(Category(category_id=1, category_name="手机"))
+    db.add(User(user_id=1, username="b2b", pass_word="x", email="b2b@example.com", phone="13800000000"))
+    db.add_all(
+        Product(product_id=i, sku=f"SKU-{i:05d}", product_name=f"商品 {i}", sale_price=Decimal("19.90"),
+                stock_quantity=10 ** 6, category_id=1)
+        for i in range(1, PRODUCTS + 1)
+    )
+    db.commit()
+    return db
+
+
+def _orders(count, prefix):
+    return [
+        {
+            "order_number": f"{prefix}-{n}",
+            "user_id": 1,
+            "items": [
+                {"product_id": (n * ITEMS_PER_ORDER + k) % PRODUCTS + 1, "quantity": 2}
+                for k in range(ITEMS_PER_ORDER)
+            ],
+        }
+        for n in range(count)
+    ]
+
+
+def _legacy_place(db, orders):
+    """旧方案：逐个订单 flush 取ID，逐行添加订单项，逐个商品读改写库存，每单一个事务"""
+    for spec in orders:
+        subtotal = Decimal("0")
+        items = []
+        for item in spec["items"]:
+            product = db.get(Product, item["product_id"])
+            product.stock_quantity -= item["quantity"]
+            total = product.sale_price * item["quantity"]
+            subtotal += total
+            items.append(dict(item, unit_price=product.sale_price, total_price=total))
+        order = Order(order_number=spec["order_number"], user_id=1, subtotal_amount=subtotal, total_amount=subtotal)
+        db.add(order)
+        db.flush()
+        for item in items:
+            db.add(OrderItem(order_id=order.order_id, **item))
+        db.commit()
+
+
+def _bulk_place(db, orders, batch_size=500):
+    repo = OrderRepository(db)
+    for start in range(0, len(orders), batch_size):
+        results = repo.place_orders(orders[start:start + batch_size])
+        assert all(result.ok for result in results)
+
+
+def _bench(label, func, orders):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = _session(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        func(db, orders)
+        elapsed = time.perf_counter() - start
+        assert db.query(OrderItem).count() == len(orders) * ITEMS_PER_ORDER
+        db.close()
+        db.get_bind().dispose()
+    rows = len(orders) * (ITEMS_PER_ORDER + 1)
+    print(f"{label:<10} {elapsed:>8.2f} s  {rows / elapsed:>10.0f} 行/秒")
+    return elapsed
+
+
+def run_benchmark(count=2000):
+    print(f"===== 批量下单：{count} 个订单，每单 {ITEMS_PER_ORDER} 个商品 =====")
+    baseline = _bench("逐单写入", _legacy_place, _orders(count, "L"))
+    elapsed = _bench("批量下单", _bulk_place, _orders(count, "B"))
+    print(f"{'':<10} 加速比: {baseline / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
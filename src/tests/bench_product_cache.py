@@ -0,0 +1,72 @@
+import json
+import pickle
+import time
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, joinedload
+
+from src.Data_base.database import Base
+from src.Data_base.models.product import Category, Product
+import src.Data_base.models  # noqa: F401  注册全部模型
+from api_service.utils.cache_utils import ProductCache
+
+
+def _load_products(count):
+    """在内存 SQLite 中构造商品并按列表查询的方式加载（含预加载的分类）"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Category(category_id=1, category_name="手机"))
+        for i in range(1, count + 1):
+            db.add(Product(
+                product_id=i, sku=f"SKU-{i:05d}", product_name=f"示例手机 {i}",
+                description="旗舰手机，徕卡影像系统，超视网膜XDR显示屏",
+                specifications={"颜色": "白色", "存储": "256GB", "网络": "5G"},
+                image_urls=[f"/products/{i}.jpg"], sale_price=Decimal("4299.00"),
+                stock_quantity=25, category_id=1,
+            ))
+        db.commit()
+        products = db.query(Product).options(joinedload(Product.category)).all()
+        db.expunge_all()
+    return products
+
+
+def _legacy_hit(blob):
+    """旧方案：反序列化 ORM 对象，再逐字段转字典并渲染 JSON"""
+    products = pickle.loads(blob)
+    data = [ProductCache.serialize_list_item(product) for product in products]
+    return json.dumps({"code": 0, "message": "success", "data": data}, ensure_ascii=False).encode("utf-8")
+
+
+def _payload_hit(blob):
+    """新方案：反序列化字节串后直接拼接响应体"""
+    payload = pickle.loads(blob)
+    return b''.join((b'{"code":0,"message":"success","data":', payload, b'}'))
+
+
+def _bench(label, func, blob, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(blob)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(blob):>8}B  {elapsed * 1e6 / rounds:>10.1f} us/次")
+    return elapsed
+
+
+def run_benchmark(rounds=500):
+    print("===== 商品列表缓存：ORM对象 vs 预序列化JSON =====")
+    for count in (10, 50):
+        products = _load_products(count)
+        legacy_blob = pickle.dumps(products, pickle.HIGHEST_PROTOCOL)
+        payload_blob = pickle.dumps(ProductCache.render_list_payload(products), pickle.HIGHEST_PROTOCOL)
+        assert json.loads(_legacy_hit(legacy_blob))["data"] == json.loads(_payload_hit(payload_blob))["data"]
+
+        print(f"[{count} 个商品]")
+        baseline = _bench("ORM对象", _legacy_hit, legacy_blob, rounds)
+        elapsed = _bench("JSON字节", _payload_hit, payload_blob, rounds)
+        print(f"{'':<10} 体积缩小: {len(legacy_blob) / len(payload_blob):.1f}x  命中加速比: {baseline / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
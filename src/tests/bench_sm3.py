@@ -0,0 +1,44 @@
+import os
+import time
+
+from src.utils.sm3 import BACKENDS, SM3_BACKEND, new_sm3
+
+try:
+    from gmssl import sm3 as gmssl_sm3
+except Exception:
+    gmssl_sm3 = None
+
+
+def _bench(label, func, data, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(data)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(data):>6}B  {rounds / elapsed:>12.0f} 次/秒  {elapsed * 1e6 / rounds:>10.1f} us/次")
+    return elapsed
+
+
+def run_benchmark():
+    print(f"===== SM3 后端性能对比（默认后端: {SM3_BACKEND}）=====")
+    # JWT 签名输入、黑名单键、PBKDF2 分组、长缓存键
+    for size, rounds in ((32, 2000), (200, 1000), (1024, 200), (16384, 20)):
+        data = os.urandom(size)
+        baseline = None
+        if gmssl_sm3:
+            baseline = _bench("gmssl", lambda d: bytes.fromhex(gmssl_sm3.sm3_hash(list(d))), data, rounds)
+        for name, factory in BACKENDS.items():
+            elapsed = _bench(name, lambda d: factory(d).digest(), data, rounds)
+            if baseline:
+                print(f"{'':<10} 相对 gmssl 加速比: {baseline / elapsed:.1f}x")
+        print("-" * 60)
+
+    # 增量接口与一次性计算结果一致
+    data = os.urandom(5000)
+    h = new_sm3()
+    for i in range(0, len(data), 333):
+        h.update(data[i:i + 333])
+    assert h.digest() == new_sm3(data).digest()
+
+
+if __name__ == "__main__":
+    run_benchmark()
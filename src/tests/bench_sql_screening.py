@@ -0,0 +1,58 @@
+import json
+import re
+import time
+
+from api_service.api.middleware import SQL_SCREENING_ENGINE, SQL_SCREENING_PATTERNS
+
+
+def _legacy_detect(value):
+    return bool(re.search("|".join(SQL_SCREENING_PATTERNS), value, re.IGNORECASE))
+
+
+def _legacy_scan(data):
+    if isinstance(data, dict):
+        return any(_legacy_scan(value) for value in data.values())
+    if isinstance(data, list):
+        return any(_legacy_scan(item) for item in data)
+    if isinstance(data, str):
+        return _legacy_detect(data)
+    return False
+
+
+BODIES = {
+    "login": {"username": "zhangsan", "password": "Passw0rd!2024"},
+    "register": {
+        "username": "lisi_88", "password": "Str0ng#Pass", "phone": "13800138000",
+        "email": "lisi@example.com", "real_name": "李四",
+    },
+    "profile": {"nickname": "小王", "address": "北京市海淀区中关村大街1号", "phone": "13912345678"},
+    "search": {"keyword": "华为 手机", "page": "1", "page_size": "20", "sort": "price"},
+    "order": {
+        "address_id": 3,
+        "items": [{"product_id": i, "quantity": 2, "remark": "尽快发货"} for i in range(20)],
+    },
+}
+
+
+def _bench(label, func, data, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(data)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed * 1e6 / rounds:>10.1f} us/次")
+    return elapsed
+
+
+def run_benchmark(rounds=5000):
+    print("===== SQL注入筛查性能对比 =====")
+    for name, body in BODIES.items():
+        body = json.loads(json.dumps(body))
+        assert _legacy_scan(body) == (SQL_SCREENING_ENGINE.scan(body) is not None)
+        print(f"[{name}]")
+        baseline = _bench("旧实现", _legacy_scan, body, rounds)
+        elapsed = _bench("新引擎", SQL_SCREENING_ENGINE.scan, body, rounds)
+        print(f"{'':<10} 加速比: {baseline / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,93 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import BigInteger, create_engine, func, insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.Data_base.database import Base
+from src.Data_base.models.order import Order
+from src.Data_base.models.user import User
+from src.Data_base.repositories.user_activity import UserActivityRepository
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+USERS = 50000
+DAYS = 365
+CHUNK = 50000
+
+
+def _populate(db, order_count):
+    """USERS 个用户，order_count 个订单，下单时间在最近一年内随机分布，少数用户下单较多"""
+    rng = random.Random(42)
+    now = datetime.now()
+    db.execute(insert(User), [
+        {"user_id": i, "username": f"u{i}", "pass_word": "x", "email": f"u{i}@example.com",
+         "last_login": now - timedelta(days=rng.random() * DAYS)}
+        for i in range(1, USERS + 1)
+    ])
+    for start in range(0, order_count, CHUNK):
+        db.execute(insert(Order), [
+            {"order_number": f"B{n}", "user_id": int(rng.paretovariate(1.2)) % USERS + 1,
+             "subtotal_amount": 10, "total_amount": 10,
+             "created_at": now - timedelta(seconds=rng.random() * DAYS * 86400)}
+            for n in range(start, min(start + CHUNK, order_count))
+        ])
+    db.commit()
+
+
+def _aggregate_ranking(db, days, limit):
+    """旧方案：每次请求关联全部订单按用户分组计数"""
+    active_since = datetime.now() - timedelta(days=days)
+    return db.query(
+        User,
+        func.count(Order.order_id).label("order_count"),
+        func.max(User.last_login >= active_since).label("is_recent_active")
+    ).outerjoin(Order, Order.user_id == User.user_id).group_by(User.user_id).order_by(
+        func.count(Order.order_id).desc()
+    ).limit(limit).all()
+
+
+def _timed(func, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def run_benchmark(order_count=1000000, days=30, limit=100):
+    print(f"===== 活跃用户排行：{USERS} 个用户，{order_count} 个订单，最近 {days} 天前 {limit} 名 =====")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        db = Session(engine)
+        start = time.perf_counter()
+        _populate(db, order_count)
+        print(f"生成数据     {time.perf_counter() - start:>8.2f} s")
+
+        repo = UserActivityRepository(db)
+        start = time.perf_counter()
+        rows = repo.rebuild()
+        print(f"回填计数     {time.perf_counter() - start:>8.2f} s  ({rows} 行)")
+
+        baseline, _ = _timed(lambda: _aggregate_ranking(db, days, limit), repeat=3)
+        elapsed, ranking = _timed(lambda: repo.get_active_users(days, limit))
+        assert len(ranking) == limit
+        print(f"分组统计     {baseline * 1000:>8.1f} ms")
+        print(f"计数表范围读 {elapsed * 1000:>8.1f} ms")
+        print(f"加速比: {baseline / elapsed:.0f}x")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
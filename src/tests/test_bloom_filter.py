@@ -0,0 +1,22 @@
+import os
+
+from src.utils.bloom_filter import BloomFilter
+from src.utils.security import sm3_digest
+
+
+def test_bloom_filter_has_no_false_negatives():
+    print("===== 布隆过滤器测试 =====")
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    members = [sm3_digest(os.urandom(16)) for _ in range(1000)]
+    for digest in members:
+        bloom.add(digest)
+    assert all(digest in bloom for digest in members)
+    assert not bloom.saturated
+
+    false_positives = sum(bloom.might_contain(sm3_digest(os.urandom(16))) for _ in range(5000))
+    print(f"误判数: {false_positives}/5000")
+    assert false_positives < 5000 * 0.03
+
+
+if __name__ == "__main__":
+    test_bloom_filter_has_no_false_negatives()
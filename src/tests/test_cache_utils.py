@@ -0,0 +1,113 @@
+import threading
+import time
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+from django.core.cache import cache
+
+from api_service.utils.cache_utils import CacheEntry, CacheUtils, l1_cache, l1_invalidation
+from src.Data_base.models.product import Product
+
+
+def test_concurrent_misses_compute_once():
+    print("===== 缓存防击穿测试 =====")
+    cache.clear()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(CacheUtils.get_or_compute("single_flight", compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 8
+    print("并发未命中只回源一次")
+
+
+def test_expired_entry_serves_stale_while_one_refresh_runs():
+    cache.clear()
+    cache.set("stale_key", CacheEntry("old", time.time() - 1, 0.0), 60)
+    refreshing = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_compute():
+        calls.append(1)
+        refreshing.set()
+        release.wait(5)
+        return "new"
+
+    refreshed = []
+    refresher = threading.Thread(target=lambda: refreshed.append(
+        CacheUtils.get_or_compute("stale_key", slow_compute, stale_ttl=60, beta=0)))
+    refresher.start()
+    assert refreshing.wait(5)
+
+    # 刷新进行中：其他调用方直接拿旧值，不再回源
+    for _ in range(3):
+        assert CacheUtils.get_or_compute("stale_key", slow_compute, stale_ttl=60, beta=0) == "old"
+    release.set()
+    refresher.join()
+    assert refreshed == ["new"]
+    assert len(calls) == 1
+    assert CacheUtils.get_or_compute("stale_key", slow_compute, stale_ttl=60, beta=0) == "new"
+    print("过期后返回旧值，只有一个调用方刷新")
+
+
+def test_none_result_cached_for_negative_ttl():
+    cache.clear()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None
+
+    assert CacheUtils.get_or_compute("missing", compute, expire=300, negative_expire=5) is None
+    assert CacheUtils.get_or_compute("missing", compute, expire=300, negative_expire=5) is None
+    assert len(calls) == 1
+    entry = cache.get("missing")
+    assert entry.value is None and entry.soft_expires_at <= time.time() + 5
+
+    # negative_expire=0 时不缓存空结果
+    assert CacheUtils.get_or_compute("not_cached", compute, negative_expire=0) is None
+    assert CacheUtils.get_or_compute("not_cached", compute, negative_expire=0) is None
+    assert len(calls) == 3
+    print("空结果按负缓存时间缓存")
+
+
+def test_l1_hands_out_independent_copies():
+    cache.clear()
+    l1_cache.clear()
+    ready, l1_invalidation.ready = l1_invalidation.ready, True  # 模拟已建立失效订阅
+    try:
+        compute = lambda: {"username": "alice", "roles": ["normal"]}
+        first = CacheUtils.get_or_compute("profile:alice", compute, l1_ttl=30)
+        first["roles"].append("admin")  # 调用方修改返回值
+        assert l1_cache.get("profile:alice") is not None
+        assert CacheUtils.get_or_compute("profile:alice", compute, l1_ttl=30) == {"username": "alice", "roles": ["normal"]}
+
+        # ORM 实例不放入一级缓存
+        CacheUtils.get_or_compute("product:1", lambda: Product(product_id=1, product_name="商品"), l1_ttl=30)
+        assert l1_cache.get("product:1") is None
+    finally:
+        l1_invalidation.ready = ready
+    print("一级缓存每次返回独立副本，不缓存 ORM 实例")
+
+
+if __name__ == "__main__":
+    test_concurrent_misses_compute_once()
+    test_expired_entry_serves_stale_while_one_refresh_runs()
+    test_none_result_cached_for_negative_ttl()
+    test_l1_hands_out_independent_copies()
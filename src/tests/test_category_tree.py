@@ -0,0 +1,51 @@
+from collections import namedtuple
+
+from src.Data_base.repositories.category_tree import CategoryTreeCache, build_category_tree
+
+Row = namedtuple("Row", "category_id category_name parent_category_id category_level sort_order")
+
+
+def test_build_deep_tree():
+    print("===== 分类树组装测试 =====")
+    rows = [
+        Row(1, "电子产品", None, 1, 0),
+        Row(4, "服装", None, 1, 1),
+        Row(2, "手机", 1, 2, 0),
+        Row(5, "电脑", 1, 2, 1),
+        Row(3, "智能手机", 2, 3, 0),
+        Row(6, "孤立分类", 99, 2, 0),  # 父分类未启用
+    ]
+    tree = build_category_tree(rows)
+    assert [node["category_id"] for node in tree] == [1, 4]
+    assert [child["category_id"] for child in tree[0]["children"]] == [2, 5]
+    assert tree[0]["children"][0]["children"][0]["category_name"] == "智能手机"
+    assert tree[1]["children"] == []
+    print("三级分类树组装正确")
+
+
+def test_cache_invalidation():
+    cache = CategoryTreeCache(ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [len(loads)]
+
+    assert cache.get(loader) == [1]
+    assert cache.get(loader) == [1]
+    cache.invalidate()
+    assert cache.get(loader) == [2]
+
+    # 加载期间发生失效时不缓存加载结果
+    def racing_loader():
+        cache.invalidate()
+        return ["stale"]
+
+    cache.invalidate()
+    assert cache.get(racing_loader) == ["stale"]
+    assert cache.get(loader) == [3]
+
+
+if __name__ == "__main__":
+    test_build_deep_tree()
+    test_cache_invalidation()
@@ -0,0 +1,154 @@
+import pytest
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.authentication import AuthService
+from src.Data_base.database import Base
+from src.Data_base.models.user import User
+from src.Data_base.repositories.identity_cache import IdentityCache, UserIdentity, identity_cache
+from src.Data_base.repositories.user_repository import UserRepository
+from src.registration import UserSystem
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+def _identity(user_id=1, username="alice", **changes):
+    values = dict(user_id=user_id, username=username, user_role="normal", is_active=True,
+                  is_verified=True, token_version="v1")
+    values.update(changes)
+    return UserIdentity(**values)
+
+
+def test_identity_cache_keys_and_invalidation():
+    print("===== 用户身份缓存测试 =====")
+    cache = IdentityCache(local_ttl=60)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return _identity()
+
+    assert cache.get("alice", load) == _identity()
+    assert cache.get("alice", load) == _identity()
+    assert cache.get_by_id(1, load) == _identity()  # 按用户名加载时同时缓存了用户ID键
+    assert len(loads) == 1
+
+    cache.invalidate("alice")  # 只给用户名，用户ID键也一并失效
+    assert cache.get_by_id(1, load) == _identity()
+    assert len(loads) == 2
+    assert cache.get("nobody", lambda: None) is None
+    assert cache.get("nobody", lambda: _identity(2, "nobody")).user_id == 2  # 不存在的用户不缓存
+    print(f"命中统计: {cache.stats()}")
+
+
+def test_load_racing_with_invalidation_is_not_cached():
+    cache = IdentityCache(local_ttl=60)
+
+    def stale_load():
+        cache.invalidate("alice")  # 加载期间密码被修改
+        return _identity(token_version="old")
+
+    assert cache.get("alice", stale_load).token_version == "old"
+    assert cache.get("alice", lambda: _identity(token_version="new")).token_version == "new"
+
+
+def test_stale_load_is_not_shared_after_another_worker_invalidates():
+    fakeredis = pytest.importorskip("fakeredis")
+    connection = fakeredis.FakeRedis(decode_responses=True)
+    worker_a, worker_b, worker_c = (IdentityCache(local_ttl=60) for _ in range(3))
+    for worker in (worker_a, worker_b, worker_c):
+        worker.use_connection(connection)
+
+    def stale_load():
+        # worker A 读到旧数据后，worker B 提交了修改并失效
+        worker_b.invalidate("alice", 1)
+        return _identity(token_version="old")
+
+    assert worker_a.get("alice", stale_load).token_version == "old"
+    assert connection.get("identity:name:alice") is None
+    assert worker_c.get_by_id(1, lambda: _identity(token_version="new")).token_version == "new"
+    assert worker_a.get("alice", lambda: _identity(token_version="new")).token_version == "new"
+    assert worker_b.get("alice", lambda: None).token_version == "new"  # 共享缓存命中
+    print("加载期间被其他 worker 失效的身份不写入共享缓存")
+
+
+def _auth_service():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    system = UserSystem(UserRepository(db))
+    system.identity_cache = IdentityCache(local_ttl=60)
+    pwd_hash, salt = system.hash_password("Passw0rd!")
+    db.add(User(user_id=1, username="alice", pass_word=pwd_hash, salt=salt, phone="13800000001",
+                email="alice@example.com", failed_attempts=0, login_count=0, is_active=True, is_verified=True))
+    db.commit()
+    system.rate_limiter.reset("login_alice")
+    return AuthService(system, "test-secret"), db
+
+
+def test_verify_token_without_database_round_trip():
+    auth, db = _auth_service()
+    result = auth.login("alice", "Passw0rd!")
+    assert result['success']
+    token = result['token']
+
+    queries = []
+    listener = lambda conn, cursor, statement, *args: queries.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    for _ in range(10):
+        assert auth.verify_token(token)['username'] == "alice"
+    event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert queries == []
+    print("令牌校验命中身份缓存，不查询数据库")
+
+
+def test_password_change_and_deactivation_revoke_tokens():
+    auth, db = _auth_service()
+    old_token = auth.login("alice", "Passw0rd!")['token']
+    assert auth.verify_token(old_token)
+
+    assert auth.user_system.change_password("alice", "Passw0rd!", "N3wPassw0rd!")[0]
+    assert auth.verify_token(old_token) is None
+    assert auth.refresh_token(old_token) is None
+    new_token = auth.issue_token_for_username("alice")['token']
+    assert auth.verify_token(new_token)
+
+    db.query(User).filter(User.user_id == 1).update({"is_active": False})
+    db.commit()
+    auth.user_system.identity_cache.invalidate(user_id=1)
+    assert auth.verify_token(new_token) is None
+    auth.user_system.rate_limiter.reset("login_alice")
+
+
+def test_repository_update_and_delete_invalidate_identity():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add(User(user_id=1, username="alice", pass_word="x", salt="s", phone="13800000001",
+                email="alice@example.com", user_role="normal", is_active=True, is_verified=True))
+    db.commit()
+    repo = UserRepository(db)
+    load = lambda: repo.get_identity(user_id=1)
+
+    assert identity_cache.get_by_id(1, load).user_role == "normal"
+    repo.update(repo.get_by_id(1), {"user_role": "admin"})
+    assert identity_cache.get_by_id(1, load).user_role == "admin"
+
+    assert repo.delete(1)
+    assert identity_cache.get_by_id(1, load) is None
+    assert identity_cache.get("alice", lambda: repo.get_identity(username="alice")) is None
+    print("用户更新、删除后身份缓存失效")
+
+
+if __name__ == "__main__":
+    test_identity_cache_keys_and_invalidation()
+    test_load_racing_with_invalidation_is_not_cached()
+    test_stale_load_is_not_shared_after_another_worker_invalidates()
+    test_verify_token_without_database_round_trip()
+    test_password_change_and_deactivation_revoke_tokens()
+    test_repository_update_and_delete_invalidate_identity()
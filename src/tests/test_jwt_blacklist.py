@@ -0,0 +1,36 @@
+import time
+
+import pytest
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+from api_service.utils.jwt_balcklist import JWTBlacklist
+from api_service.utils.redis_client import redis_client
+
+
+def test_blacklist_info_counts_without_scanning_index():
+    print("===== JWT黑名单统计测试 =====")
+    fakeredis = pytest.importorskip("fakeredis")
+    connection, redis_client.connection = redis_client.connection, fakeredis.FakeRedis(decode_responses=True)
+    try:
+        blacklist = JWTBlacklist()
+        now = time.time()
+        mapping = {f"expired{i}": now - 100 - i for i in range(50)}
+        mapping.update({f"valid{i}": now + 60 * (i + 1) for i in range(1000)})
+        redis_client.zadd(blacklist.index_key, mapping)
+
+        info = blacklist.get_blacklist_info(ttl_samples=100)
+        assert info['total_tokens'] == 1050
+        assert info['valid_tokens'] == 1000
+        assert info['expired_tokens'] == 50
+        # 剩余时间均匀分布在 1~1000 分钟，等距抽样的平均值接近 500 分钟
+        assert 480 < info['avg_ttl_minutes'] < 520
+        print(f"黑名单统计: {info}")
+    finally:
+        redis_client.connection = connection
+
+
+if __name__ == "__main__":
+    test_blacklist_info_counts_without_scanning_index()
@@ -0,0 +1,114 @@
+import json
+import time
+
+import pytest
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+from api_service.utils.local_cache import CacheInvalidationListener, LocalLRUCache
+from api_service.utils.redis_client import redis_client
+from src.Data_base.repositories.category_tree import CategoryTreeCache
+
+
+def test_load_racing_invalidation_is_not_stored():
+    print("===== 一级缓存测试 =====")
+    cache = LocalLRUCache()
+    generation = cache.generation  # 开始回源
+    cache.delete("product:1")  # 回源期间数据被修改并失效
+    cache.set("product:1", "old", 60, generation=generation)
+    assert cache.get("product:1") is None
+
+    cache.set("product:1", "new", 60, generation=cache.generation)
+    assert cache.get("product:1") == "new"
+    print("回源期间发生失效时不写入旧值")
+
+
+def test_eviction_by_entries_and_bytes():
+    cache = LocalLRUCache(max_entries=2, max_bytes=100)
+    cache.set("a", "x" * 10, 60)
+    cache.set("b", "x" * 10, 60)
+    cache.get("a")
+    cache.set("c", "x" * 10, 60)
+    assert cache.get("b") is None  # 条目数超限，淘汰最久未使用的条目
+    assert cache.get("a") and cache.get("c")
+
+    cache = LocalLRUCache(max_entries=100, max_bytes=100)
+    cache.set("a", "x" * 40, 60)
+    cache.set("b", "x" * 40, 60)
+    cache.get("a")
+    cache.set("c", "x" * 40, 60)  # 字节数超限，淘汰最久未使用的条目
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+    assert cache.stats()['bytes'] == 80
+    cache.set("huge", "x" * 101, 60)  # 超过总容量的条目不缓存
+    assert cache.get("huge") is None and cache.stats()['size'] == 2
+
+    cache.set("short", "v", 0.05)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    print(f"淘汰后统计: {cache.stats()}")
+
+
+def test_invalidation_message_clears_local_entry():
+    fakeredis = pytest.importorskip("fakeredis")
+    connection, redis_client.connection = redis_client.connection, fakeredis.FakeRedis(decode_responses=True)
+    try:
+        cache = LocalLRUCache()
+        listener = CacheInvalidationListener(cache, channel="test:cache:invalidation")
+        listener.ensure_started()
+        deadline = time.time() + 5
+        while not listener.ready and time.time() < deadline:
+            time.sleep(0.01)
+        assert listener.ready
+
+        cache.set("product:1", "cached", 60)
+        cache.set("product:2", "cached", 60)
+        # 其他进程发布的失效消息
+        redis_client.connection.publish(listener.channel, json.dumps(["product:1"]))
+        deadline = time.time() + 5
+        while cache.get("product:1") is not None and time.time() < deadline:
+            time.sleep(0.01)
+        assert cache.get("product:1") is None
+        assert cache.get("product:2") == "cached"
+        print("收到失效消息后删除本地条目")
+    finally:
+        redis_client.connection = connection
+
+
+def test_category_tree_invalidation_reaches_other_processes():
+    fakeredis = pytest.importorskip("fakeredis")
+    connection, redis_client.connection = redis_client.connection, fakeredis.FakeRedis(decode_responses=True)
+    try:
+        # 两个 worker 各自的分类树缓存和失效订阅
+        trees, listeners = [], []
+        for _ in range(2):
+            listener = CacheInvalidationListener(LocalLRUCache(), channel="test:category:invalidation")
+            tree = CategoryTreeCache(ttl=300)
+            tree.use_invalidation_channel(listener)
+            listener.ensure_started()
+            trees.append(tree)
+            listeners.append(listener)
+        deadline = time.time() + 5
+        while not all(listener.ready for listener in listeners) and time.time() < deadline:
+            time.sleep(0.01)
+        assert all(listener.ready for listener in listeners)
+
+        for tree in trees:
+            assert tree.get(lambda: ["旧分类"]) == ["旧分类"]
+        trees[0].invalidate()  # worker 0 写入分类
+        assert trees[0].get(lambda: ["新分类"]) == ["新分类"]
+        deadline = time.time() + 5
+        while trees[1].get(lambda: ["新分类"]) != ["新分类"] and time.time() < deadline:
+            time.sleep(0.01)
+        assert trees[1].get(lambda: ["新分类"]) == ["新分类"]
+        print("分类树失效广播到其他 worker")
+    finally:
+        redis_client.connection = connection
+
+
+if __name__ == "__main__":
+    test_load_racing_invalidation_is_not_stored()
+    test_eviction_by_entries_and_bytes()
+    test_invalidation_message_clears_local_entry()
+    test_category_tree_invalidation_reaches_other_processes()
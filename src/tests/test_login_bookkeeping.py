@@ -0,0 +1,125 @@
+import threading
+
+from sqlalchemy import BigInteger, create_engine, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.Data_base.database import Base
+from src.Data_base.models.user import User, UserActivity
+from src.Data_base.repositories.login_bookkeeping import LoginBookkeeper
+from src.Data_base.repositories.user_repository import UserRepository
+from src.registration import UserSystem
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+def _session(users=3):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    for user_id in range(1, users + 1):
+        db.add(User(user_id=user_id, username=f"user{user_id}", pass_word="x", failed_attempts=0,
+                    login_count=0, email=f"user{user_id}@example.com"))
+    db.commit()
+    return db
+
+
+def _users(db):
+    db.expire_all()
+    return {user.user_id: user for user in db.query(User)}
+
+
+def test_logins_are_coalesced_into_one_update():
+    print("===== 登录记账批量写回测试 =====")
+    db = _session()
+    bookkeeper = LoginBookkeeper()
+    for _ in range(3):
+        bookkeeper.record_success(1)
+    bookkeeper.record_success(2)
+    bookkeeper.record_failure(_users(db)[3])
+    assert _users(db)[1].login_count == 0  # 写回前数据库不变
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    assert bookkeeper.flush(db) == 3
+    event.remove(db.get_bind(), "before_cursor_execute", listener)
+    # 三个用户一条 UPDATE，外加一条活跃度计数写入
+    assert statements == ["UPDATE", "INSERT"]
+    users = _users(db)
+    assert (users[1].login_count, users[2].login_count, users[3].login_count) == (3, 1, 0)
+    assert users[1].last_login is not None and users[3].last_login is None
+    assert users[3].failed_attempts == 1
+    assert {row.user_id for row in db.query(UserActivity)} == {1, 2}
+    assert bookkeeper.flush(db) == 0
+    print("同一用户的多次登录合并为一次写回")
+
+
+def test_lockout_is_immediate_and_persisted():
+    db = _session()
+    bookkeeper = LoginBookkeeper()
+    user = _users(db)[1]
+    results = [bookkeeper.record_failure(user) for _ in range(5)]
+    assert [attempts for attempts, _ in results] == [1, 2, 3, 4, 5]
+    assert results[-1][1] is not None
+    # 锁定立即生效，不依赖写回
+    assert bookkeeper.is_locked(user)
+    assert bookkeeper.record_failure(user) == (5, None)
+
+    bookkeeper.flush(db)
+    user = _users(db)[1]
+    assert user.failed_attempts == 5 and user.account_locked_until is not None
+    assert LoginBookkeeper().is_locked(user)  # 其他进程从数据库也能看到锁定
+
+    bookkeeper.reset(1)
+    user.account_locked_until = None
+    db.commit()
+    assert not bookkeeper.is_locked(user)
+    assert bookkeeper.record_failure(user)[0] == 1
+
+
+def test_concurrent_failures_never_exceed_limit():
+    db = _session()
+    bookkeeper = LoginBookkeeper()
+    user = _users(db)[1]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(bookkeeper.record_failure(user))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 只有一次失败触发锁定，其余并发请求看到的都是已锁定
+    assert sum(1 for _, locked_until in results if locked_until) == 1
+    assert sorted(attempts for attempts, _ in results)[:5] == [1, 2, 3, 4, 5]
+
+
+def test_user_system_login_uses_bookkeeper():
+    db = _session(users=0)
+    system = UserSystem(UserRepository(db))
+    pwd_hash, salt = system.hash_password("Passw0rd!")
+    db.add(User(user_id=1, username="alice", pass_word=pwd_hash, salt=salt, failed_attempts=0,
+                login_count=0, email="alice@example.com"))
+    db.commit()
+    bookkeeper = LoginBookkeeper()
+    bookkeeper._flusher = threading.current_thread()  # 视为已启动写回线程
+    system.login_bookkeeper = bookkeeper
+    system.rate_limiter.reset("login_alice")
+
+    assert system.login("alice", "wrong") == (False, "密码错误，剩余4次尝试")
+    assert system.login("alice", "Passw0rd!") == (True, "登录成功")
+    assert _users(db)[1].login_count == 0
+    bookkeeper.flush(db)
+    user = _users(db)[1]
+    assert (user.login_count, user.failed_attempts) == (1, 0)
+    system.rate_limiter.reset("login_alice")
+
+
+if __name__ == "__main__":
+    test_logins_are_coalesced_into_one_update()
+    test_lockout_is_immediate_and_persisted()
+    test_concurrent_failures_never_exceed_limit()
+    test_user_system_login_uses_bookkeeper()
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from src.Data_base.database import Base as ModelBase
+from src.Data_base.models.order import OrderStatus
+from src.Data_base.repositories.order_repository import OrderRepository
+from src.Data_base.repositories.pagination import (
+    InvalidCursor,
+    apply_keyset,
+    decode_keyset_cursor,
+    decode_offset_cursor,
+    encode_keyset_cursor,
+    encode_offset_cursor,
+    next_keyset_cursor,
+)
+from src.Data_base.repositories.product_repository import ProductRepository
+from src.Data_base.repositories.user_repository import UserRepository
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+    row_id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime)
+
+
+def test_cursor_round_trip():
+    print("===== 游标分页测试 =====")
+    created_at = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    assert decode_keyset_cursor(encode_keyset_cursor(created_at, 42)) == (created_at, 42)
+    assert decode_offset_cursor(encode_offset_cursor(100)) == 100
+
+    for bad in ("garbage!!", encode_offset_cursor(5), "bnVsbA"):
+        try:
+            decode_keyset_cursor(bad)
+        except InvalidCursor:
+            continue
+        raise AssertionError(f"游标应被拒绝: {bad}")
+
+
+def test_keyset_pages_cover_all_rows():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        # 同一时间戳的多行依靠 id 区分先后
+        for i in range(1, 8):
+            db.add(Row(row_id=i, created_at=datetime(2024, 1, 1 + i // 3)))
+        db.commit()
+
+        seen, cursor = [], None
+        while True:
+            query = apply_keyset(db.query(Row), Row.created_at, Row.row_id, cursor)
+            page = query.limit(3).all()
+            seen.extend(row.row_id for row in page)
+            cursor = next_keyset_cursor(page, 3, "row_id")
+            if cursor is None:
+                break
+
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+    print(f"逐页读取结果: {seen}")
+
+
+def test_repositories_raise_invalid_cursor():
+    engine = create_engine("sqlite:///:memory:")
+    ModelBase.metadata.create_all(engine)
+    with Session(engine) as db:
+        getters = (
+            lambda cursor: OrderRepository(db).get_user_orders(1, cursor=cursor),
+            lambda cursor: UserRepository(db).search_users("a", cursor=cursor),
+            lambda cursor: UserRepository(db).get_all(cursor=cursor),
+            lambda cursor: OrderRepository(db).get_orders_by_status(OrderStatus.PENDING, cursor=cursor),
+            lambda cursor: ProductRepository(db).get_products_by_category(1, cursor=cursor),
+        )
+        for getter in getters:
+            assert getter(None) == []
+            try:
+                getter("garbage!!")
+            except InvalidCursor:
+                continue
+            raise AssertionError("无效游标应抛出 InvalidCursor 而不是返回空列表")
+    print("无效游标由仓储层抛出")
+
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    test_keyset_pages_cover_all_rows()
+    test_repositories_raise_invalid_cursor()
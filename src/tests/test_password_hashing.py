@@ -0,0 +1,39 @@
+from src.utils.password_hashing import (
+    LEGACY, PBKDF2_SM3, encode_password_record, parse_password_record, tag_legacy_record
+)
+
+
+def test_password_record_roundtrip():
+    print("===== 带版本密码记录测试 =====")
+    hash_hex = "ab" * 32
+    stored = encode_password_record(PBKDF2_SM3, 2500, hash_hex)
+    assert stored == f"pbkdf2-sm3$2500${hash_hex}"
+
+    record = parse_password_record(stored)
+    assert record.algorithm == PBKDF2_SM3
+    assert record.iterations == 2500
+    assert record.hash_hex == hash_hex
+    assert record.is_versioned
+    print("编码/解析结果一致")
+
+
+def test_legacy_records_are_recognised():
+    print("===== 旧格式密码记录测试 =====")
+    hash_hex = "cd" * 32
+    record = parse_password_record(hash_hex)
+    assert record.algorithm == LEGACY and record.iterations is None
+    assert not record.is_versioned
+
+    tagged = tag_legacy_record(hash_hex)
+    assert tagged == f"legacy${hash_hex}"
+    assert parse_password_record(tagged).hash_hex == hash_hex
+    assert tag_legacy_record(tagged) == tagged
+
+    versioned = encode_password_record(PBKDF2_SM3, 2500, hash_hex)
+    assert tag_legacy_record(versioned) == versioned
+    print("旧记录识别与标记正确")
+
+
+if __name__ == "__main__":
+    test_password_record_roundtrip()
+    test_legacy_records_are_recognised()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import exc, text
+
+from src.Data_base.database import create_db_engine, pool_status
+from src.Data_base.pool_metrics import WAIT_BUCKETS_MS
+
+
+def _engine(path, **overrides):
+    options = dict(pool_size=1, max_overflow=0, pool_timeout=0.2, pool_pre_ping=False, echo=False)
+    options.update(overrides)
+    return create_db_engine(f"sqlite:///{path}", **options)
+
+
+def test_pool_metrics_record_checkouts():
+    print("===== 连接池指标测试 =====")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(os.path.join(tmp, "pool.db"))
+        for _ in range(5):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        status = pool_status(engine)
+        assert status["checkouts"] == 5 and status["timeouts"] == 0
+        assert status["checked_out"] == 0 and status["pool_size"] == 1
+        assert sum(status["wait_histogram"].values()) == 5
+        assert len(status["wait_histogram"]) == len(WAIT_BUCKETS_MS) + 1
+        print(f"连接池状态: {status}")
+        engine.dispose()
+
+
+def test_pool_exhaustion_is_counted_and_survives_dispose():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(os.path.join(tmp, "pool.db"))
+        held = engine.connect()
+        assert pool_status(engine)["checked_out"] == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        held.close()
+
+        status = pool_status(engine)
+        assert status["timeouts"] == 1 and status["exhausted"] == 1
+        assert status["max_wait_ms"] >= 150  # 等满了 pool_timeout
+
+        engine.dispose()  # 换成新的连接池，累计统计保留
+        with engine.connect():
+            assert pool_status(engine)["checked_out"] == 1
+        assert pool_status(engine)["checkouts"] == 2
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_pool_metrics_record_checkouts()
+    test_pool_exhaustion_is_counted_and_survives_dispose()
@@ -0,0 +1,60 @@
+from sqlalchemy import BigInteger, create_engine, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.Data_base.database import Base
+from src.Data_base.query_plans import check_query_plans, ensure_indexes, find_full_scans, missing_indexes
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+def _engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def test_catalog_queries_use_indexes():
+    print("===== 商品目录查询计划测试 =====")
+    engine = _engine()
+    with Session(engine) as db:
+        assert check_query_plans(db) == []
+
+
+def test_full_scan_detected_and_index_rebuilt():
+    engine = _engine()
+    with engine.begin() as conn:
+        for name in ("ix_products_listing", "ix_products_category_listing", "ix_products_price",
+                     "ix_products_featured", "ix_products_updated_at"):
+            conn.execute(text(f"DROP INDEX {name}"))
+
+    with Session(engine) as db:
+        shapes = {problem.shape for problem in check_query_plans(db)}
+    assert {"商品列表", "推荐商品", "检索索引增量同步"} <= shapes
+    print(f"缺少索引时发现全表扫描: {sorted(shapes)}")
+
+    assert len(missing_indexes(engine)) == 5
+    assert len(ensure_indexes(engine)) == 5
+    assert missing_indexes(engine) == []
+    with Session(engine) as db:
+        assert check_query_plans(db) == []
+
+
+def test_find_full_scans_mysql_plan():
+    plan = [
+        {"table": "products", "type": "ref", "key": "ix_products_listing", "rows": 120},
+        {"table": "categories_1", "type": "eq_ref", "key": "PRIMARY", "rows": 1},
+    ]
+    assert find_full_scans("mysql", plan, ("products",)) == []
+    plan[0].update(type="ALL", key=None)
+    assert len(find_full_scans("mysql", plan, ("products",))) == 1
+
+
+if __name__ == "__main__":
+    test_catalog_queries_use_indexes()
+    test_full_scan_detected_and_index_rebuilt()
+    test_find_full_scans_mysql_plan()
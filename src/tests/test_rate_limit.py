@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from src.utils.rate_limit import LocalRateLimitBackend, RateLimiter, RedisRateLimitBackend
+
+
+def test_gcra_allows_burst_then_limits():
+    print("===== GCRA 限流测试 =====")
+    limiter = RateLimiter(LocalRateLimitBackend())
+    results = [limiter.hit("login_alice", 5, 60) for _ in range(6)]
+    assert [r.allowed for r in results] == [True] * 5 + [False]
+    assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+    assert 0 < results[-1].retry_after <= 12
+    print(f"第6次被拒绝，需等待 {results[-1].retry_after:.1f} 秒")
+
+    # peek 不消耗配额
+    assert not limiter.peek("login_alice", 5, 60).allowed
+    assert limiter.peek("login_bob", 5, 60).allowed
+    assert limiter.peek("login_bob", 5, 60).remaining == 4
+
+    limiter.reset("login_alice")
+    assert limiter.hit("login_alice", 5, 60).allowed
+
+
+def test_idle_keys_are_evicted():
+    backend = LocalRateLimitBackend(sweep_interval=0)
+    limiter = RateLimiter(backend)
+    for i in range(100):
+        limiter.hit(f"ip:{i}", 100, 0.01)
+    time.sleep(0.02)
+    limiter.hit("ip:new", 100, 60)
+    assert backend.size() == 1
+    print("空闲键已清理")
+
+
+def test_failure_lockout_lasts_full_lock_time():
+    limiter = RateLimiter(LocalRateLimitBackend())
+    results = [limiter.record_failure("login_failed:alice", 5, 900, 900) for _ in range(5)]
+    assert [r.remaining for r in results] == [4, 3, 2, 1, 0]
+    assert not results[-1].allowed
+    # 锁定期按整段锁定时间计算，不会像 GCRA 那样 180 秒后恢复一次
+    assert 899 < limiter.locked_for("login_failed:alice") <= 900
+    assert not limiter.record_failure("login_failed:alice", 5, 900, 900).allowed
+
+    limiter.reset("login_failed:alice")
+    assert limiter.locked_for("login_failed:alice") == 0
+    assert limiter.record_failure("login_failed:alice", 5, 900, 900).remaining == 4
+    print("失败 5 次后锁定完整的 15 分钟")
+
+
+def test_fixed_window_blocks_until_window_ends():
+    limiter = RateLimiter(LocalRateLimitBackend())
+    results = [limiter.hit_window("reg_13800000000", 3, 0.2) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert 0 < results[-1].retry_after <= 0.2
+    time.sleep(0.1)
+    assert not limiter.hit_window("reg_13800000000", 3, 0.2).allowed  # 窗口内不恢复配额
+    time.sleep(0.15)
+    assert limiter.hit_window("reg_13800000000", 3, 0.2).allowed
+    print("固定窗口内超出次数后一直拒绝，窗口结束后恢复")
+
+
+def test_redis_backend_lockout():
+    fakeredis = pytest.importorskip("fakeredis")
+    limiter = RateLimiter(RedisRateLimitBackend(fakeredis.FakeRedis(decode_responses=True)))
+    for _ in range(4):
+        assert limiter.record_failure("login_failed:bob", 5, 900, 900).allowed
+    assert not limiter.record_failure("login_failed:bob", 5, 900, 900).allowed
+    assert 899 < limiter.locked_for("login_failed:bob") <= 900
+    assert [limiter.hit_window("reg_1", 3, 3600).allowed for _ in range(4)] == [True, True, True, False]
+    limiter.reset("login_failed:bob")
+    assert limiter.locked_for("login_failed:bob") == 0
+
+
+if __name__ == "__main__":
+    test_gcra_allows_burst_then_limits()
+    test_idle_keys_are_evicted()
+    test_failure_lockout_lasts_full_lock_time()
+    test_fixed_window_blocks_until_window_ends()
+    test_redis_backend_lockout()
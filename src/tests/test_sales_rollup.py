@@ -0,0 +1,112 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.Data_base.database import Base
+from src.Data_base.models.order import Order, OrderStatus, SalesRollup
+from src.Data_base.models.user import User
+from src.Data_base.repositories.order_repository import OrderRepository
+from src.Data_base.repositories.sales_rollup import SalesRollupRepository
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+BASE = datetime(2024, 3, 1, 10, 0, 0)
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add(User(user_id=1, username="buyer", pass_word="x", email="buyer@example.com", phone="13800000000"))
+    # 10:05 ~ 次日 09:05 每小时一单，金额 1..24
+    for i in range(24):
+        db.add(Order(order_id=i + 1, order_number=f"S{i}", user_id=1, subtotal_amount=i + 1,
+                     total_amount=i + 1, created_at=BASE + timedelta(hours=i, minutes=5)))
+    db.commit()
+    return db
+
+
+def _brute_force(db, start, end):
+    orders = [o for o in db.query(Order).all()
+              if o.order_status in (OrderStatus.CONFIRMED, OrderStatus.DELIVERED) and start <= o.created_at <= end]
+    return len(orders), float(sum(Decimal(str(o.total_amount)) for o in orders))
+
+
+def test_incremental_rollup_matches_orders():
+    print("===== 销售统计小时桶测试 =====")
+    db = _session()
+    repo = OrderRepository(db)
+    for order_id in range(1, 25):
+        assert repo.update_order_status(order_id, OrderStatus.CONFIRMED)
+    repo.update_order_status(3, OrderStatus.DELIVERED)  # 仍计入统计
+    repo.update_order_status(5, OrderStatus.CANCELLED)  # 移出统计
+    repo.update_order_status(6, OrderStatus.SHIPPED)
+
+    assert db.query(SalesRollup).count() == 24
+    ranges = [
+        (BASE, BASE + timedelta(days=1)),
+        (BASE + timedelta(minutes=30), BASE + timedelta(hours=7, minutes=5)),  # 首尾都不足一小时
+        (BASE + timedelta(minutes=1), BASE + timedelta(minutes=10)),  # 在同一小时内
+        (BASE - timedelta(days=30), BASE + timedelta(days=30)),
+    ]
+    for start, end in ranges:
+        stats = repo.get_sales_statistics(start, end)
+        assert (stats['order_count'], stats['total_sales']) == _brute_force(db, start, end), (start, end)
+    print("任意区间的统计与直接汇总订单一致")
+
+
+def test_concurrent_repeated_transition_counted_once():
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(user_id=1, username="buyer", pass_word="x", email="buyer@example.com", phone="13800000000"))
+        db.add(Order(order_id=1, order_number="R1", user_id=1, subtotal_amount=50, total_amount=50, created_at=BASE))
+        db.commit()
+
+    first, retry = Session(engine), Session(engine)
+    # 重试的回调先读到 PENDING，之后第一个回调完成了状态变更
+    stale = retry.get(Order, 1)
+    assert stale.order_status == OrderStatus.PENDING
+    assert OrderRepository(first).update_order_status(1, OrderStatus.CONFIRMED)
+    assert OrderRepository(retry).update_order_status(1, OrderStatus.CONFIRMED)  # 已是目标状态，视为成功
+
+    stats = OrderRepository(first).get_sales_statistics(BASE - timedelta(hours=1), BASE + timedelta(hours=1))
+    assert (stats['order_count'], stats['total_sales']) == (1, 50.0)
+    first.close()
+    retry.close()
+    engine.dispose()
+    print("重复的状态变更只计入一次")
+
+
+def test_rebuild_from_orders():
+    db = _session()
+    for order in db.query(Order).filter(Order.order_id <= 12):
+        order.order_status = OrderStatus.CONFIRMED  # 绕过仓储直接改状态，小时桶未更新
+    db.commit()
+    rollup = SalesRollupRepository(db)
+    assert rollup.get_sales_statistics(BASE, BASE + timedelta(days=1))['order_count'] == 0
+
+    assert rollup.rebuild() == 12
+    stats = rollup.get_sales_statistics(BASE, BASE + timedelta(days=1))
+    assert (stats['order_count'], stats['total_sales']) == (12, 78.0)
+
+    # 只重算一段时间不影响其他桶
+    assert rollup.rebuild(BASE, BASE + timedelta(hours=2)) == 2
+    assert rollup.get_sales_statistics(BASE, BASE + timedelta(days=1))['order_count'] == 12
+
+
+if __name__ == "__main__":
+    test_incremental_rollup_matches_orders()
+    test_concurrent_repeated_transition_counted_once()
+    test_rebuild_from_orders()
@@ -0,0 +1,82 @@
+import os
+
+from src.utils.sm3 import BACKENDS, PurePythonSM3, new_sm3
+from src.utils.security import HmacSM3Key, hmac_sm3, pbkdf2_sm3, sm3_digest, sm3_hexdigest
+
+# GB/T 32905-2016 附录A 示例
+VECTORS = [
+    (b"abc", "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"),
+    (b"abcd" * 16, "debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732"),
+]
+
+
+def test_sm3_backends_match_vectors():
+    print("===== SM3 各后端标准向量测试 =====")
+    for name, factory in BACKENDS.items():
+        for message, expected in VECTORS:
+            assert factory(message).hexdigest() == expected, name
+        print(f"后端 {name} 通过")
+    assert sm3_hexdigest(b"abc") == VECTORS[0][1]
+    assert sm3_digest(b"abc") == bytes.fromhex(VECTORS[0][1])
+
+
+def test_sm3_incremental_update_and_copy():
+    print("===== SM3 增量接口测试 =====")
+    for size in (0, 1, 55, 56, 63, 64, 65, 127, 128, 1000):
+        data = os.urandom(size)
+        expected = new_sm3(data).digest()
+        h = PurePythonSM3()
+        for i in range(0, size, 7):
+            h.update(memoryview(data)[i:i + 7])
+        snapshot = h.copy()
+        h.update(b"tail")
+        assert snapshot.digest() == expected
+        assert h.digest() == new_sm3(data + b"tail").digest()
+    print("增量计算与一次性计算结果一致")
+
+
+def test_hmac_sm3_key_matches_rfc2104():
+    print("===== HMAC-SM3 预计算密钥测试 =====")
+    for key_len in (0, 16, 64, 65, 100):
+        key = os.urandom(key_len)
+        message = os.urandom(90)
+        block_key = sm3_digest(key) if key_len > 64 else key
+        block_key = block_key.ljust(64, b"\x00")
+        o_key_pad = bytes(b ^ 0x5C for b in block_key)
+        i_key_pad = bytes(b ^ 0x36 for b in block_key)
+        expected = sm3_digest(o_key_pad + sm3_digest(i_key_pad + message))
+
+        signer = HmacSM3Key(key)
+        assert hmac_sm3(key, message) == expected
+        assert signer.sign(message) == expected
+        assert signer.sign(message) == expected  # 状态复用不影响后续签名
+        assert signer.verify(message, expected)
+        assert not signer.verify(message + b"x", expected)
+    print("HMAC-SM3 与 RFC 2104 构造一致")
+
+
+def test_pbkdf2_sm3_matches_reference():
+    print("===== PBKDF2-SM3 测试 =====")
+
+    def reference(password, salt, iterations, dklen):
+        derived = b""
+        for index in range(1, (dklen + 31) // 32 + 1):
+            u = hmac_sm3(password, salt + index.to_bytes(4, "big"))
+            t = bytearray(u)
+            for _ in range(iterations - 1):
+                u = hmac_sm3(password, u)
+                t = bytearray(x ^ y for x, y in zip(t, u))
+            derived += bytes(t)
+        return derived[:dklen]
+
+    for iterations, dklen in ((1, 32), (5, 32), (3, 70)):
+        assert pbkdf2_sm3(b"Passw0rd!", b"salt", iterations, dklen) == \
+            reference(b"Passw0rd!", b"salt", iterations, dklen)
+    print("PBKDF2-SM3 结果与逐轮参考实现一致")
+
+
+if __name__ == "__main__":
+    test_sm3_backends_match_vectors()
+    test_sm3_incremental_update_and_copy()
+    test_hmac_sm3_key_matches_rfc2104()
+    test_pbkdf2_sm3_matches_reference()
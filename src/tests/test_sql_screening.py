@@ -0,0 +1,40 @@
+import re
+
+from src.utils.security import SQLInjectionValidator, SQLScreeningEngine
+
+
+def _legacy_detect(patterns, value):
+    return bool(re.search("|".join(patterns), value, re.IGNORECASE))
+
+
+def test_engine_matches_legacy_detection():
+    print("===== SQL注入筛查引擎测试 =====")
+    patterns = SQLInjectionValidator.SQL_INJECTION_PATTERNS
+    engine = SQLScreeningEngine(patterns)
+    samples = [
+        "alice", "13800138000", "张三", "北京市海淀区", "12345",
+        "' OR '1'='1", "1; DROP TABLE users", "admin'--", "1 UNION SELECT *",
+        "ſelect 1", "K", "/* x */", "a@example.com",
+    ]
+    for value in samples:
+        assert engine.matches(value) == _legacy_detect(patterns, value), value
+    assert SQLInjectionValidator.contains_sql_injection("1 UNION SELECT password FROM users")
+    assert not SQLInjectionValidator.contains_sql_injection("华为手机")
+
+
+def test_engine_scan_limits():
+    engine = SQLScreeningEngine([r"\bDROP\b"], max_depth=5, max_nodes=50)
+    assert engine.scan({"items": [{"name": "手机", "qty": 2}]}) is SQLScreeningEngine.CLEAN
+    assert engine.scan({"items": [{"note": "x; drop table"}]}) == SQLScreeningEngine.INJECTION
+
+    deep = "ok"
+    for _ in range(10):
+        deep = [deep]
+    assert engine.scan(deep) == SQLScreeningEngine.LIMIT_EXCEEDED
+    assert engine.scan(list(range(100))) == SQLScreeningEngine.LIMIT_EXCEEDED
+    print("深度和节点数限制生效")
+
+
+if __name__ == "__main__":
+    test_engine_matches_legacy_detection()
+    test_engine_scan_limits()
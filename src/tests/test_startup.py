@@ -0,0 +1,23 @@
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+
+from api_service.api.startup import should_configure
+
+
+def test_background_services_only_start_in_serving_processes():
+    print("===== 启动初始化测试 =====")
+    assert should_configure(['/usr/bin/gunicorn', 'service.wsgi'], {})
+    assert should_configure(['manage.py', 'runserver', '--noreload'], {})
+    assert should_configure(['manage.py', 'runserver'], {'RUN_MAIN': 'true'})
+    # 自动重载的父进程只监视文件，不启动后台线程
+    assert not should_configure(['manage.py', 'runserver'], {})
+    # 管理命令不启动后台线程
+    assert not should_configure(['manage.py', 'migrate'], {'RUN_MAIN': 'true'})
+    assert not should_configure(['/usr/bin/django-admin', 'flash_sale_stock', '--reconcile'], {})
+    print("只在处理请求的进程中启动后台线程")
+
+
+if __name__ == "__main__":
+    test_background_services_only_start_in_serving_processes()
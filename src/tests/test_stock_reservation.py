@@ -0,0 +1,267 @@
+import pytest
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.Data_base.database import Base
+from src.Data_base.models.order import Order
+from src.Data_base.models.product import Category, Product
+from src.Data_base.models.user import User
+from src.Data_base.repositories import order_repository
+from src.Data_base.repositories.order_repository import OrderRepository
+from src.Data_base.repositories.product_repository import ProductRepository
+from src.Data_base.repositories.stock_reservation import (
+    FlashSaleStock, merge_quantities, release_stock, reserve_stock
+)
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add(Category(category_id=1, category_name="手机"))
+    db.add_all([
+        Product(product_id=1, sku="P1", product_name="商品1", sale_price=10, stock_quantity=5, category_id=1),
+        Product(product_id=2, sku="P2", product_name="商品2", sale_price=10, stock_quantity=1, category_id=1),
+        Product(product_id=3, sku="P3", product_name="虚拟商品", sale_price=10, stock_quantity=0,
+                category_id=1, track_inventory=False),
+    ])
+    db.commit()
+    return db
+
+
+def _stock(db):
+    db.expire_all()
+    return {p.product_id: p.stock_quantity for p in db.query(Product).order_by(Product.product_id)}
+
+
+def test_batch_reserve_is_all_or_nothing():
+    print("===== 库存预占测试 =====")
+    db = _session()
+    assert merge_quantities([{"product_id": 1, "quantity": 2}, {"product_id": 1, "quantity": 1}]) == {1: 3}
+
+    assert reserve_stock(db, {1: 3, 2: 1, 3: 9})
+    db.commit()
+    assert _stock(db) == {1: 2, 2: 0, 3: 0}
+
+    # 商品2库存不足，商品1也不应被扣减
+    assert not reserve_stock(db, {1: 1, 2: 1})
+    db.rollback()
+    assert _stock(db) == {1: 2, 2: 0, 3: 0}
+
+    # 不存在的商品
+    assert not reserve_stock(db, {1: 1, 404: 1})
+    db.rollback()
+
+    release_stock(db, {1: 3, 2: 1, 3: 9})
+    db.commit()
+    assert _stock(db) == {1: 5, 2: 1, 3: 0}
+    print("多商品预占全部成功或全部不扣")
+
+
+def test_null_track_inventory_is_tracked_by_every_path():
+    db = _session()
+    db.add(Product(product_id=4, sku="P4", product_name="旧商品", sale_price=10, stock_quantity=3, category_id=1))
+    db.commit()
+    db.query(Product).filter(Product.product_id == 4).update({"track_inventory": None})
+    db.commit()
+
+    assert reserve_stock(db, {4: 1})
+    db.commit()
+    assert ProductRepository(db).update_stock(4, -1)
+    assert _stock(db)[4] == 1
+    assert not ProductRepository(db).update_stock(4, -2)
+    assert 4 in [product.product_id for product in ProductRepository(db).get_low_stock_products()]
+    print("track_inventory 为空的商品在各扣减路径中都按跟踪库存处理")
+
+
+def test_order_creation_reserves_stock():
+    db = _session()
+    db.add(User(user_id=1, username="buyer", pass_word="x", email="buyer@example.com", phone="13800000000"))
+    db.commit()
+    repo = OrderRepository(db)
+
+    def order(number, quantity):
+        return repo.create_order_with_items(
+            {"order_number": number, "user_id": 1, "subtotal_amount": 10, "total_amount": 10},
+            [{"product_id": 2, "quantity": quantity, "unit_price": 10, "total_price": 10 * quantity}],
+        )
+
+    assert order("A1", 1) is not None
+    assert order("A2", 1) is None
+    assert _stock(db)[2] == 0
+    assert db.query(Order).count() == 1
+
+
+def test_place_orders_in_bulk():
+    db = _session()
+    db.add(User(user_id=1, username="buyer", pass_word="x", email="buyer@example.com", phone="13800000000"))
+    db.commit()
+    repo = OrderRepository(db)
+
+    results = repo.place_orders([
+        {"order_number": "B1", "user_id": 1, "shipping_amount": 5,
+         "items": [{"product_id": 1, "quantity": 2}, {"product_id": 3, "quantity": 1}]},
+        {"order_number": "B2", "user_id": 1, "items": [{"product_id": 2, "quantity": 1}]},
+        {"order_number": "B3", "user_id": 1, "items": [{"product_id": 2, "quantity": 1}]},  # 库存已被B2用完
+        {"order_number": "B1", "user_id": 1, "items": [{"product_id": 1, "quantity": 1}]},
+        {"order_number": "B5", "user_id": 1, "items": [{"product_id": 404, "quantity": 1}]},
+    ])
+    assert [result.ok for result in results] == [True, True, False, False, False]
+    assert [result.error for result in results[2:]] == ["库存不足", "订单号重复", "商品不存在或已下架"]
+    # 客户端不能指定价格：金额按数据库价格计算
+    assert float(results[0].total_amount) == 35.0
+    assert _stock(db) == {1: 3, 2: 0, 3: 0}
+    assert db.query(Order).count() == 2
+    assert len(db.get(Order, results[0].order_id).order_items) == 2
+    print("批量下单结果正确")
+
+
+def test_place_orders_skips_malformed_orders():
+    db = _session()
+    db.add(User(user_id=1, username="buyer", pass_word="x", email="buyer@example.com", phone="13800000000"))
+    db.commit()
+    repo = OrderRepository(db)
+
+    results = repo.place_orders([
+        {"order_number": "M1", "user_id": 1, "items": [{"quantity": 1}]},
+        {"order_number": "M2", "user_id": 1, "items": [{"product_id": "abc", "quantity": 1}]},
+        {"order_number": "M3", "user_id": 1, "shipping_amount": "abc", "items": [{"product_id": 1, "quantity": 1}]},
+        "not an order",
+        {"order_number": "M5", "user_id": 1, "shipping_amount": -5, "items": [{"product_id": 1, "quantity": 1}]},
+        {"order_number": "M6", "user_id": 1, "items": [{"product_id": 1, "quantity": 1}]},
+    ])
+    assert [result.error for result in results[:3]] == ["订单项格式错误"] * 3
+    assert results[3].error == "订单项格式错误"
+    assert results[4].error == "运费不能为负数"
+    assert results[5].ok
+    assert db.query(Order).count() == 1
+    print("格式错误的订单被跳过，其余订单正常下单")
+
+
+def test_discount_only_from_trusted_import():
+    db = _session()
+    db.add(User(user_id=1, username="buyer", pass_word="x", email="buyer@example.com", phone="13800000000"))
+    db.commit()
+    repo = OrderRepository(db)
+
+    # 客户端传入的优惠金额被忽略
+    result = repo.place_orders([
+        {"order_number": "D1", "user_id": 1, "discount_amount": 1000, "items": [{"product_id": 1, "quantity": 1}]},
+    ])[0]
+    assert result.ok and float(result.total_amount) == 10.0
+
+    results = repo.place_orders([
+        {"order_number": "D2", "user_id": 1, "discount_amount": 4, "items": [{"product_id": 1, "quantity": 1}]},
+        {"order_number": "D3", "user_id": 1, "discount_amount": 11, "items": [{"product_id": 1, "quantity": 1}]},
+        {"order_number": "D4", "user_id": 1, "discount_amount": -1, "items": [{"product_id": 1, "quantity": 1}]},
+    ], allow_discount=True)
+    assert results[0].ok and float(results[0].total_amount) == 6.0
+    assert [result.error for result in results[1:]] == ["优惠金额无效", "优惠金额无效"]
+    print("优惠金额只在后台导入时采用，且不超过商品小计")
+
+
+def test_flash_stock_released_when_db_reservation_raises():
+    fakeredis = pytest.importorskip("fakeredis")
+    db = _session()
+    db.add(User(user_id=1, username="buyer", pass_word="x", email="buyer@example.com", phone="13800000000"))
+    db.commit()
+    flash = FlashSaleStock(fakeredis.FakeRedis(decode_responses=True))
+    flash.load(db, 1)
+
+    outcomes = []
+
+    def reserve(db, quantities):
+        outcome = outcomes.pop(0)
+        if outcome is None:
+            raise RuntimeError("Deadlock found when trying to get lock")
+        return outcome
+
+    orders = [
+        {"user_id": 1, "items": [{"product_id": 1, "quantity": 1}, {"product_id": 2, "quantity": 1}]}
+        for _ in range(2)
+    ]
+    original = order_repository.flash_sale_stock, order_repository.reserve_stock
+    order_repository.flash_sale_stock, order_repository.reserve_stock = flash, reserve
+    try:
+        # 整批预占抛出异常
+        outcomes[:] = [None]
+        assert not any(result.ok for result in OrderRepository(db).place_orders(orders))
+        assert flash.available(1) == 5 and not any(flash.stats()["pending"].values())
+
+        # 整批库存不足，逐单预占时第一单成功、第二单抛出异常：第一单已预扣的也要归还
+        outcomes[:] = [False, True, None]
+        assert not any(result.ok for result in OrderRepository(db).place_orders(orders))
+        assert flash.available(1) == 5 and not any(flash.stats()["pending"].values())
+    finally:
+        order_repository.flash_sale_stock, order_repository.reserve_stock = original
+    print("数据库预占异常时归还秒杀库存")
+
+
+def test_flash_items_fail_closed_when_redis_errors():
+    fakeredis = pytest.importorskip("fakeredis")
+    db = _session()
+    connection = fakeredis.FakeRedis(decode_responses=True)
+    FlashSaleStock(connection).load(db, 1)
+    flash = FlashSaleStock(connection)  # 另一个进程：从 Redis 读到秒杀商品列表
+    assert flash.flash_product_ids == {1}
+
+    def redis_down(keys, args):
+        raise ConnectionError("Redis 连接中断")
+
+    flash._reserve = redis_down
+    # 秒杀商品的数据库库存不含待同步的扣减量，不能改走数据库
+    assert flash.try_reserve({1: 1, 2: 1}) == (False, [])
+    assert flash.try_reserve({2: 1}) == (True, [])
+    print("Redis 出错时秒杀商品拒绝下单，普通商品照常")
+
+
+def test_reconcile_lock_is_only_released_by_its_owner():
+    fakeredis = pytest.importorskip("fakeredis")
+    db = _session()
+    connection = fakeredis.FakeRedis(decode_responses=True)
+    flash = FlashSaleStock(connection)
+    flash.load(db, 1)
+    assert flash.try_reserve({1: 2}) == (True, [1])
+
+    # 其他进程持有同步锁时不同步，也不删除对方的锁
+    connection.set(flash.lock_key, "other-worker", px=30000)
+    assert flash.reconcile(db) == 0
+    assert connection.get(flash.lock_key) == "other-worker"
+
+    connection.delete(flash.lock_key)
+    take_pending = flash._take_pending
+
+    def slow_take_pending(keys):
+        # 同步耗时超过锁的有效期，锁过期后被其他进程取得
+        connection.set(flash.lock_key, "other-worker", px=30000)
+        return take_pending(keys=keys)
+
+    flash._take_pending = slow_take_pending
+    assert flash.reconcile(db) == 1
+    assert _stock(db)[1] == 3
+    assert connection.get(flash.lock_key) == "other-worker"
+
+    flash._take_pending = take_pending
+    connection.delete(flash.lock_key)
+    flash.reconcile(db)
+    assert connection.get(flash.lock_key) is None
+    print("同步锁只由持有者释放")
+
+
+if __name__ == "__main__":
+    test_batch_reserve_is_all_or_nothing()
+    test_null_track_inventory_is_tracked_by_every_path()
+    test_order_creation_reserves_stock()
+    test_place_orders_in_bulk()
+    test_place_orders_skips_malformed_orders()
+    test_discount_only_from_trusted_import()
+    test_flash_stock_released_when_db_reservation_raises()
+    test_flash_items_fail_closed_when_redis_errors()
+    test_reconcile_lock_is_only_released_by_its_owner()
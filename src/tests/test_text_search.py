@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+from src.utils.text_search import InvertedIndex, tokenize
+
+
+def _build_index():
+    index = InvertedIndex()
+    weights = {"name": 3.0}
+    index.upsert(1, {"name": "iPhone 13", "desc": "苹果智能手机，A15芯片"}, weights)
+    index.upsert(2, {"name": "小米13", "desc": "小米旗舰手机，徕卡影像系统"}, weights)
+    index.upsert(3, {"name": "三星 Galaxy S22", "desc": "三星旗舰手机"}, weights)
+    return index
+
+
+def test_tokenize_cjk_bigrams():
+    print("===== 全文检索分词测试 =====")
+    assert tokenize("华为手机") == ["华为", "为手", "手机"]
+    assert tokenize("iPhone-13 的") == ["iphone", "13", "的"]
+    assert tokenize("!!") == []
+
+
+def test_index_search_and_update():
+    index = _build_index()
+    assert {doc_id for doc_id, _ in index.search("手机")} == {1, 2, 3}
+    assert [doc_id for doc_id, _ in index.search("旗舰手机")] in ([2, 3], [3, 2])
+    assert [doc_id for doc_id, _ in index.search("iph")] == [1]
+    assert index.search("华为") == []
+    assert index.search("%") is None
+
+    # 名称命中的权重高于描述命中
+    index.upsert(4, {"name": "小米手环", "desc": "运动手环"}, {"name": 3.0})
+    ranked = index.search("小米")
+    assert ranked[0][0] in (2, 4) and len(ranked) == 2
+
+    index.upsert(2, {"name": "Redmi Note", "desc": "入门手机"}, {"name": 3.0})
+    assert [doc_id for doc_id, _ in index.search("徕卡")] == []
+    index.remove(4)
+    assert index.search("小米") == []
+    print("增量更新后检索结果正确")
+
+
+def test_single_character_and_mixed_queries():
+    index = _build_index()
+    # 文档中的汉字切成二元组，单字查询匹配包含该字的二元组
+    assert {doc_id for doc_id, _ in index.search("机")} == {1, 2, 3}
+    assert [doc_id for doc_id, _ in index.search("徕")] == [2]
+    assert [doc_id for doc_id, _ in index.search("米1")] == [2]
+    assert [doc_id for doc_id, _ in index.search("星 s")] == [3]
+    assert index.search("华") == []
+
+    index.upsert(4, {"name": "锤", "desc": ""})
+    assert [doc_id for doc_id, _ in index.search("锤")] == [4]
+    index.remove(2)
+    assert index.search("米1") == []
+    print("单字和中英混合查询结果正确")
+
+
+def test_index_persistence():
+    index = _build_index()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "products.json")
+        index.save(path, {"watermark": "2024-01-01T00:00:00"})
+        loaded, extra = InvertedIndex.load(path)
+    assert extra["watermark"] == "2024-01-01T00:00:00"
+    assert loaded.search("旗舰手机") == index.search("旗舰手机")
+
+
+if __name__ == "__main__":
+    test_tokenize_cjk_bigrams()
+    test_index_search_and_update()
+    test_single_character_and_mixed_queries()
+    test_index_persistence()
@@ -0,0 +1,41 @@
+import time
+
+from src.authentication import JWTUtils, VerifiedTokenCache
+
+
+def test_verified_token_cache_hits_and_invalidation():
+    print("===== 已验证令牌缓存测试 =====")
+    jwt_utils = JWTUtils("test-secret")
+    token = jwt_utils.generate_token({'user_id': 1, 'username': 'testuser'})
+    payload = jwt_utils.verify_token(token)
+
+    cache = VerifiedTokenCache(max_size=2, max_age=60)
+    assert cache.get(token) is None
+    cache.put(token, payload)
+    assert cache.get(token) == payload
+
+    cache.invalidate(token)
+    assert cache.get(token) is None
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2
+    print(f"命中统计: {stats}")
+
+
+def test_verified_token_cache_expiry_and_eviction():
+    print("===== 令牌缓存过期与淘汰测试 =====")
+    cache = VerifiedTokenCache(max_size=2, max_age=60)
+    cache.put("expired", {'exp': int(time.time()) - 1})
+    assert cache.get("expired") is None
+
+    cache.put("a", {'exp': int(time.time()) + 60})
+    cache.put("b", {'exp': int(time.time()) + 60})
+    cache.get("a")
+    cache.put("c", {'exp': int(time.time()) + 60})
+    assert cache.get("b") is None  # 最久未使用的条目被淘汰
+    assert cache.get("a") is not None and cache.get("c") is not None
+    print("过期与LRU淘汰正确")
+
+
+if __name__ == "__main__":
+    test_verified_token_cache_hits_and_invalidation()
+    test_verified_token_cache_expiry_and_eviction()
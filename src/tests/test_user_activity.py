@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from src.Data_base.database import Base
+from src.Data_base.models.order import Order
+from src.Data_base.models.product import Category, Product
+from src.Data_base.models.user import User, UserActivity
+from src.Data_base.query_plans import capture_statements, explain
+from src.Data_base.repositories.order_repository import OrderRepository
+from src.Data_base.repositories.user_activity import UserActivityRepository
+from src.Data_base.repositories.user_repository import UserRepository
+
+
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 会自增
+    return "INTEGER"
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add(Category(category_id=1, category_name="手机"))
+    db.add(Product(product_id=1, sku="SKU-1", product_name="商品", sale_price=Decimal("10.00"),
+                   stock_quantity=1000, category_id=1))
+    for user_id in range(1, 5):
+        db.add(User(user_id=user_id, username=f"user{user_id}", pass_word="x",
+                    email=f"user{user_id}@example.com", phone=f"1380000000{user_id}"))
+    db.commit()
+    return db
+
+
+def _order(user_id):
+    return {"user_id": user_id, "items": [{"product_id": 1, "quantity": 1}]}
+
+
+def _counters(db):
+    return {
+        row.user_id: (row.order_count, row.last_order_at is not None, row.last_login_at is not None)
+        for row in db.query(UserActivity)
+    }
+
+
+def test_counters_follow_orders_and_logins():
+    print("===== 用户活跃度计数测试 =====")
+    db = _session()
+    orders = OrderRepository(db)
+    assert all(result.ok for result in orders.place_orders([_order(1), _order(2), _order(1), _order(1)]))
+    assert orders.create_order_with_items({"user_id": 2}, [{"product_id": 1, "quantity": 1}]) is not None
+    assert UserRepository(db).update_last_login(3)
+    assert UserRepository(db).update_last_login(1)
+
+    assert _counters(db) == {1: (3, True, True), 2: (2, True, False), 3: (0, False, True)}
+    ranking = UserRepository(db).get_users_by_activity(days=30, limit=10)
+    assert [(user.user_id, count) for user, count in ranking] == [(1, 3), (2, 2), (3, 0)]
+    print("下单和登录后计数正确，排行按订单数排序")
+
+    # 超出时间窗口的用户不在排行中
+    db.query(UserActivity).filter(UserActivity.user_id == 1).update(
+        {"last_active_at": datetime.now() - timedelta(days=40)})
+    db.commit()
+    assert [user.user_id for user, _ in UserRepository(db).get_users_by_activity(days=30)] == [2, 3]
+
+
+def test_rebuild_matches_incremental_counters():
+    db = _session()
+    OrderRepository(db).place_orders([_order(1), _order(2), _order(2)])
+    UserRepository(db).update_last_login(4)
+    expected = _counters(db)
+
+    db.query(UserActivity).delete()
+    db.commit()
+    assert UserActivityRepository(db).rebuild(batch_size=2) == 3
+    assert _counters(db) == expected
+    assert db.query(Order).count() == 3
+
+
+def test_ranking_reads_activity_index():
+    db = _session()
+    with capture_statements(db.get_bind()) as captured:
+        UserActivityRepository(db).get_active_users(days=7)
+    details = [row["detail"] for statement, parameters in captured
+               for row in explain(db.connection(), statement, parameters)]
+    assert any("user_activity USING INDEX ix_user_activity_last_active_at" in detail for detail in details), details
+    assert not any(detail.startswith("SCAN") and "orders" in detail for detail in details)
+
+
+if __name__ == "__main__":
+    test_counters_follow_orders_and_logins()
+    test_rebuild_matches_incremental_counters()
+    test_ranking_reads_activity_index()
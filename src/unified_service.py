@@ -1,24 +1,39 @@
+from datetime import datetime
 from typing import Dict, Any, List, Optional
-from src.Data_base.database import SessionLocal, init_db
+from src.Data_base.database import ScopedSession, init_db, remove_scoped_session
 from src.Data_base.repositories.user_repository import UserRepository
 from src.Data_base.repositories.order_repository import OrderRepository, PaymentRepository
 from src.Data_base.repositories.product_repository import ProductRepository, CategoryRepository
+from src.Data_base.repositories.pagination import InvalidCursor
 from src.Data_base.models.product import Product, Category
 from src.registration import UserSystem
 from src.authentication import EnhancedUserSystem
 from src.utils.security import InputValidator, SQLInjectionValidator
 from src.algorithm.rsa_service import SM2Service
 import os
+import threading
 
 class UnifiedEcommerceService:
     """统一电商服务接口"""
 
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "UnifiedEcommerceService":
+        """获取进程级单例（建表、密钥生成、示例数据只在首次调用时执行）"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
     def __init__(self):
         # 初始化数据库表
         self._initialize_database()
 
-        # 创建数据库会话
-        self.db_session = SessionLocal()
+        # 请求级会话代理：仓库通过它访问当前线程的会话，请求结束时由中间件移除
+        self.db_session = ScopedSession
 
         try:
             # 初始化各个仓库
@@ -45,10 +60,9 @@ class UnifiedEcommerceService:
             self._create_sample_data()
 
             print("统一电商服务初始化完成！")
-        except Exception as e:
-            # 如果初始化失败，确保关闭数据库会话
-            self.db_session.close()
-            raise e
+        finally:
+            # 初始化期间使用的会话不跨请求复用
+            remove_scoped_session()
 
     def _initialize_database(self):
         """初始化数据库表"""
@@ -258,10 +272,9 @@ class UnifiedEcommerceService:
             print(f" 创建示例商品失败: {e}")
             # 不抛出异常，避免影响服务初始化
 
-    def __del__(self):
-        """析构函数，确保数据库会话关闭"""
-        if hasattr(self, 'db_session'):
-            self.db_session.close()
+    def close_session(self):
+        """关闭当前线程的数据库会话（请求结束时调用）"""
+        remove_scoped_session()
 
     def register_user(self, username: str, password: str, phone: str, code: str, email: str = None) -> Dict[str, Any]:
         """用户注册"""
@@ -375,21 +388,30 @@ class UnifiedEcommerceService:
 
     def search_products(self, keyword: str = None, category_id: int = None,
                         min_price: float = None, max_price: float = None,
-                        skip: int = 0, limit: int = 50) -> List[Any]:
+                        skip: int = 0, limit: int = 50, cursor: str = None) -> List[Any]:
         """搜索商品"""
+        products, _ = self.search_products_page(keyword, category_id, min_price, max_price, skip, limit, cursor)
+        return products
+
+    def search_products_page(self, keyword: str = None, category_id: int = None,
+                             min_price: float = None, max_price: float = None,
+                             skip: int = 0, limit: int = 50, cursor: str = None):
+        """搜索商品（分页），返回 (商品列表, 下一页游标)；游标无效时抛出 InvalidCursor"""
         try:
-            products = self.product_repo.search_products_safe(
+            return self.product_repo.search_products_page(
                 keyword=keyword,
                 category_id=category_id,
                 min_price=min_price,
                 max_price=max_price,
                 skip=skip,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
-            return products
+        except InvalidCursor:
+            raise
         except Exception as e:
             print(f"商品搜索失败: {e}")
-            return []
+            return [], None
 
     def get_product_detail(self, product_id: int) -> Optional[Any]:
         """获取商品详情 - 修复版本"""
@@ -423,10 +445,28 @@ class UnifiedEcommerceService:
             print(f"创建订单失败: {e}")
             return None
 
-    def get_user_orders(self, user_id: int, skip: int = 0, limit: int = 50) -> List[Any]:
-        """获取用户订单"""
+    def place_orders(self, orders: List[Dict[str, Any]]) -> List[Any]:
+        """批量下单（B2B 导入），返回每个订单的结果"""
+        try:
+            return self.order_repo.place_orders(orders)
+        except Exception as e:
+            print(f"批量下单失败: {e}")
+            return []
+
+    def get_sales_statistics(self, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """获取销售统计"""
+        try:
+            return self.order_repo.get_sales_statistics(start_date, end_date)
+        except Exception as e:
+            print(f"获取销售统计失败: {e}")
+            return {}
+
+    def get_user_orders(self, user_id: int, skip: int = 0, limit: int = 50, cursor: str = None) -> List[Any]:
+        """获取用户订单（下一页游标可通过 order_repo.next_cursor(orders, limit) 获得）；游标无效时抛出 InvalidCursor"""
         try:
-            return self.order_repo.get_user_orders(user_id, skip, limit)
+            return self.order_repo.get_user_orders(user_id, skip, limit, cursor)
+        except InvalidCursor:
+            raise
         except Exception as e:
             print(f"获取用户订单失败: {e}")
             return []
@@ -0,0 +1,49 @@
+import math
+
+
+class BloomFilter:
+    """布隆过滤器：判定"一定不存在"或"可能存在"
+
+    元素为已经过密码学哈希的字节串（如令牌的 SM3 摘要），
+    直接从摘要中切出两个 64 位整数做双重哈希，不再额外计算哈希。
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        if len(digest) < 16:
+            raise ValueError("digest must be at least 16 bytes")
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, digest: bytes):
+        bits = self._bits
+        for pos in self._positions(digest):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def might_contain(self, digest: bytes) -> bool:
+        bits = self._bits
+        for pos in self._positions(digest):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    __contains__ = might_contain
+
+    @property
+    def saturated(self) -> bool:
+        """元素数超过设计容量时误判率会明显上升，应按更大容量重建"""
+        return self.count > self.capacity
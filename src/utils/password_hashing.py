@@ -0,0 +1,51 @@
+"""带版本的密码哈希记录
+
+存储格式：``<算法>$<迭代次数>$<哈希hex>``，例如 ``pbkdf2-sm3$2500$9f0c...``。
+验证时按记录中的算法和迭代次数只做一次派生；没有版本前缀的旧记录
+（裸 hex 或 ``legacy$<hex>``）无法判断当初使用的方案，仍按历史顺序依次尝试，
+登录成功后会被重新哈希为带版本的记录。
+"""
+from typing import NamedTuple, Optional
+
+PBKDF2_SM3 = "pbkdf2-sm3"
+PBKDF2_SHA256 = "pbkdf2-sha256"
+LEGACY = "legacy"
+
+SUPPORTED_ALGORITHMS = (PBKDF2_SM3, PBKDF2_SHA256)
+RECORD_SEPARATOR = "$"
+
+
+class PasswordRecord(NamedTuple):
+    algorithm: str
+    iterations: Optional[int]
+    hash_hex: str
+
+    @property
+    def is_versioned(self) -> bool:
+        return self.algorithm in SUPPORTED_ALGORITHMS
+
+
+def encode_password_record(algorithm: str, iterations: int, hash_hex: str) -> str:
+    """编码为带版本的密码记录"""
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ValueError(f"unsupported password algorithm: {algorithm}")
+    return f"{algorithm}{RECORD_SEPARATOR}{int(iterations)}{RECORD_SEPARATOR}{hash_hex}"
+
+
+def parse_password_record(stored: str) -> PasswordRecord:
+    """解析密码记录，无法识别的格式一律视为旧记录"""
+    stored = stored or ""
+    parts = stored.split(RECORD_SEPARATOR)
+    if len(parts) == 3 and parts[0] in SUPPORTED_ALGORITHMS and parts[1].isdigit():
+        return PasswordRecord(parts[0], int(parts[1]), parts[2])
+    if len(parts) == 2 and parts[0] == LEGACY:
+        return PasswordRecord(LEGACY, None, parts[1])
+    return PasswordRecord(LEGACY, None, stored)
+
+
+def tag_legacy_record(stored: str) -> str:
+    """给未带版本的旧记录加上 legacy 前缀（已带版本或已标记的记录原样返回）"""
+    record = parse_password_record(stored)
+    if record.is_versioned or stored.startswith(LEGACY + RECORD_SEPARATOR):
+        return stored
+    return f"{LEGACY}{RECORD_SEPARATOR}{record.hash_hex}"
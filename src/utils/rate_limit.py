@@ -0,0 +1,260 @@
+"""GCRA 限流器
+
+每个键只保存一个"理论到达时间"（TAT），内存占用与请求数无关：
+``limit`` 次 / ``window`` 秒 对应发射间隔 ``window / limit``，允许瞬时突发 ``limit`` 次。
+
+后端：
+
+- ``LocalRateLimitBackend``：进程内字典，定期清理已空闲（TAT 已过期）的键
+- ``RedisRateLimitBackend``：Lua 脚本原子读改写，多进程/多实例共享计数；
+  Redis 不可用时自动降级到本地后端
+
+GCRA 把配额均匀地恢复（5 次/900 秒 每 180 秒恢复一次），适合请求限流；
+"窗口内失败 N 次锁定 M 分钟" 这类语义用固定窗口计数（``hit_window``）和锁定键（``record_failure``），
+窗口/锁定从第一次计数开始，到期前不恢复。
+
+全局实例 ``rate_limiter`` 供 HTTP 限流中间件、注册/登录频率限制和登录失败锁定共用，
+启动时可通过 ``rate_limiter.use_backend(...)`` 切换为 Redis 后端。
+"""
+import logging
+import math
+import threading
+import time
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+
+def _evaluate(tat, now, interval, window, cost):
+    """GCRA 判定，返回 (新TAT或None, 结果)；所有时间单位一致即可"""
+    tat = max(tat, now)
+    new_tat = tat + interval * cost
+    allow_at = new_tat - window
+    if allow_at > now:
+        return None, RateLimitResult(False, 0, allow_at - now)
+    remaining = int((now + window - new_tat) // interval)
+    return new_tat, RateLimitResult(True, remaining, 0.0)
+
+
+class LocalRateLimitBackend:
+    """进程内 GCRA 后端"""
+
+    name = "local"
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self._tats = {}
+        self._windows = {}  # 固定窗口计数和锁定键：key -> (计数, 过期时间)
+        self._lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+
+    def apply(self, key, limit, window, cost=1, commit=True):
+        now = time.monotonic()
+        interval = window / limit
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+            new_tat, result = _evaluate(self._tats.get(key, now), now, interval, window, cost)
+            if new_tat is not None and commit:
+                self._tats[key] = new_tat
+            return result
+
+    def incr(self, key, window, cost=1):
+        """固定窗口计数，返回 (窗口内计数, 窗口剩余秒数)；窗口从第一次计数开始"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+            count, expires_at = self._windows.get(key, (0, 0))
+            if expires_at <= now:
+                count, expires_at = 0, now + window
+            count += cost
+            self._windows[key] = (count, expires_at)
+            return count, expires_at - now
+
+    def lock(self, key, seconds):
+        with self._lock:
+            self._windows[key] = (1, time.monotonic() + seconds)
+
+    def ttl(self, key):
+        """键的剩余秒数，不存在或已过期为 0"""
+        with self._lock:
+            _, expires_at = self._windows.get(key, (0, 0))
+        return max(0.0, expires_at - time.monotonic())
+
+    def reset(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._tats.pop(key, None)
+                self._windows.pop(key, None)
+
+    def _sweep(self, now):
+        """TAT 不晚于当前时间的键与不存在等价，直接删除；过期的窗口同样删除"""
+        idle = [key for key, tat in self._tats.items() if tat <= now]
+        for key in idle:
+            del self._tats[key]
+        expired = [key for key, (_, expires_at) in self._windows.items() if expires_at <= now]
+        for key in expired:
+            del self._windows[key]
+        self._last_sweep = now
+
+    def size(self):
+        return len(self._tats) + len(self._windows)
+
+
+# KEYS[1]=限流键；ARGV: 当前毫秒时间, 发射间隔(ms), 窗口(ms), 消耗, 是否写入
+# 返回 {是否允许, 剩余次数, 需等待毫秒}；键随 TAT 过期自动删除
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local commit = ARGV[5] == '1'
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - window
+if allow_at > now then
+    return {0, 0, allow_at - now}
+end
+if commit then
+    redis.call('SET', KEYS[1], new_tat, 'PX', math.max(new_tat - now, 1))
+end
+return {1, math.floor((now + window - new_tat) / interval), 0}
+"""
+
+# KEYS[1]=计数键；ARGV: 增量, 窗口(ms)。返回 {窗口内计数, 剩余毫秒}
+_WINDOW_SCRIPT = """
+local count = redis.call('INCRBY', KEYS[1], ARGV[1])
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl < 0 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    ttl = tonumber(ARGV[2])
+end
+return {count, ttl}
+"""
+
+
+class RedisRateLimitBackend:
+    """Redis Lua 脚本 GCRA 后端，出错时降级到本地后端"""
+
+    name = "redis"
+
+    def __init__(self, connection, fallback=None):
+        self.connection = connection
+        self.fallback = fallback or LocalRateLimitBackend()
+        self._script = connection.register_script(_GCRA_SCRIPT)
+        self._window_script = connection.register_script(_WINDOW_SCRIPT)
+
+    def apply(self, key, limit, window, cost=1, commit=True):
+        window_ms = max(1, int(window * 1000))
+        interval_ms = max(1, window_ms // limit)
+        try:
+            allowed, remaining, retry_ms = self._script(
+                keys=[key], args=[int(time.time() * 1000), interval_ms, window_ms, cost, 1 if commit else 0]
+            )
+            return RateLimitResult(bool(allowed), int(remaining), int(retry_ms) / 1000.0)
+        except Exception as e:
+            logger.warning(f"Redis限流失败，降级为本地限流: {e}")
+            return self.fallback.apply(key, limit, window, cost, commit)
+
+    def incr(self, key, window, cost=1):
+        try:
+            count, ttl_ms = self._window_script(keys=[key], args=[cost, max(1, int(window * 1000))])
+            return int(count), int(ttl_ms) / 1000.0
+        except Exception as e:
+            logger.warning(f"Redis计数失败，降级为本地计数: {e}")
+            return self.fallback.incr(key, window, cost)
+
+    def lock(self, key, seconds):
+        try:
+            self.connection.set(key, 1, px=max(1, int(seconds * 1000)))
+        except Exception as e:
+            logger.warning(f"Redis锁定键写入失败，降级为本地锁定: {e}")
+        # 本地也记一份：Redis 故障期间锁定仍然有效
+        self.fallback.lock(key, seconds)
+
+    def ttl(self, key):
+        try:
+            return max(0.0, int(self.connection.pttl(key)) / 1000.0)
+        except Exception as e:
+            logger.warning(f"Redis锁定键查询失败，使用本地锁定: {e}")
+            return self.fallback.ttl(key)
+
+    def reset(self, *keys):
+        try:
+            self.connection.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Redis限流键删除失败: {e}")
+        self.fallback.reset(*keys)
+
+    def size(self):
+        return self.fallback.size()
+
+
+class RateLimiter:
+    """限流器：按 ``limit`` 次 / ``window`` 秒 限制任意键"""
+
+    def __init__(self, backend=None, prefix: str = "rate_limit"):
+        self.backend = backend or LocalRateLimitBackend()
+        self.prefix = prefix
+
+    def use_backend(self, backend):
+        self.backend = backend
+        logger.info(f"限流后端切换为: {backend.name}")
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def hit(self, key: str, limit: int, window: float, cost: int = 1) -> RateLimitResult:
+        """记录一次请求并返回是否允许"""
+        return self.backend.apply(self._key(key), limit, window, cost)
+
+    def peek(self, key: str, limit: int, window: float) -> RateLimitResult:
+        """查询下一次请求是否会被允许，不消耗配额"""
+        return self.backend.apply(self._key(key), limit, window, 1, commit=False)
+
+    def hit_window(self, key: str, limit: int, window: float, cost: int = 1) -> RateLimitResult:
+        """固定窗口限制：从第一次请求起 window 秒内最多 limit 次，超出后直到窗口结束都拒绝"""
+        count, ttl = self.backend.incr(self._key(key), window, cost)
+        if count > limit:
+            return RateLimitResult(False, 0, ttl)
+        return RateLimitResult(True, limit - count, 0.0)
+
+    def record_failure(self, key: str, limit: int, window: float, lock_seconds: float) -> RateLimitResult:
+        """记录一次失败：window 秒内累计失败 limit 次后锁定 lock_seconds 秒（allowed=False，retry_after 为锁定剩余时间）"""
+        remaining = self.locked_for(key)
+        if remaining > 0:
+            return RateLimitResult(False, 0, remaining)
+        count, _ = self.backend.incr(self._key(f"{key}:failures"), window)
+        if count >= limit:
+            self.backend.lock(self._key(f"{key}:locked"), lock_seconds)
+            self.backend.reset(self._key(f"{key}:failures"))
+            return RateLimitResult(False, 0, float(lock_seconds))
+        return RateLimitResult(True, limit - count, 0.0)
+
+    def locked_for(self, key: str) -> float:
+        """record_failure 造成的锁定剩余秒数，未锁定为 0"""
+        return self.backend.ttl(self._key(f"{key}:locked"))
+
+    def reset(self, key: str):
+        """清除键的全部限流、计数和锁定状态"""
+        self.backend.reset(self._key(key), self._key(f"{key}:failures"), self._key(f"{key}:locked"))
+
+    def stats(self):
+        return {"backend": self.backend.name, "local_keys": self.backend.size()}
+
+
+rate_limiter = RateLimiter()
+
+
+def retry_after_seconds(result: RateLimitResult) -> int:
+    return max(1, math.ceil(result.retry_after))
@@ -1,9 +1,71 @@
+import hmac
+import os
 import re
 import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional
+from src.utils.sm3 import new_sm3
 
 logger = logging.getLogger(__name__)
 
+# 所有注入特征至少包含一个ASCII字母或以下符号之一；IGNORECASE 下与
+# ASCII 字母等价的 İ ı ſ K 也一并纳入，保证预过滤不会漏判
+SQL_RELEVANT_CHARS = r"[A-Za-z\u0130\u0131\u017f\u212a\-#/*;']"
+
+
+class SQLScreeningEngine:
+    """预编译的SQL注入筛查引擎
+
+    特征模式在构造时一次性编译；不含任何SQL相关字符的字符串（纯数字、中文等）
+    由字符类预过滤直接放行；JSON 请求体用显式栈迭代遍历，并限制深度和节点数。
+    """
+
+    CLEAN = None
+    INJECTION = "injection"
+    LIMIT_EXCEEDED = "limit_exceeded"
+
+    def __init__(self, patterns, max_depth: int = 32, max_nodes: int = 10000):
+        self.pattern = re.compile("|".join(patterns), re.IGNORECASE)
+        self.prefilter = re.compile(SQL_RELEVANT_CHARS)
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+
+    def matches(self, value: str) -> bool:
+        """检测单个字符串"""
+        if not value or self.prefilter.search(value) is None:
+            return False
+        return self.pattern.search(value) is not None
+
+    def scan(self, data) -> Optional[str]:
+        """遍历已解析的 JSON 数据，返回 None（干净）、INJECTION 或 LIMIT_EXCEEDED"""
+        if isinstance(data, str):
+            return self.INJECTION if self.matches(data) else self.CLEAN
+        if not isinstance(data, (dict, list)):
+            return self.CLEAN
+
+        matches = self.matches
+        max_depth = self.max_depth
+        nodes = 1
+        stack = [(data, 0)]
+        while stack:
+            container, depth = stack.pop()
+            values = container.values() if isinstance(container, dict) else container
+            depth += 1
+            for value in values:
+                nodes += 1
+                if nodes > self.max_nodes:
+                    return self.LIMIT_EXCEEDED
+                if isinstance(value, str):
+                    if matches(value):
+                        return self.INJECTION
+                elif isinstance(value, (dict, list)):
+                    if depth >= max_depth:
+                        return self.LIMIT_EXCEEDED
+                    stack.append((value, depth))
+        return self.CLEAN
+
 
 class SQLInjectionValidator:
     """SQL注入检测工具"""
@@ -31,9 +93,7 @@ class SQLInjectionValidator:
         if not input_string or not isinstance(input_string, str):
             return False
 
-        combined_pattern = "|".join(cls.SQL_INJECTION_PATTERNS)
-
-        if re.search(combined_pattern, input_string, re.IGNORECASE):
+        if _VALIDATOR_ENGINE.matches(input_string):
             logger.warning(f"检测到可能的SQL注入尝试: {input_string}")
             return True
 
@@ -74,6 +134,9 @@ class SQLInjectionValidator:
         return bool(re.match(phone_pattern, phone))
 
 
+_VALIDATOR_ENGINE = SQLScreeningEngine(SQLInjectionValidator.SQL_INJECTION_PATTERNS)
+
+
 class DataMasking:
     """数据脱敏工具"""
 
@@ -165,25 +228,45 @@ class InputValidator:
 
 
 def sm3_digest(data: bytes) -> bytes:
-    from gmssl import sm3
-    return bytes.fromhex(sm3.sm3_hash(list(data)))
+    return new_sm3(data).digest()
 
 
 def sm3_hexdigest(data: bytes) -> str:
-    from gmssl import sm3
-    return sm3.sm3_hash(list(data))
+    return new_sm3(data).hexdigest()
 
 
-def hmac_sm3(key: bytes, message: bytes) -> bytes:
+_IPAD = bytes(b ^ 0x36 for b in range(256))
+_OPAD = bytes(b ^ 0x5C for b in range(256))
+
+
+class HmacSM3Key:
+    """HMAC-SM3 密钥上下文：内外填充块只压缩一次，之后每次签名只处理消息本身"""
+
     block_size = 64
-    if len(key) > block_size:
-        key = sm3_digest(key)
-    if len(key) < block_size:
-        key = key + b"\x00" * (block_size - len(key))
+    digest_size = 32
+
+    __slots__ = ("_inner", "_outer")
+
+    def __init__(self, key: bytes):
+        if len(key) > self.block_size:
+            key = sm3_digest(key)
+        key = key.ljust(self.block_size, b"\x00")
+        self._inner = new_sm3(key.translate(_IPAD))
+        self._outer = new_sm3(key.translate(_OPAD))
+
+    def sign(self, message: bytes) -> bytes:
+        inner = self._inner.copy()
+        inner.update(message)
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
 
-    o_key_pad = bytes((b ^ 0x5C) for b in key)
-    i_key_pad = bytes((b ^ 0x36) for b in key)
-    return sm3_digest(o_key_pad + sm3_digest(i_key_pad + message))
+    def verify(self, message: bytes, signature: bytes) -> bool:
+        return hmac.compare_digest(self.sign(message), signature)
+
+
+def hmac_sm3(key: bytes, message: bytes) -> bytes:
+    return HmacSM3Key(key).sign(message)
 
 
 def pbkdf2_sm3(password: bytes, salt: bytes, iterations: int, dklen: int) -> bytes:
@@ -192,17 +275,51 @@ def pbkdf2_sm3(password: bytes, salt: bytes, iterations: int, dklen: int) -> byt
     if dklen <= 0:
         raise ValueError("dklen must be positive")
 
-    hlen = 32
+    hlen = HmacSM3Key.digest_size
     blocks = (dklen + hlen - 1) // hlen
+    prf = HmacSM3Key(password)
+    sign = prf.sign
     derived = bytearray()
 
     for block_index in range(1, blocks + 1):
-        u = hmac_sm3(password, salt + block_index.to_bytes(4, "big"))
-        t = bytearray(u)
-        for _ in range(2, iterations + 1):
-            u = hmac_sm3(password, u)
-            for i in range(hlen):
-                t[i] ^= u[i]
-        derived.extend(t)
+        u = sign(salt + block_index.to_bytes(4, "big"))
+        t = int.from_bytes(u, "big")
+        for _ in range(iterations - 1):
+            u = sign(u)
+            t ^= int.from_bytes(u, "big")
+        derived.extend(t.to_bytes(hlen, "big"))
 
     return bytes(derived[:dklen])
+
+
+_pbkdf2_executor = None
+_pbkdf2_slots = None
+_pbkdf2_lock = threading.Lock()
+
+
+def _get_pbkdf2_executor():
+    """懒加载有界进程池（PBKDF2_POOL_WORKERS 个进程，排队任务数不超过进程数的4倍）"""
+    global _pbkdf2_executor, _pbkdf2_slots
+    if _pbkdf2_executor is None:
+        with _pbkdf2_lock:
+            if _pbkdf2_executor is None:
+                workers = int(os.getenv("PBKDF2_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+                _pbkdf2_slots = threading.BoundedSemaphore(workers * 4)
+                _pbkdf2_executor = ProcessPoolExecutor(max_workers=workers)
+    return _pbkdf2_executor
+
+
+def pbkdf2_sm3_offload(password: bytes, salt: bytes, iterations: int, dklen: int,
+                       timeout: Optional[float] = None) -> bytes:
+    """在进程池中执行 PBKDF2-SM3，避免登录高峰时哈希计算串行占满请求线程"""
+    global _pbkdf2_executor
+    executor = _get_pbkdf2_executor()
+    with _pbkdf2_slots:
+        try:
+            return executor.submit(pbkdf2_sm3, password, salt, iterations, dklen).result(timeout)
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning(f"PBKDF2进程池不可用，改为当前线程计算: {e}")
+            with _pbkdf2_lock:
+                if _pbkdf2_executor is executor:
+                    _pbkdf2_executor = None
+            return pbkdf2_sm3(password, salt, iterations, dklen)
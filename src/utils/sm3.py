@@ -0,0 +1,169 @@
+"""SM3 摘要引擎
+
+提供统一的增量接口 ``new_sm3(data).update(...).digest()``，按以下顺序选择后端：
+
+1. ``openssl``：``hashlib.new('sm3')``（OpenSSL 1.1.1+ 编译时启用 SM3）
+2. ``python``：本模块的纯 Python 实现（预计算常量、按字节块压缩）
+
+可通过环境变量 ``SM3_BACKEND`` 强制指定后端（``openssl`` / ``python``）。
+"""
+import hashlib
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+_MASK = 0xFFFFFFFF
+_IV = (
+    0x7380166F, 0x4914B2B9, 0x172442D7, 0xDA8A0600,
+    0xA96F30BC, 0x163138AA, 0xE38DEE4D, 0xB0FB0E4E,
+)
+# 预计算 T_j <<< (j mod 32)
+_T = tuple(
+    (((t << (j % 32)) | (t >> (32 - j % 32))) & _MASK) if j % 32 else t
+    for j, t in ((j, 0x79CC4519 if j < 16 else 0x7A879D8A) for j in range(64))
+)
+_UNPACK_BLOCK = struct.Struct(">16I").unpack_from
+_PACK_DIGEST = struct.Struct(">8I").pack
+
+BLOCK_SIZE = 64
+DIGEST_SIZE = 32
+
+
+def _compress(v, block, offset=0):
+    """SM3 压缩函数：v 为 8 个字状态，block[offset:offset+64] 为消息分组"""
+    w = list(_UNPACK_BLOCK(block, offset))
+    for j in range(16, 68):
+        x = w[j - 16] ^ w[j - 9] ^ (((w[j - 3] << 15) | (w[j - 3] >> 17)) & _MASK)
+        x ^= (((x << 15) | (x >> 17)) & _MASK) ^ (((x << 23) | (x >> 9)) & _MASK)
+        y = w[j - 13]
+        w.append(x ^ (((y << 7) | (y >> 25)) & _MASK) ^ w[j - 6])
+
+    a, b, c, d, e, f, g, h = v
+    t = _T
+    for j in range(16):
+        a12 = ((a << 12) | (a >> 20)) & _MASK
+        ss1 = (a12 + e + t[j]) & _MASK
+        ss1 = ((ss1 << 7) | (ss1 >> 25)) & _MASK
+        tt1 = ((a ^ b ^ c) + d + (ss1 ^ a12) + (w[j] ^ w[j + 4])) & _MASK
+        tt2 = ((e ^ f ^ g) + h + ss1 + w[j]) & _MASK
+        d = c
+        c = ((b << 9) | (b >> 23)) & _MASK
+        b = a
+        a = tt1
+        h = g
+        g = ((f << 19) | (f >> 13)) & _MASK
+        f = e
+        e = tt2 ^ (((tt2 << 9) | (tt2 >> 23)) & _MASK) ^ (((tt2 << 17) | (tt2 >> 15)) & _MASK)
+    for j in range(16, 64):
+        a12 = ((a << 12) | (a >> 20)) & _MASK
+        ss1 = (a12 + e + t[j]) & _MASK
+        ss1 = ((ss1 << 7) | (ss1 >> 25)) & _MASK
+        tt1 = (((a & b) | (a & c) | (b & c)) + d + (ss1 ^ a12) + (w[j] ^ w[j + 4])) & _MASK
+        tt2 = (((e & f) | (~e & g)) + h + ss1 + w[j]) & _MASK
+        d = c
+        c = ((b << 9) | (b >> 23)) & _MASK
+        b = a
+        a = tt1
+        h = g
+        g = ((f << 19) | (f >> 13)) & _MASK
+        f = e
+        e = tt2 ^ (((tt2 << 9) | (tt2 >> 23)) & _MASK) ^ (((tt2 << 17) | (tt2 >> 15)) & _MASK)
+
+    return (
+        a ^ v[0], b ^ v[1], c ^ v[2], d ^ v[3],
+        e ^ v[4], f ^ v[5], g ^ v[6], h ^ v[7],
+    )
+
+
+class PurePythonSM3:
+    """纯 Python 的增量 SM3 对象，接口与 hashlib 一致"""
+
+    name = "sm3"
+    digest_size = DIGEST_SIZE
+    block_size = BLOCK_SIZE
+
+    __slots__ = ("_state", "_buffer", "_length")
+
+    def __init__(self, data=b""):
+        self._state = _IV
+        self._buffer = b""
+        self._length = 0
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        data = memoryview(data).cast("B")
+        self._length += len(data)
+        state = self._state
+        offset = 0
+        if self._buffer:
+            need = BLOCK_SIZE - len(self._buffer)
+            if len(data) < need:
+                self._buffer += bytes(data)
+                return
+            state = _compress(state, self._buffer + bytes(data[:need]))
+            offset = need
+        end = len(data) - (len(data) - offset) % BLOCK_SIZE
+        while offset < end:
+            state = _compress(state, data, offset)
+            offset += BLOCK_SIZE
+        self._buffer = bytes(data[offset:])
+        self._state = state
+
+    def copy(self):
+        other = PurePythonSM3.__new__(PurePythonSM3)
+        other._state = self._state
+        other._buffer = self._buffer
+        other._length = self._length
+        return other
+
+    def digest(self):
+        bit_length = self._length * 8
+        tail = self._buffer + b"\x80"
+        tail += b"\x00" * ((56 - len(tail)) % BLOCK_SIZE)
+        tail += bit_length.to_bytes(8, "big")
+        state = self._state
+        for offset in range(0, len(tail), BLOCK_SIZE):
+            state = _compress(state, tail, offset)
+        return _PACK_DIGEST(*state)
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+
+def _openssl_available():
+    try:
+        return hashlib.new("sm3", b"abc").hexdigest() == (
+            "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"
+        )
+    except (ValueError, TypeError):
+        return False
+
+
+def _openssl_sm3(data=b""):
+    return hashlib.new("sm3", data)
+
+
+BACKENDS = {"python": PurePythonSM3}
+if _openssl_available():
+    BACKENDS["openssl"] = _openssl_sm3
+
+
+def _select_backend():
+    requested = os.getenv("SM3_BACKEND", "").strip().lower()
+    if requested:
+        if requested in BACKENDS:
+            return requested
+        logger.warning(f"SM3后端 {requested} 不可用，改用自动选择")
+    return "openssl" if "openssl" in BACKENDS else "python"
+
+
+SM3_BACKEND = _select_backend()
+_factory = BACKENDS[SM3_BACKEND]
+
+
+def new_sm3(data=b""):
+    """创建增量 SM3 对象（支持 update/copy/digest/hexdigest）"""
+    return _factory(data)
@@ -0,0 +1,199 @@
+"""轻量倒排索引
+
+分词规则：
+
+- 连续的中日韩字符切成相邻二元组（"华为手机" -> 华为/为手/手机），单个汉字保留为一元词
+- 字母数字串按非字母数字字符切分并转小写（"iPhone-13" -> iphone/13）
+
+查询时所有查询词都必须命中（与原 LIKE 子串匹配的语义接近），字母数字查询词按前缀匹配，
+单个汉字的查询词匹配包含该字的所有二元组（"机" -> 手机/机身...）；
+命中文档按 BM25 打分，字段权重通过 ``upsert`` 的 ``weights`` 指定。
+"""
+import bisect
+import json
+import math
+import os
+import re
+import threading
+
+_CJK_CLASS = r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]"
+_TOKEN_RE = re.compile(_CJK_CLASS + r"+|[0-9A-Za-z]+")
+_CJK_RE = re.compile(_CJK_CLASS)
+
+
+def tokenize(text):
+    """分词，返回词列表（保留重复以便统计词频）"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text or ""):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+class InvertedIndex:
+    """线程安全的内存倒排索引，可序列化到 JSON 文件"""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._postings = {}  # token -> {doc_id: 加权词频}
+        self._docs = {}  # doc_id -> {token: 加权词频}
+        self._lengths = {}  # doc_id -> 文档加权长度
+        self._total_length = 0.0
+        self._vocabulary = None  # 有序词表（前缀匹配用），索引变化后惰性重建
+        self._char_terms = None  # 汉字 -> 包含该字的词（单字查询用），索引变化后惰性重建
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def doc_ids(self):
+        with self._lock:
+            return list(self._docs)
+
+    def upsert(self, doc_id, fields, weights=None):
+        """添加或替换文档；fields 为 {字段名: 文本}"""
+        weights = weights or {}
+        term_freqs = {}
+        for field, text in fields.items():
+            weight = weights.get(field, 1.0)
+            for token in tokenize(text):
+                term_freqs[token] = term_freqs.get(token, 0.0) + weight
+
+        with self._lock:
+            self._remove(doc_id)
+            if not term_freqs:
+                return
+            for token, freq in term_freqs.items():
+                self._postings.setdefault(token, {})[doc_id] = freq
+            self._docs[doc_id] = term_freqs
+            length = sum(term_freqs.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            self._vocabulary = None
+            self._char_terms = None
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        term_freqs = self._docs.pop(doc_id, None)
+        if term_freqs is None:
+            return
+        for token in term_freqs:
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[token]
+        self._total_length -= self._lengths.pop(doc_id, 0.0)
+        self._vocabulary = None
+        self._char_terms = None
+
+    def _expand(self, token):
+        """字母数字词按前缀展开为词表中的词，中文二元组精确匹配，单个汉字展开为包含它的词"""
+        if _CJK_RE.match(token):
+            if len(token) > 1:
+                return [token] if token in self._postings else []
+            if self._char_terms is None:
+                char_terms = {}
+                for term in self._postings:
+                    if _CJK_RE.match(term):
+                        for char in set(term):
+                            char_terms.setdefault(char, []).append(term)
+                self._char_terms = char_terms
+            return self._char_terms.get(token, [])
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, token)
+        matched = []
+        for i in range(start, len(vocabulary)):
+            if not vocabulary[i].startswith(token):
+                break
+            matched.append(vocabulary[i])
+        return matched
+
+    def search(self, query, limit=None):
+        """返回 [(doc_id, score)]，按相关度降序；查询无有效词时返回 None"""
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return None
+
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+
+            scores = None
+            for token in query_tokens:
+                token_scores = {}
+                for term in self._expand(token):
+                    posting = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for doc_id, freq in posting.items():
+                        norm = self.K1 * (1 - self.B + self.B * self._lengths[doc_id] / avg_length)
+                        score = idf * freq * (self.K1 + 1) / (freq + norm)
+                        if score > token_scores.get(doc_id, 0.0):
+                            token_scores[doc_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        doc_id: score + token_scores[doc_id]
+                        for doc_id, score in scores.items()
+                        if doc_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+    def to_dict(self):
+        with self._lock:
+            return {"docs": {str(doc_id): freqs for doc_id, freqs in self._docs.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        for doc_id, term_freqs in data.get("docs", {}).items():
+            doc_id = int(doc_id)
+            for token, freq in term_freqs.items():
+                index._postings.setdefault(token, {})[doc_id] = freq
+            index._docs[doc_id] = term_freqs
+            length = sum(term_freqs.values())
+            index._lengths[doc_id] = length
+            index._total_length += length
+        return index
+
+    def save(self, path, extra=None):
+        """原子写入 JSON 文件（先写临时文件再替换）"""
+        data = self.to_dict()
+        data.update(extra or {})
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """读取索引文件，返回 (索引, 文件中的其他字段)"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        extra = {key: value for key, value in data.items() if key != "docs"}
+        return cls.from_dict(data), extra